@@ -1,99 +1,154 @@
 # Recommender/auth.py
+import hashlib
+import json
+import os
+import re
+import secrets
+import threading
+import time
+
+import requests
 import spotipy
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+from spotipy.cache_handler import CacheHandler
 from spotipy.oauth2 import SpotifyOAuth
-import os
-import streamlit as st
 
-def get_spotify_client():
-    """Manual authentication flow to avoid redirect loops."""
-    
-    st.write("🔄 Starting authentication process...")
-    
-    # Use Streamlit secrets
-    client_id = st.secrets.get("SPOTIPY_CLIENT_ID")
-    client_secret = st.secrets.get("SPOTIPY_CLIENT_SECRET") 
-    redirect_uri = st.secrets.get("SPOTIPY_REDIRECT_URI")
+from Recommender import metrics
+
+TOKEN_DIR = os.path.join('.spotify_cache', 'tokens')
+
+# Refresh access tokens this many seconds before they expire
+REFRESH_MARGIN = 300
+
+MAX_POOLED_CLIENTS = 256
+
+# Retries of a request on 5xx (spotipy's default is 3). 429s are left to the
+# BatchScheduler, whose token bucket pauses every request on Retry-After.
+HTTP_RETRIES = 3
+
+# Session keys are secrets.token_urlsafe() values; anything else is refused
+SESSION_KEY_PATTERN = re.compile(r'[A-Za-z0-9_-]{16,64}')
+
+# How long an authorize URL's state nonce stays valid for the callback
+PENDING_STATE_TTL = 600
+
+_http_session = None
+_clients = {}
+_session_lock = threading.Lock()
+_clients_lock = threading.Lock()
+_pending_states = {}
+_states_lock = threading.Lock()
+
+def is_valid_session_key(key):
+    """True for keys shaped like the random session ids this app mints."""
+    return isinstance(key, str) and SESSION_KEY_PATTERN.fullmatch(key) is not None
+
+def new_state(session_key):
+    """
+    A single-use nonce for the state of an authorize URL started by the
+    session with session_key. The session key itself never goes into a URL.
+    """
+    state = secrets.token_urlsafe(24)
+    now = time.time()
+    with _states_lock:
+        for pending, (_, issued) in list(_pending_states.items()):
+            if now - issued > PENDING_STATE_TTL:
+                del _pending_states[pending]
+        _pending_states[state] = (session_key, now)
+    return state
+
+def consume_state(state):
+    """The session key that started the login with this state nonce (once, while recent), else None."""
+    with _states_lock:
+        pending = _pending_states.pop(state, None)
+    if pending is None or time.time() - pending[1] > PENDING_STATE_TTL:
+        return None
+    return pending[0]
+
+class TokenStore(CacheHandler):
+    """
+    Token file for one user session, stored as TOKEN_DIR/<sha256 of key>.json.
+    The key is a random session id, so concurrent users never share a file;
+    keys that don't look like one are refused.
+    """
     
-    st.write(f"Client ID: {client_id[:10]}...")
-    st.write(f"Client Secret: Found")
-    st.write(f"Redirect URI: {redirect_uri}")
+    def __init__(self, key, directory=TOKEN_DIR):
+        if not is_valid_session_key(key):
+            raise ValueError("Invalid session key")
+        self.key = key
+        self.path = os.path.join(directory, f"{hashlib.sha256(key.encode()).hexdigest()}.json")
     
-    if not client_id or not client_secret or not redirect_uri:
-        st.error("❌ Spotify credentials not found!")
-        st.stop()
+    def get_cached_token(self):
+        try:
+            with open(self.path) as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
     
-    try:
-        # Clear any cached tokens
-        if os.path.exists(".cache"):
-            os.remove(".cache")
-            st.write("🗑️ Cleared previous authentication cache")
-        
-        auth_manager = SpotifyOAuth(
-            client_id=client_id,
-            client_secret=client_secret,
-            redirect_uri=redirect_uri,
-            scope="user-library-read",
-            cache_path=".cache",
-            show_dialog=True
-        )
-        
-        # Check if we're in a callback (has URL parameters) - USING NEW METHOD
-        query_params = st.query_params  # NEW: Fixed deprecated method
-        
-        if 'code' in query_params:
-            # We're in the callback - try to get the token
-            try:
-                st.write("🔄 Processing callback...")
-                sp = spotipy.Spotify(auth_manager=auth_manager)
-                user = sp.current_user()
-                st.success(f"✅ Authenticated as: {user.get('display_name', 'User')}")
-                # Clear the URL parameters
-                st.query_params.clear()  # NEW: Fixed deprecated method
-                return sp
-            except Exception as e:
-                st.error(f"❌ Callback processing failed: {e}")
-        
-        # Check if we already have a valid token
-        token_info = auth_manager.get_cached_token()
-        if token_info and not auth_manager.is_token_expired(token_info):
-            sp = spotipy.Spotify(auth_manager=auth_manager)
-            user = sp.current_user()
-            st.success(f"✅ Authenticated as: {user.get('display_name', 'User')}")
-            return sp
-        
-        # MANUAL AUTHENTICATION FLOW
-        st.write("---")
-        st.write("## 🔑 Manual Authentication Required")
-        st.write("### Due to browser security, we need to manually handle authentication.")
-        
-        # Generate the authorization URL
-        auth_url = auth_manager.get_authorize_url()
-        
-        col1, col2 = st.columns(2)
-        
-        with col1:
-            st.write("### Method 1: Copy URL")
-            st.text_area("Copy this URL:", auth_url, height=60)
-            st.write("1. Copy the URL above")
-            st.write("2. Open a new tab")
-            st.write("3. Paste and go")
-            st.write("4. Log in with Spotify")
-            st.write("5. You'll be redirected back here")
-        
-        with col2:
-            st.write("### Method 2: Direct Link")
-            st.markdown(f'<a href="{auth_url}" target="_blank" style="text-decoration: none;"><button style="background-color: #1DB954; color: white; padding: 12px 24px; border: none; border-radius: 25px; font-size: 16px; cursor: pointer; width: 100%;">🎵 Open Spotify Login</button></a>', unsafe_allow_html=True)
-            st.write("1. Click the button")
-            st.write("2. Log in with Spotify") 
-            st.write("3. Authorize the app")
-            st.write("4. You'll return here automatically")
-        
-        st.write("---")
-        st.info("💡 **After authorizing, you'll be redirected back here. If it shows the login page again, just wait a moment and refresh.**")
-        
-        # Return None to indicate we need authentication
-        return None
-        
-    except Exception as e:
-        st.error(f"❌ Authentication error: {str(e)}")
+    def save_token_to_cache(self, token_info):
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        tmp_path = f"{self.path}.tmp"
+        with open(os.open(tmp_path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600), 'w') as f:
+            json.dump(token_info, f)
+        os.replace(tmp_path, self.path)
+
+class _ServerErrorRetry(Retry):
+    """urllib3 Retry that never retries 429 (it would for any 429 with a Retry-After header)."""
+    RETRY_AFTER_STATUS_CODES = frozenset({503})
+
+def get_http_session():
+    """Process-wide requests.Session so every Spotify call reuses keep-alive connections."""
+    global _http_session
+    with _session_lock:
+        if _http_session is None:
+            session = requests.Session()
+            # A custom adapter replaces spotipy's own, so keep its server-error retries
+            retry = _ServerErrorRetry(total=HTTP_RETRIES, status=HTTP_RETRIES, status_forcelist=(500, 502, 503, 504),
+                          backoff_factor=0.3, respect_retry_after_header=True,
+                          allowed_methods=frozenset({'GET', 'POST', 'PUT', 'DELETE'}))
+            adapter = HTTPAdapter(pool_connections=4, pool_maxsize=32, max_retries=retry)
+            session.mount('https://', adapter)
+            session.mount('http://', adapter)
+            _http_session = session
+        return _http_session
+
+def ensure_fresh_token(auth_manager, margin=REFRESH_MARGIN):
+    """Refresh the cached token if it expires within `margin` seconds. Returns the token (or None)."""
+    token_info = auth_manager.cache_handler.get_cached_token()
+    if not token_info:
         return None
+    if token_info.get('expires_at', 0) - time.time() < margin:
+        metrics.count('auth.token_refreshes')
+        with metrics.timer('auth.refresh'):
+            token_info = auth_manager.refresh_access_token(token_info['refresh_token'])
+    return token_info
+
+def make_auth_manager(client_id, client_secret, redirect_uri, session_key):
+    """SpotifyOAuth for one session, using its TokenStore and the shared HTTP session."""
+    return SpotifyOAuth(
+        client_id=client_id,
+        client_secret=client_secret,
+        redirect_uri=redirect_uri,
+        scope="user-library-read",
+        cache_handler=TokenStore(session_key),
+        requests_session=get_http_session(),
+        open_browser=False,
+        show_dialog=True
+    )
+
+def get_pooled_client(session_key, auth_manager=None):
+    """
+    Reuse the Spotify client for this session, creating it once per process
+    from auth_manager. Returns None if there is no client and no auth_manager.
+    """
+    if not is_valid_session_key(session_key):
+        raise ValueError("Invalid session key")
+    with _clients_lock:
+        sp = _clients.get(session_key)
+        if sp is None and auth_manager is not None:
+            if len(_clients) >= MAX_POOLED_CLIENTS:
+                _clients.pop(next(iter(_clients)))
+            sp = spotipy.Spotify(auth_manager=auth_manager, requests_session=get_http_session())
+            _clients[session_key] = sp
+        return sp
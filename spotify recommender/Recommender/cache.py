@@ -0,0 +1,175 @@
+# Recommender/cache.py
+import json
+import os
+import sqlite3
+import threading
+import time
+
+from Recommender import metrics
+
+DEFAULT_CACHE_PATH = os.path.join('.spotify_cache', 'audio_features.sqlite')
+
+# SQLite limits the number of bound parameters per statement
+_CHUNK = 500
+
+
+class FeatureCache:
+    """
+    SQLite store of audio features keyed by track ID, shared by every user.
+
+    Audio features never change, so entries don't expire unless `ttl` is set.
+    IDs the API returned None for are cached as negative entries for
+    `negative_ttl` seconds. The store is capped at `max_entries` rows, evicting
+    the least recently used ones.
+    """
+
+    def __init__(self, path=DEFAULT_CACHE_PATH, max_entries=500_000, ttl=None,
+                 negative_ttl=7 * 24 * 3600):
+        if path != ':memory:' and os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        self.path = path
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.negative_ttl = negative_ttl
+        self.hits = 0
+        self.negative_hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False, timeout=30)
+        with self._conn:
+            if path != ':memory:':
+                self._conn.execute('PRAGMA journal_mode=WAL')
+            self._conn.execute(
+                'CREATE TABLE IF NOT EXISTS audio_features ('
+                ' id TEXT PRIMARY KEY,'
+                ' features TEXT,'
+                ' fetched_at REAL NOT NULL,'
+                ' last_access REAL NOT NULL)'
+            )
+            self._conn.execute(
+                'CREATE INDEX IF NOT EXISTS audio_features_last_access ON audio_features (last_access)'
+            )
+
+    def __len__(self):
+        with self._lock:
+            return self._conn.execute('SELECT COUNT(*) FROM audio_features').fetchone()[0]
+
+    def _expired(self, features_json, fetched_at, now):
+        ttl = self.negative_ttl if features_json is None else self.ttl
+        return ttl is not None and now - fetched_at > ttl
+
+    def get_many(self, track_ids):
+        """
+        Look up track IDs.
+
+        Returns (found, missing): found maps ID -> features dict, or None for
+        a cached "API has no features" answer; missing lists IDs to fetch.
+        """
+        now = time.time()
+        unique_ids = list(dict.fromkeys(track_ids))
+        found = {}
+
+        with self._lock:
+            for i in range(0, len(unique_ids), _CHUNK):
+                chunk = unique_ids[i:i + _CHUNK]
+                rows = self._conn.execute(
+                    f'SELECT id, features, fetched_at FROM audio_features WHERE id IN ({",".join("?" * len(chunk))})',
+                    chunk,
+                ).fetchall()
+                for track_id, features_json, fetched_at in rows:
+                    if not self._expired(features_json, fetched_at, now):
+                        found[track_id] = None if features_json is None else json.loads(features_json)
+
+            if found:
+                with self._conn:
+                    self._conn.executemany(
+                        'UPDATE audio_features SET last_access = ? WHERE id = ?',
+                        [(now, track_id) for track_id in found],
+                    )
+
+            missing = [t for t in unique_ids if t not in found]
+            negatives = sum(1 for v in found.values() if v is None)
+            self.hits += len(found) - negatives
+            self.negative_hits += negatives
+            self.misses += len(missing)
+
+        metrics.count('cache.hits', len(found) - negatives)
+        metrics.count('cache.negative_hits', negatives)
+        metrics.count('cache.misses', len(missing))
+
+        return found, missing
+
+    def put_many(self, features_by_id):
+        """Store fetched features in bulk; a None value records a negative entry."""
+        if not features_by_id:
+            return
+        now = time.time()
+        rows = [
+            (track_id, None if features is None else json.dumps(features), now, now)
+            for track_id, features in features_by_id.items()
+        ]
+        with self._lock:
+            with self._conn:
+                self._conn.executemany(
+                    'INSERT OR REPLACE INTO audio_features (id, features, fetched_at, last_access) VALUES (?, ?, ?, ?)',
+                    rows,
+                )
+            self._evict()
+
+    def _evict(self):
+        """Drop least recently used rows beyond max_entries (caller holds the lock)."""
+        if self.max_entries is None:
+            return
+        count = self._conn.execute('SELECT COUNT(*) FROM audio_features').fetchone()[0]
+        excess = count - self.max_entries
+        if excess > 0:
+            with self._conn:
+                self._conn.execute(
+                    'DELETE FROM audio_features WHERE id IN '
+                    '(SELECT id FROM audio_features ORDER BY last_access LIMIT ?)',
+                    (excess,),
+                )
+            self.evictions += excess
+
+    def iter_features(self, chunk_size=10_000):
+        """Every cached features dict (None for negative entries), in chunks off one cursor."""
+        cursor = self._conn.cursor()
+        cursor.execute('SELECT features FROM audio_features')
+        while True:
+            with self._lock:
+                rows = cursor.fetchmany(chunk_size)
+            if not rows:
+                return
+            for (features_json,) in rows:
+                yield None if features_json is None else json.loads(features_json)
+
+    def stats(self):
+        """Hit/miss counters for this process plus the current number of entries."""
+        lookups = self.hits + self.negative_hits + self.misses
+        return {
+            'hits': self.hits,
+            'negative_hits': self.negative_hits,
+            'misses': self.misses,
+            'hit_rate': (self.hits + self.negative_hits) / lookups if lookups else 0.0,
+            'evictions': self.evictions,
+            'entries': len(self),
+        }
+
+    def clear(self):
+        with self._lock:
+            with self._conn:
+                self._conn.execute('DELETE FROM audio_features')
+
+
+_default_cache = None
+_default_cache_lock = threading.Lock()
+
+
+def get_default_cache():
+    """The process-wide FeatureCache at DEFAULT_CACHE_PATH, shared across users."""
+    global _default_cache
+    with _default_cache_lock:
+        if _default_cache is None:
+            _default_cache = FeatureCache()
+        return _default_cache
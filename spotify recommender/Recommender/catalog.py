@@ -0,0 +1,151 @@
+# Recommender/catalog.py
+import itertools
+import json
+import os
+
+import numpy as np
+import pandas as pd
+
+from Recommender.model import track_ids_from_frame
+from Recommender.rerank import rerank_keys
+
+METADATA_COLS = ['track', 'artist', 'uri', 'spotify_link']
+
+_versions = itertools.count(1)
+
+
+def spotify_links(links, track_ids):
+    """Spotify links, rebuilt from the track ID wherever the link is missing."""
+    return np.array([
+        link if isinstance(link, str) and link else f"https://open.spotify.com/track/{track_id}"
+        for link, track_id in zip(links, track_ids)
+    ], dtype=object)
+
+
+class TrackCatalog:
+    """
+    Columnar store of the tracks that have audio features.
+
+    Row r of every array describes the same track: track_ids[r], the
+    metadata arrays in `metadata` and features[r] (contiguous float32).
+    Lookups by track ID or display name are dict hits, and result frames
+    are assembled with one fancy-index per column.
+    """
+
+    def __init__(self, track_ids, metadata, features, feature_cols):
+        self.track_ids = list(track_ids)
+        self.rows = np.arange(len(self.track_ids), dtype=np.int32)
+        self.id_to_row = {t: i for i, t in enumerate(self.track_ids)}
+        self.metadata = {col: np.asarray(values) for col, values in metadata.items()}
+        self.features = np.ascontiguousarray(features, dtype=np.float32)
+        self.feature_cols = list(feature_cols)
+        self.version = next(_versions)
+        self._display_names = None
+        self._display_to_row = None
+        self._rerank_keys = None
+
+    def __len__(self):
+        return len(self.track_ids)
+
+    def __contains__(self, track_id):
+        return track_id in self.id_to_row
+
+    @classmethod
+    def from_frame(cls, songs_with_audio, feature_cols):
+        """Build a catalog from a saved-songs/audio-features frame (one row per track ID)."""
+        valid = songs_with_audio.dropna(subset=['danceability'])
+        track_ids = np.array(track_ids_from_frame(valid), dtype=object)
+        first = ~pd.Index(track_ids).duplicated()
+        valid = valid[first]
+        track_ids = track_ids[first]
+
+        metadata = {
+            col: valid[col].to_numpy(dtype=object) if col in valid.columns else np.full(len(valid), None, dtype=object)
+            for col in METADATA_COLS
+        }
+        metadata['spotify_link'] = spotify_links(metadata['spotify_link'], track_ids)
+        metadata['uri'] = np.array([f"spotify:track:{t}" for t in track_ids], dtype=object)
+
+        features = valid.reindex(columns=feature_cols, fill_value=0.0).fillna(0.0).to_numpy(dtype=np.float32)
+        return cls(track_ids, metadata, features, feature_cols)
+
+    @property
+    def display_names(self):
+        """'Track by Artist' for every row."""
+        if self._display_names is None:
+            self._display_names = [
+                f"{track} by {artist}" for track, artist in zip(self.metadata['track'], self.metadata['artist'])
+            ]
+        return self._display_names
+
+    def display_name(self, track_id):
+        return self.display_names[self.id_to_row[track_id]]
+
+    def find(self, key):
+        """Row of a track ID or exact 'Track by Artist' display name, or None."""
+        row = self.id_to_row.get(key)
+        if row is not None:
+            return row
+        if self._display_to_row is None:
+            self._display_to_row = {}
+            for row, name in enumerate(self.display_names):
+                self._display_to_row.setdefault(name, row)
+        return self._display_to_row.get(key)
+
+    @property
+    def rerank_keys(self):
+        """(title_key, artist_key) integer arrays for the rerankers, one entry per row."""
+        if self._rerank_keys is None:
+            self._rerank_keys = rerank_keys(self.metadata['track'], self.metadata['artist'])
+        return self._rerank_keys
+
+    def warm(self):
+        """Build the cached display names and rerank keys now (before publishing the catalog); returns self."""
+        _ = self.display_names, self.rerank_keys
+        return self
+
+    def feature(self, col):
+        """One raw feature column as a float32 array."""
+        return self.features[:, self.feature_cols.index(col)]
+
+    def take(self, rows, feature_cols=()):
+        """Metadata (plus the given raw feature columns) for rows, as a DataFrame."""
+        rows = np.asarray(rows, dtype=np.int64)
+        frame = {'track_id': [self.track_ids[r] for r in rows]}
+        for col in ('track', 'artist', 'spotify_link'):
+            frame[col] = self.metadata[col][rows]
+        for col in feature_cols:
+            frame[col] = self.feature(col)[rows] if col in self.feature_cols else np.nan
+        return pd.DataFrame(frame)
+
+    def save(self, path):
+        """
+        Save to a directory of .npy files (metadata as fixed-width strings)
+        that load() can memory-map, including the rerank keys so a loaded
+        catalog never recomputes them.
+        """
+        os.makedirs(path, exist_ok=True)
+        np.save(os.path.join(path, 'track_ids.npy'), np.array(self.track_ids, dtype=str))
+        np.save(os.path.join(path, 'features.npy'), self.features)
+        title_key, artist_key = self.rerank_keys
+        np.save(os.path.join(path, 'title_key.npy'), np.asarray(title_key, dtype=np.int32))
+        np.save(os.path.join(path, 'artist_key.npy'), np.asarray(artist_key, dtype=np.int32))
+        for col, values in self.metadata.items():
+            np.save(os.path.join(path, f'{col}.npy'), np.array(['' if v is None else str(v) for v in values], dtype=str))
+        with open(os.path.join(path, 'meta.json'), 'w') as f:
+            json.dump({'feature_cols': self.feature_cols, 'metadata_cols': list(self.metadata)}, f)
+
+    @classmethod
+    def load(cls, path, mmap=True):
+        """Load a catalog written by save(); with mmap the arrays are shared through the page cache."""
+        mmap_mode = 'r' if mmap else None
+        with open(os.path.join(path, 'meta.json')) as f:
+            meta = json.load(f)
+        track_ids = np.load(os.path.join(path, 'track_ids.npy')).tolist()
+        metadata = {col: np.load(os.path.join(path, f'{col}.npy'), mmap_mode=mmap_mode) for col in meta['metadata_cols']}
+        features = np.load(os.path.join(path, 'features.npy'), mmap_mode=mmap_mode)
+        catalog = cls(track_ids, metadata, features, meta['feature_cols'])
+        if os.path.exists(os.path.join(path, 'title_key.npy')):
+            catalog._rerank_keys = tuple(np.load(os.path.join(path, f'{name}.npy'), mmap_mode=mmap_mode)
+                                         for name in ('title_key', 'artist_key'))
+        return catalog
@@ -0,0 +1,590 @@
+# Recommender/collab.py
+"""
+Collaborative filtering over everyone's saved tracks.
+
+InteractionMatrix is a sparse CSR user x track matrix that grows in place as
+users load their libraries; ImplicitALS factorizes it (implicit-feedback ALS,
+or truncated SVD), and CollaborativeRecommender serves "tracks liked by
+similar listeners" from the factors.
+
+Library changes (tracks a user saved or removed) are appended to an
+InteractionLog, which any number of app processes write to. Nothing in
+the app saves the model: each process replays new log entries into its
+loaded model with catch_up(), folding them into a trained model without
+retraining. The train command is the only writer of the model. It rolls
+the log to a new segment, replays everything before it, refits, saves the
+model with the segment it covers and deletes the replayed segments:
+
+    python -m Recommender.collab train --path .spotify_cache/collab
+
+    <path>/CURRENT, v.../   saved model, a versioned directory (see Recommender.versioned)
+    <path>/log/<n>.jsonl    log segments, one change per line
+"""
+import argparse
+import json
+import logging
+import os
+import sys
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import pandas as pd
+from scipy import sparse
+
+from Recommender.index import top_k
+from Recommender.model import track_ids_from_frame
+from Recommender.versioned import current_version, discard, locked, new_version, publish
+
+DEFAULT_COLLAB_PATH = os.path.join('.spotify_cache', 'collab')
+
+logger = logging.getLogger(__name__)
+
+
+def saved_songs_metadata(saved_songs):
+    """(track IDs, {track ID: (track, artist, spotify_link)}) of a get_user_saved_songs frame."""
+    track_ids = track_ids_from_frame(saved_songs)
+    columns = [saved_songs[col] if col in saved_songs.columns else [None] * len(saved_songs)
+               for col in ('track', 'artist', 'spotify_link')]
+    return track_ids, dict(zip(track_ids, zip(*columns)))
+
+
+class InteractionMatrix:
+    """
+    Binary user x track matrix of saved tracks, keyed by user and track ID.
+
+    add() appends (user, track) pairs to a COO buffer; the CSR matrix is only
+    rebuilt when `csr` is read after a change, by adding the buffered pairs to
+    the existing matrix (O(nnz)), never by re-reading every library. remove()
+    drops pairs from the merged matrix the same way.
+    """
+
+    def __init__(self):
+        self.user_ids = []
+        self.user_to_row = {}
+        self.track_ids = []
+        self.track_to_col = {}
+        # track ID -> (track, artist, spotify_link) for result frames
+        self.metadata = {}
+        self._csr = sparse.csr_matrix((0, 0), dtype=np.float32)
+        self._pending_rows = []
+        self._pending_cols = []
+
+    @property
+    def shape(self):
+        return len(self.user_ids), len(self.track_ids)
+
+    @property
+    def nnz(self):
+        return self.csr.nnz
+
+    def _row(self, user_id):
+        row = self.user_to_row.get(user_id)
+        if row is None:
+            row = self.user_to_row[user_id] = len(self.user_ids)
+            self.user_ids.append(user_id)
+        return row
+
+    def _col(self, track_id):
+        col = self.track_to_col.get(track_id)
+        if col is None:
+            col = self.track_to_col[track_id] = len(self.track_ids)
+            self.track_ids.append(track_id)
+        return col
+
+    def add(self, user_id, track_ids, metadata=None):
+        """
+        Record that user_id saved track_ids. metadata optionally maps track ID
+        to (track, artist, spotify_link). Returns the user's row.
+        """
+        row = self._row(user_id)
+        cols = [self._col(t) for t in track_ids]
+        self._pending_rows.extend([row] * len(cols))
+        self._pending_cols.extend(cols)
+        if metadata:
+            self.metadata.update(metadata)
+        return row
+
+    def remove(self, user_id, track_ids):
+        """Forget that user_id saved track_ids (unknown users/tracks are ignored). Returns the number removed."""
+        row = self.user_to_row.get(user_id)
+        cols = [self.track_to_col[t] for t in track_ids if t in self.track_to_col]
+        if row is None or not cols:
+            return 0
+        csr = self.csr
+        start, end = csr.indptr[row], csr.indptr[row + 1]
+        drop = np.isin(csr.indices[start:end], cols)
+        if not drop.any():
+            return 0
+        # A new matrix, not an in-place edit: train() may be reading the current one
+        data = csr.data.copy()
+        data[start:end][drop] = 0
+        matrix = sparse.csr_matrix((data, csr.indices.copy(), csr.indptr.copy()), shape=csr.shape)
+        matrix.eliminate_zeros()
+        self._csr = matrix
+        return int(drop.sum())
+
+    def add_saved_songs(self, user_id, saved_songs):
+        """add() for a get_user_saved_songs frame."""
+        return self.add(user_id, *saved_songs_metadata(saved_songs))
+
+    @property
+    def csr(self):
+        """
+        The current matrix, with buffered additions merged in. Always a new
+        matrix after a change; one handed out before is never modified.
+        """
+        if self._pending_rows or self._csr.shape != self.shape:
+            # Grow to the new shape without touching the shared matrix (new rows are empty)
+            current = self._csr
+            indptr = np.concatenate([current.indptr, np.full(self.shape[0] - current.shape[0], current.indptr[-1],
+                                                             dtype=current.indptr.dtype)])
+            matrix = sparse.csr_matrix((current.data, current.indices, indptr), shape=self.shape)
+            if self._pending_rows:
+                added = sparse.csr_matrix(
+                    (np.ones(len(self._pending_rows), dtype=np.float32), (self._pending_rows, self._pending_cols)),
+                    shape=self.shape,
+                )
+                matrix = matrix + added
+                matrix.sum_duplicates()
+                # Implicit feedback: a track is saved or not
+                np.minimum(matrix.data, 1.0, out=matrix.data)
+            self._csr = matrix.tocsr()
+            self._pending_rows = []
+            self._pending_cols = []
+        return self._csr
+
+    def user_tracks(self, user_id):
+        """Columns of the tracks user_id has saved."""
+        csr = self.csr
+        row = self.user_to_row[user_id]
+        return csr.indices[csr.indptr[row]:csr.indptr[row + 1]]
+
+    def _write(self, directory):
+        sparse.save_npz(os.path.join(directory, 'interactions.npz'), self.csr)
+        with open(os.path.join(directory, 'interactions.json'), 'w') as f:
+            json.dump({'user_ids': self.user_ids, 'track_ids': self.track_ids,
+                       'metadata': [self.metadata.get(t) for t in self.track_ids]}, f)
+
+    def save(self, path):
+        """Save as a new version of path; readers see it only once it's complete."""
+        version = new_version(path)
+        try:
+            self._write(version)
+        except BaseException:
+            discard(version)
+            raise
+        publish(path, version)
+
+    @classmethod
+    def load(cls, path):
+        path = current_version(path)
+        matrix = cls()
+        with open(os.path.join(path, 'interactions.json')) as f:
+            meta = json.load(f)
+        matrix.user_ids = meta['user_ids']
+        matrix.user_to_row = {u: i for i, u in enumerate(matrix.user_ids)}
+        matrix.track_ids = meta['track_ids']
+        matrix.track_to_col = {t: i for i, t in enumerate(matrix.track_ids)}
+        matrix.metadata = {t: tuple(m) for t, m in zip(matrix.track_ids, meta['metadata']) if m}
+        matrix._csr = sparse.load_npz(os.path.join(path, 'interactions.npz')).tocsr().astype(np.float32)
+        return matrix
+
+
+class InteractionLog:
+    """
+    Append-only log of library changes shared by every process (see module
+    docstring). Appends go to the newest segment under a file lock; readers
+    read without it and only consume complete lines. A position is a
+    (segment, byte offset) pair.
+    """
+
+    def __init__(self, path=DEFAULT_COLLAB_PATH):
+        self.directory = os.path.join(path, 'log')
+
+    def segments(self):
+        try:
+            names = os.listdir(self.directory)
+        except FileNotFoundError:
+            return []
+        return sorted(int(name[:-len('.jsonl')]) for name in names
+                      if name.endswith('.jsonl') and name[:-len('.jsonl')].isdigit())
+
+    def _segment_path(self, segment):
+        return os.path.join(self.directory, f'{segment:08d}.jsonl')
+
+    def append(self, user_id, added_ids=(), removed_ids=(), metadata=None):
+        """Record that user_id saved added_ids and removed removed_ids; metadata as in InteractionMatrix.add()."""
+        line = json.dumps({'user_id': user_id, 'added': list(added_ids), 'removed': list(removed_ids),
+                           'metadata': {t: list(m) for t, m in (metadata or {}).items()}}) + '\n'
+        with locked(self.directory):
+            segments = self.segments()
+            with open(self._segment_path(segments[-1] if segments else 0), 'a') as f:
+                f.write(line)
+
+    def roll(self):
+        """Send further appends to a new segment and return its number; earlier segments are then final."""
+        with locked(self.directory):
+            segments = self.segments()
+            segment = segments[-1] + 1 if segments else 0
+            open(self._segment_path(segment), 'a').close()
+        return segment
+
+    def read(self, position=(0, 0), until=None):
+        """
+        Changes after position, stopping before segment `until` (default: read
+        to the end), as (list of change dicts, position after them).
+        """
+        segment, offset = position
+        changes = []
+        for current in self.segments():
+            if current < segment:
+                continue
+            if until is not None and current >= until:
+                break
+            start = offset if current == segment else 0
+            try:
+                with open(self._segment_path(current), 'rb') as f:
+                    f.seek(start)
+                    data = f.read()
+            except FileNotFoundError:
+                continue
+            # A line still being appended is read next time
+            end = data.rfind(b'\n') + 1
+            changes.extend(json.loads(line) for line in data[:end].splitlines() if line)
+            segment, offset = current, start + end
+        return changes, (segment, offset)
+
+    def prune(self, before):
+        """Delete the segments before `before` (once a saved model covers them)."""
+        with locked(self.directory):
+            for segment in self.segments():
+                if segment < before:
+                    os.remove(self._segment_path(segment))
+
+
+class ImplicitALS:
+    """
+    Latent factors for an implicit-feedback matrix.
+
+    method='als' is weighted ALS (Hu, Koren & Volinsky) with confidence
+    1 + alpha * r, solved with a few conjugate-gradient steps per sweep. Each
+    CG step is a handful of sparse x dense and dense x dense products over a
+    block of rows, so a sweep is fully vectorized; blocks run on a thread
+    pool of n_jobs threads (numpy/scipy release the GIL) on top of threaded
+    BLAS. method='svd' is a truncated SVD of the binary matrix.
+    """
+
+    METHODS = ('als', 'svd')
+
+    def __init__(self, factors=64, regularization=0.05, alpha=20.0, iterations=10, cg_steps=3,
+                 method='als', n_jobs=None, block_nnz=1_000_000, random_state=0):
+        if method not in self.METHODS:
+            raise ValueError(f"Unknown method '{method}', expected one of {self.METHODS}")
+        self.factors = factors
+        self.regularization = regularization
+        self.alpha = alpha
+        self.iterations = iterations
+        self.cg_steps = cg_steps
+        self.method = method
+        self.n_jobs = n_jobs or os.cpu_count() or 1
+        self.block_nnz = block_nnz
+        self.random_state = random_state
+        self.user_factors = None
+        self.item_factors = None
+
+    @property
+    def fitted(self):
+        return self.user_factors is not None
+
+    def _blocks(self, matrix, rows):
+        """Split rows into contiguous chunks of about block_nnz interactions each."""
+        counts = np.diff(matrix.indptr)[rows]
+        n_blocks = max(self.n_jobs, int(counts.sum() // self.block_nnz) + 1)
+        return [block for block in np.array_split(rows, min(n_blocks, len(rows))) if len(block)]
+
+    def _solve(self, matrix, rows, x, y, steps):
+        """
+        CG steps on (YtY + reg*I + Y_u^T (C_u - I) Y_u) x_u = Y_u^T C_u p_u for
+        every u in rows of matrix (users x items in x/y terms), updating x in place.
+        """
+        gram = y.T @ y + self.regularization * np.eye(y.shape[1], dtype=y.dtype)
+
+        def solve_block(block):
+            sub = matrix[block]
+            # Confidence minus one on the stored entries
+            weights = (self.alpha * sub.data).astype(y.dtype)
+            owner = np.repeat(np.arange(len(block)), np.diff(sub.indptr))
+            y_nnz = y[sub.indices]
+
+            def apply(v):
+                dots = np.einsum('nk,nk->n', v[owner], y_nnz) * weights
+                return v @ gram + sparse.csr_matrix((dots, sub.indices, sub.indptr), shape=sub.shape) @ y
+
+            xb = x[block]
+            b = sparse.csr_matrix((1 + weights, sub.indices, sub.indptr), shape=sub.shape) @ y
+            r = b - apply(xb)
+            p = r.copy()
+            rs_old = np.einsum('nk,nk->n', r, r)
+            for _ in range(steps):
+                ap = apply(p)
+                denom = np.einsum('nk,nk->n', p, ap)
+                step = np.divide(rs_old, denom, out=np.zeros_like(rs_old), where=denom > 0)
+                xb += step[:, None] * p
+                r -= step[:, None] * ap
+                rs_new = np.einsum('nk,nk->n', r, r)
+                beta = np.divide(rs_new, rs_old, out=np.zeros_like(rs_new), where=rs_old > 0)
+                p = r + beta[:, None] * p
+                rs_old = rs_new
+            x[block] = xb
+
+        blocks = self._blocks(matrix, np.asarray(rows))
+        if len(blocks) == 1:
+            solve_block(blocks[0])
+        else:
+            with ThreadPoolExecutor(max_workers=self.n_jobs) as pool:
+                list(pool.map(solve_block, blocks))
+
+    def fit(self, interactions):
+        """Fit user and item factors to a users x tracks CSR matrix."""
+        interactions = sparse.csr_matrix(interactions, dtype=np.float32)
+        n_users, n_items = interactions.shape
+
+        if self.method == 'svd':
+            from scipy.sparse.linalg import svds
+            k = min(self.factors, min(n_users, n_items) - 1)
+            u, s, vt = svds(interactions, k=k, random_state=self.random_state)
+            self.user_factors = np.ascontiguousarray(u * s, dtype=np.float32)
+            self.item_factors = np.ascontiguousarray(vt.T, dtype=np.float32)
+            return self
+
+        rng = np.random.default_rng(self.random_state)
+        self.user_factors = (rng.standard_normal((n_users, self.factors)) * 0.01).astype(np.float32)
+        self.item_factors = (rng.standard_normal((n_items, self.factors)) * 0.01).astype(np.float32)
+        by_item = interactions.T.tocsr()
+        for _ in range(self.iterations):
+            self._solve(interactions, np.arange(n_users), self.user_factors, self.item_factors, self.cg_steps)
+            self._solve(by_item, np.arange(n_items), self.item_factors, self.user_factors, self.cg_steps)
+        return self
+
+    def fold_in(self, interactions, user_rows=(), item_cols=()):
+        """
+        Fit factors for new/changed users and new tracks against the fixed
+        factors of everything else, growing the factor matrices to the
+        matrix's shape (new rows start at zero).
+        """
+        interactions = sparse.csr_matrix(interactions, dtype=np.float32)
+        n_users, n_items = interactions.shape
+        self.user_factors = _grow(self.user_factors, n_users)
+        self.item_factors = _grow(self.item_factors, n_items)
+
+        if self.method == 'svd':
+            # Projections onto the fixed singular vectors of the other side
+            if len(user_rows):
+                self.user_factors[user_rows] = interactions[user_rows] @ self.item_factors
+            if len(item_cols):
+                s2 = np.maximum((self.user_factors ** 2).sum(axis=0), 1e-12)
+                self.item_factors[item_cols] = (interactions[:, item_cols].T @ self.user_factors) / s2
+            return self
+
+        # Exact solves are cheap for a handful of rows: run CG to convergence
+        steps = self.factors
+        if len(user_rows):
+            self._solve(interactions, np.asarray(user_rows), self.user_factors, self.item_factors, steps)
+        if len(item_cols):
+            self._solve(interactions.T.tocsr(), np.asarray(item_cols), self.item_factors, self.user_factors, steps)
+        return self
+
+
+def _grow(factors, n):
+    if len(factors) >= n:
+        return factors
+    return np.vstack([factors, np.zeros((n - len(factors), factors.shape[1]), dtype=factors.dtype)])
+
+
+class CollaborativeRecommender:
+    """
+    "Tracks liked by similar listeners": an InteractionMatrix shared by every
+    user plus an ImplicitALS model. Safe to share between sessions/threads.
+    """
+
+    def __init__(self, model=None, interactions=None):
+        self.model = model or ImplicitALS()
+        self.interactions = interactions or InteractionMatrix()
+        # How far into the InteractionLog this recommender has replayed
+        self.log_position = (0, 0)
+        self._lock = threading.RLock()
+
+    @property
+    def trained(self):
+        return self.model.fitted
+
+    def add_user(self, user_id, saved_songs, removed_ids=()):
+        """
+        Add (or extend) a user's library from a saved-songs frame or a list of
+        track IDs, and drop the removed_ids they no longer have saved. With a
+        trained model the user and any new tracks are folded in right away,
+        so they get recommendations before the next train().
+        """
+        if isinstance(saved_songs, pd.DataFrame):
+            return self.update_user(user_id, *saved_songs_metadata(saved_songs), removed_ids=removed_ids)
+        return self.update_user(user_id, saved_songs, removed_ids=removed_ids)
+
+    def update_user(self, user_id, added_ids=(), metadata=None, removed_ids=()):
+        """add_user() for track IDs and their metadata (see InteractionMatrix.add). Returns the user's row."""
+        with self._lock:
+            n_tracks = len(self.interactions.track_ids)
+            self.interactions.remove(user_id, removed_ids)
+            row = self.interactions.add(user_id, added_ids, metadata)
+            if self.trained:
+                new_cols = np.arange(n_tracks, len(self.interactions.track_ids))
+                self.model.fold_in(self.interactions.csr, user_rows=[row])
+                if len(new_cols):
+                    self.model.fold_in(self.interactions.csr, item_cols=new_cols)
+            return row
+
+    def catch_up(self, log, until=None):
+        """Replay log changes made since the last catch_up() or the loaded save. Returns their number."""
+        with self._lock:
+            changes, self.log_position = log.read(self.log_position, until)
+            for change in changes:
+                metadata = {t: tuple(m) for t, m in change.get('metadata', {}).items()}
+                self.update_user(change['user_id'], change['added'], metadata, change['removed'])
+        return len(changes)
+
+    def train(self):
+        """Refit the model on the whole matrix."""
+        with self._lock:
+            interactions = self.interactions.csr
+        logger.info("Training %s on %d users x %d tracks (%d interactions)", self.model.method,
+                    interactions.shape[0], interactions.shape[1], interactions.nnz)
+        # Fit outside the lock; users added meanwhile are folded in afterwards
+        model = ImplicitALS(self.model.factors, self.model.regularization, self.model.alpha, self.model.iterations,
+                            self.model.cg_steps, self.model.method, self.model.n_jobs, self.model.block_nnz,
+                            self.model.random_state).fit(interactions)
+        with self._lock:
+            late_users = np.arange(interactions.shape[0], len(self.interactions.user_ids))
+            late_tracks = np.arange(interactions.shape[1], len(self.interactions.track_ids))
+            if len(late_users) or len(late_tracks):
+                model.fold_in(self.interactions.csr, user_rows=late_users)
+                model.fold_in(self.interactions.csr, item_cols=late_tracks)
+            self.model = model
+        return self
+
+    def recommend(self, user_ids, top_n=10, exclude_saved=True):
+        """
+        Top tracks for one user ID or a list of them, scored against every track
+        with one matrix product. Returns user_id, track_id, track, artist,
+        spotify_link, score and rank; unknown users get no rows.
+        """
+        if isinstance(user_ids, str):
+            user_ids = [user_ids]
+        with self._lock:
+            if not self.trained:
+                return pd.DataFrame()
+            known = [u for u in user_ids if u in self.interactions.user_to_row]
+            if not known:
+                return pd.DataFrame()
+            rows = np.array([self.interactions.user_to_row[u] for u in known])
+            scores = self.model.user_factors[rows] @ self.model.item_factors.T
+
+            if exclude_saved:
+                saved = self.interactions.csr[rows]
+                scores[np.repeat(np.arange(len(rows)), np.diff(saved.indptr)), saved.indices] = -np.inf
+
+            top_cols, top_scores = top_k(scores, top_n)
+            valid = np.isfinite(top_scores)
+            track_ids = [self.interactions.track_ids[c] for c in top_cols[valid]]
+            metadata = [self.interactions.metadata.get(t) or (None, None, None) for t in track_ids]
+
+        track, artist, link = zip(*metadata) if metadata else ((), (), ())
+        return pd.DataFrame({
+            'user_id': np.repeat(known, valid.sum(axis=1)),
+            'track_id': track_ids,
+            'track': track,
+            'artist': artist,
+            'spotify_link': [l or f"https://open.spotify.com/track/{t}" for l, t in zip(link, track_ids)],
+            'score': top_scores[valid],
+            'rank': np.nonzero(valid)[1] + 1,
+        })
+
+    def similar_users(self, user_id, n=5):
+        """The n users with the most similar taste (cosine of user factors), as (user_id, score) pairs."""
+        with self._lock:
+            if not self.trained or user_id not in self.interactions.user_to_row:
+                return []
+            factors = self.model.user_factors
+            norms = np.maximum(np.linalg.norm(factors, axis=1), 1e-12)
+            row = self.interactions.user_to_row[user_id]
+            scores = (factors @ factors[row]) / (norms * norms[row])
+            scores[row] = -np.inf
+            cols, values = top_k(scores[None, :], n)
+            return [(self.interactions.user_ids[c], float(s)) for c, s in zip(cols[0], values[0]) if np.isfinite(s)]
+
+    def save(self, path=DEFAULT_COLLAB_PATH):
+        """Save interactions and model as a new version of path; readers see it only once it's complete."""
+        with self._lock:
+            version = new_version(path)
+            try:
+                self.interactions._write(version)
+                params = {k: getattr(self.model, k) for k in ('factors', 'regularization', 'alpha', 'iterations',
+                                                               'cg_steps', 'method', 'block_nnz', 'random_state')}
+                with open(os.path.join(version, 'model.json'), 'w') as f:
+                    json.dump({**params, 'log_position': list(self.log_position)}, f)
+                if self.trained:
+                    np.save(os.path.join(version, 'user_factors.npy'), self.model.user_factors)
+                    np.save(os.path.join(version, 'item_factors.npy'), self.model.item_factors)
+            except BaseException:
+                discard(version)
+                raise
+            publish(path, version)
+
+    @classmethod
+    def load(cls, path=DEFAULT_COLLAB_PATH):
+        """Load the live version of a recommender saved with save(); an empty one if there is none yet."""
+        path = current_version(path)
+        if not os.path.exists(os.path.join(path, 'interactions.npz')):
+            return cls()
+        with open(os.path.join(path, 'model.json')) as f:
+            params = json.load(f)
+        log_position = tuple(params.pop('log_position', (0, 0)))
+        model = ImplicitALS(**params)
+        if os.path.exists(os.path.join(path, 'item_factors.npy')):
+            model.user_factors = np.load(os.path.join(path, 'user_factors.npy'))
+            model.item_factors = np.load(os.path.join(path, 'item_factors.npy'))
+        recommender = cls(model, InteractionMatrix.load(path))
+        recommender.log_position = log_position
+        return recommender
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Train the collaborative-filtering model")
+    sub = parser.add_subparsers(dest='command', required=True)
+    train = sub.add_parser('train', help="refit the model on every user's saved tracks")
+    train.add_argument('--path', default=DEFAULT_COLLAB_PATH)
+    train.add_argument('--method', choices=ImplicitALS.METHODS)
+    train.add_argument('--factors', type=int)
+    train.add_argument('--iterations', type=int)
+    args = parser.parse_args(argv)
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s %(name)s %(levelname)s %(message)s')
+
+    # One train at a time; the app keeps appending to the log meanwhile
+    log = InteractionLog(args.path)
+    with locked(args.path, '.train.lock'):
+        segment = log.roll()
+        recommender = CollaborativeRecommender.load(args.path)
+        replayed = recommender.catch_up(log, until=segment)
+        logger.info("Replayed %d library changes from the log", replayed)
+        if not recommender.interactions.user_ids:
+            logger.warning("No users in %s yet", args.path)
+            return 1
+        for name in ('method', 'factors', 'iterations'):
+            if getattr(args, name) is not None:
+                setattr(recommender.model, name, getattr(args, name))
+        recommender.train()
+        recommender.log_position = (segment, 0)
+        recommender.save(args.path)
+        log.prune(segment)
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -1,160 +1,259 @@
+import json
+import logging
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
 import pandas as pd
-import streamlit as st
-import time
 
-def get_user_saved_songs(sp, limit=30):
-    """Fetch user's saved songs."""
+from Recommender import metrics
+from Recommender.cache import get_default_cache
+from Recommender.scheduler import BatchMetrics, BatchScheduler
+
+# Spotify returns at most 50 saved tracks per request
+SAVED_TRACKS_PAGE_SIZE = 50
+
+# Saved-tracks requests per second when no scheduler is passed in
+SAVED_TRACKS_RATE = 20.0
+
+SAVED_TRACK_COLS = ['id', 'uri', 'track', 'artist', 'spotify_link', 'added_at']
+
+# Relevant columns of the audio-features response
+AUDIO_FEATURE_COLS = [
+    'id', 'uri', 'danceability', 'energy', 'key', 'loudness', 
+    'mode', 'speechiness', 'acousticness', 'instrumentalness', 
+    'liveness', 'valence', 'tempo', 'duration_ms', 'time_signature'
+]
+
+logger = logging.getLogger(__name__)
+
+def _saved_track_row(item):
+    """Flatten one saved-tracks item into a row tuple (None for local/unavailable tracks)."""
+    track = item.get('track')
+    if not track or not track.get('id'):
+        return None
+    return (
+        track['id'],
+        track['uri'],
+        track['name'],
+        track['artists'][0]['name'] if track.get('artists') else None,
+        track.get('external_urls', {}).get('spotify'),
+        item.get('added_at'),
+    )
+
+def saved_tracks_scheduler(max_workers=8):
+    """BatchScheduler for saved-tracks pages when the caller has none to share."""
+    return BatchScheduler(batch_size=1, max_in_flight=max_workers, rate=SAVED_TRACKS_RATE, burst=max(10, max_workers))
+
+def saved_tracks_page(sp, limit, offset, scheduler):
+    """
+    One saved-tracks request, throttled and retried (429 Retry-After, 5xx,
+    connection errors) by the scheduler. Raises the last error once retries
+    run out. With metrics on, the (re-serialized) JSON size is recorded.
+    """
+    def saved_tracks(offsets):
+        return sp.current_user_saved_tracks(limit=limit, offset=offsets[0])
+
+    page, error = scheduler.run_batch(saved_tracks, [offset])
+    if error is not None:
+        raise error
+    if metrics.enabled():
+        metrics.observe('api.response_bytes', len(json.dumps(page)), endpoint='saved_tracks')
+    return page
+
+def _iter_saved_pages(sp, limit=None, page_size=SAVED_TRACKS_PAGE_SIZE, max_workers=8, scheduler=None):
+    """
+    Yield (offset, items, total) for every page of the user's saved tracks.
+    The first page tells us the total, the rest are fetched in parallel and
+    yielded in completion order. Every page goes through the scheduler, so a
+    rate-limited page is retried instead of failing the whole read.
+    At most max_workers pages are requested ahead of the consumer; pages not
+    yet started are cancelled when it stops early (close() or an error).
+    """
+    if scheduler is None:
+        scheduler = saved_tracks_scheduler(max_workers)
+    first = saved_tracks_page(sp, page_size, 0, scheduler)
+    total = first.get('total', len(first['items']))
+    if limit is not None:
+        total = min(total, limit)
+    
+    yield 0, first['items'][:total], total
+    
+    offsets = range(page_size, total, page_size)
+    if not offsets:
+        return
+    
+    offsets = iter(offsets)
+    pool = ThreadPoolExecutor(max_workers=max_workers)
+    pending = {}
+
+    def submit_next():
+        offset = next(offsets, None)
+        if offset is not None:
+            pending[pool.submit(saved_tracks_page, sp, min(page_size, total - offset), offset, scheduler)] = offset
+
+    try:
+        for _ in range(max_workers):
+            submit_next()
+        while pending:
+            done, _ = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                offset = pending.pop(future)
+                submit_next()
+                yield offset, future.result()['items'], total
+    finally:
+        # Pages already in flight finish in the background, nothing new starts
+        for future in pending:
+            future.cancel()
+        pool.shutdown(wait=False, cancel_futures=True)
+
+def iter_saved_tracks(sp, limit=None, page_size=SAVED_TRACKS_PAGE_SIZE, max_workers=8, scheduler=None):
+    """Stream the user's saved tracks as row dicts, as soon as each page arrives."""
+    for _, items, _ in _iter_saved_pages(sp, limit, page_size, max_workers, scheduler):
+        for item in items:
+            row = _saved_track_row(item)
+            if row is not None:
+                yield dict(zip(SAVED_TRACK_COLS, row))
+
+def get_user_saved_songs(sp, limit=None, max_workers=8, progress=None, scheduler=None):
+    """
+    Fetch the user's saved songs (the whole library unless limit is given).
+    Pages share the scheduler's rate limit (pass the one used for audio
+    features) and are retried on their own; an empty frame is returned only
+    if a page still fails after its retries.
+    progress(done, total) is called from this thread as pages arrive.
+    """
     try:
-        results = sp.current_user_saved_tracks(limit=limit)
-        tracks = []
+        # Build the frame column by column, pages may arrive out of order
+        columns = {col: [] for col in SAVED_TRACK_COLS}
+        positions = []
+        seen = 0
+        
+        with metrics.timer('library.saved_tracks'):
+            for offset, items, total in _iter_saved_pages(sp, limit, max_workers=max_workers, scheduler=scheduler):
+                for i, item in enumerate(items):
+                    row = _saved_track_row(item)
+                    if row is None:
+                        continue
+                    positions.append(offset + i)
+                    for col, value in zip(SAVED_TRACK_COLS, row):
+                        columns[col].append(value)
+                seen += len(items)
+                if progress is not None:
+                    progress(seen, total)
         
-        for item in results['items']:
-            track = item['track']
-            tracks.append({
-                'id': track['id'],
-                'uri': track['uri'],
-                'track': track['name'],
-                'artist': track['artists'][0]['name'],
-                'spotify_link': track['external_urls']['spotify']
-            })
+        tracks = pd.DataFrame(columns)
+        # Restore library order (most recently saved first)
+        tracks = tracks.iloc[pd.Series(positions).argsort().to_numpy()].reset_index(drop=True)
         
-        st.success(f"✅ Found {len(tracks)} saved songs")
-        return pd.DataFrame(tracks)
+        logger.info("Found %d saved songs", len(tracks))
+        return tracks
     
-    except Exception as e:
-        st.error(f"Error fetching saved songs: {e}")
+    except Exception:
+        logger.exception("Error fetching saved songs")
         return pd.DataFrame()
 
-def get_audio_features(sp, track_uris_or_ids):
-    """Get audio features for track URIs or IDs"""
-    st.write("🔍 Starting audio features analysis...")
-    
-    if not track_uris_or_ids:
-        st.error("No track URIs/IDs provided")
-        return pd.DataFrame()
-    
-    st.write(f"📊 Processing {len(track_uris_or_ids)} tracks...")
-    
-    # Extract track IDs (handle both URIs and raw IDs)
+def _extract_track_ids(track_uris_or_ids):
+    """Track IDs from a mix of URIs and raw 22-character IDs, skipping anything else."""
     track_ids = []
     for item in track_uris_or_ids:
         if item and isinstance(item, str):
             if 'spotify:track:' in item:
                 # It's a URI, extract the ID
-                track_id = item.split(':')[-1]
-                track_ids.append(track_id)
+                track_ids.append(item.split(':')[-1])
             elif len(item) == 22:
                 # It's already a track ID
                 track_ids.append(item)
             else:
-                st.write(f"   ❌ Invalid format: {item}")
+                logger.warning("Invalid track format: %s", item)
         else:
-            st.write(f"   ❌ Invalid item: {item}")
+            logger.warning("Invalid track item: %r", item)
+    return track_ids
+
+def get_audio_features(sp, track_uris_or_ids, scheduler=None, cache=None, progress=None):
+    """
+    Get audio features for track URIs or IDs.
+    Cached features come from the shared FeatureCache, the rest are fetched
+    through a BatchScheduler and written back to the cache.
+    progress(done, total) is called from this thread as batches finish.
+    """
+    if not track_uris_or_ids:
+        logger.error("No track URIs/IDs provided")
+        return pd.DataFrame()
     
-    st.write(f"📊 Extracted {len(track_ids)} valid track IDs")
-    st.write(f"Sample track IDs: {track_ids[:3]}")
+    track_ids = _extract_track_ids(track_uris_or_ids)
+    logger.info("Extracted %d valid track IDs from %d items", len(track_ids), len(track_uris_or_ids))
     
     if not track_ids:
-        st.error("No valid track IDs could be extracted")
+        logger.error("No valid track IDs could be extracted")
         return pd.DataFrame()
     
-    all_features = []
+    if cache is None:
+        cache = get_default_cache()
+    if scheduler is None:
+        scheduler = BatchScheduler()
     
-    # Process in smaller batches for debugging
-    batch_size = 10  # Smaller batch size for debugging
-    total_batches = (len(track_ids) + batch_size - 1) // batch_size
+    # Only IDs the shared cache doesn't know about go to the API
+    cached, missing_ids = cache.get_many(track_ids)
+    all_features = [f for f in cached.values() if f is not None]
+    none_count = len(cached) - len(all_features)
+    logger.info("%d tracks from cache, %d to fetch", len(cached), len(missing_ids))
     
-    for i in range(0, len(track_ids), batch_size):
-        batch_ids = track_ids[i:i + batch_size]
-        batch_num = (i // batch_size) + 1
+    if missing_ids:
+        fetched = {}
+        batch_progress = None
+        if progress is not None:
+            batch_progress = lambda done, total: progress(len(cached) + done, len(cached) + total)
         
-        st.write(f"   🔄 Processing batch {batch_num}/{total_batches} ({len(batch_ids)} tracks)...")
+        run_metrics = BatchMetrics()
+        with metrics.timer('library.audio_features'):
+            outcomes = scheduler.run(sp.audio_features, missing_ids, progress=batch_progress,
+                                     run_metrics=run_metrics)
         
-        try:
-            # Get audio features for this batch
-            st.write(f"   📡 Calling sp.audio_features() with {len(batch_ids)} track IDs...")
-            features = sp.audio_features(batch_ids)
-            
-            if features is None:
-                st.error("   ❌ sp.audio_features() returned None")
+        for batch_ids, features, error in outcomes:
+            if error is not None:
+                logger.error("Batch of %d tracks failed: %s", len(batch_ids), error)
                 continue
-                
-            st.write(f"   📨 API returned {len(features)} items")
             
-            if features:
-                valid_count = sum(1 for f in features if f is not None)
-                none_count = sum(1 for f in features if f is None)
-                st.write(f"   📊 Valid features: {valid_count}, None results: {none_count}")
-                
-                if valid_count > 0:
-                    valid_features = [f for f in features if f is not None]
-                    all_features.extend(valid_features)
-                    st.write(f"   ✅ Added {len(valid_features)} features to results")
-                    
-                    # Show sample of what we got
-                    if len(valid_features) > 0:
-                        sample_feature = valid_features[0]
-                        st.write(f"   🔍 Sample feature keys: {list(sample_feature.keys())}")
-                else:
-                    st.write(f"   ⚠️ No valid features in this batch")
-                    st.write(f"   💡 Batch IDs that failed: {batch_ids}")
-            else:
-                st.write(f"   ❌ features list is empty")
+            if not features:
+                logger.warning("No features returned for a batch of %d tracks", len(batch_ids))
+                continue
             
-            # Small delay
-            time.sleep(0.5)
+            if metrics.enabled():
+                metrics.observe('api.response_bytes', len(json.dumps(features)), endpoint='audio_features')
             
-        except Exception as e:
-            st.error(f"   💥 Exception in batch {batch_num}: {str(e)}")
-            st.error(f"   💥 Exception type: {type(e).__name__}")
-            continue
+            # Results come back in request order, None for unknown tracks
+            fetched.update(zip(batch_ids, features))
+        
+        cache.put_many(fetched)
+        valid_features = [f for f in fetched.values() if f is not None]
+        none_count += len(fetched) - len(valid_features)
+        all_features.extend(valid_features)
+        
+        stats = run_metrics.summary()
+        logger.info("%d batches, %d retries, %.0f tracks/s (p95 batch latency %.0f ms)",
+                    stats['batches'], stats['retries'], stats['throughput_items_per_s'],
+                    stats['latency_p95_s'] * 1000)
+    elif progress is not None:
+        progress(len(cached), len(cached))
     
-    st.write(f"📈 Finished processing. Total features collected: {len(all_features)}")
+    if none_count:
+        logger.warning("No audio features available for %d tracks", none_count)
     
     if not all_features:
-        st.error("❌ No audio features collected in any batch")
-        st.error("💡 Possible issues:")
-        st.error("   - Track IDs might not exist in Spotify's database")
-        st.error("   - API rate limiting")
-        st.error("   - Authentication issues")
+        # Nothing but cached "no features" answers (e.g. local files) is not an error
+        if missing_ids:
+            logger.error("No audio features collected (unknown track IDs, rate limiting or authentication issues?)")
         return pd.DataFrame()
     
-    # Convert to DataFrame
-    try:
-        df = pd.DataFrame(all_features)
-        st.write(f"💾 DataFrame created with shape: {df.shape}")
-        
-        if df.empty:
-            st.error("❌ DataFrame is empty after conversion")
-            return pd.DataFrame()
-        
-        # Check if we have the essential columns
-        st.write(f"💾 DataFrame columns: {df.columns.tolist()}")
-        
-        # Ensure we have URI column
-        if 'uri' not in df.columns and 'id' in df.columns:
-            df['uri'] = 'spotify:track:' + df['id']
-            st.write("💾 Added missing 'uri' column from IDs")
-        
-        # Select relevant audio feature columns
-        audio_feature_cols = [
-            'id', 'uri', 'danceability', 'energy', 'key', 'loudness', 
-            'mode', 'speechiness', 'acousticness', 'instrumentalness', 
-            'liveness', 'valence', 'tempo', 'duration_ms', 'time_signature'
-        ]
-        
-        available_cols = [col for col in audio_feature_cols if col in df.columns]
-        st.write(f"💾 Using columns: {available_cols}")
-        
-        if not available_cols:
-            st.error("❌ No audio feature columns available")
-            return pd.DataFrame()
-            
-        df = df[available_cols]
-        
-        st.success(f"🎉 Success! Analyzed {len(df)} tracks")
-        return df
-        
-    except Exception as e:
-        st.error(f"❌ Error converting to DataFrame: {str(e)}")
-        return pd.DataFrame()
\ No newline at end of file
+    df = pd.DataFrame(all_features)
+    
+    # Ensure we have URI column
+    if 'uri' not in df.columns and 'id' in df.columns:
+        df['uri'] = 'spotify:track:' + df['id']
+    
+    available_cols = [col for col in AUDIO_FEATURE_COLS if col in df.columns]
+    if not available_cols:
+        logger.error("No audio feature columns available")
+        return pd.DataFrame()
+    
+    logger.info("Analyzed %d tracks", len(df))
+    return df[available_cols]
@@ -0,0 +1,224 @@
+# Recommender/fake.py
+import hashlib
+import json
+import random
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+from spotipy.exceptions import SpotifyException
+
+AUDIO_FEATURES_MAX_IDS = 100
+SAVED_TRACKS_MAX_LIMIT = 50
+
+# added_at of the newest track in a fresh FakeSpotify library (2024-01-01T00:00:00Z);
+# every older track was saved a minute before the next
+_LIBRARY_EPOCH = 1704067200
+
+
+def fake_track_id(n):
+    """Deterministic 22-character track ID for track number n."""
+    return hashlib.sha1(str(n).encode()).hexdigest()[:22]
+
+
+def fake_audio_features(track_id):
+    """Deterministic audio features for a track ID, in the shape the Web API returns them."""
+    rng = random.Random(track_id)
+    return {
+        'id': track_id,
+        'uri': f'spotify:track:{track_id}',
+        'type': 'audio_features',
+        'danceability': rng.random(),
+        'energy': rng.random(),
+        'key': rng.randrange(12),
+        'loudness': rng.uniform(-30, 0),
+        'mode': rng.randrange(2),
+        'speechiness': rng.random() * 0.5,
+        'acousticness': rng.random(),
+        'instrumentalness': rng.random() ** 3,
+        'liveness': rng.random() * 0.6,
+        'valence': rng.random(),
+        'tempo': rng.uniform(60, 200),
+        'duration_ms': rng.randrange(90_000, 420_000),
+        'time_signature': rng.choice([3, 4, 4, 4, 5]),
+    }
+
+
+class FakeSpotify:
+    """
+    Offline stand-in for spotipy.Spotify covering the calls the data layer makes.
+
+    Simulates per-request latency, an optional server-side rate limit (raising
+    429 SpotifyException with a Retry-After header like the real API) and a
+    fraction of tracks the API has no audio features for. The library is
+    returned newest first; save_new_tracks() and current_user_saved_tracks_delete()
+    change it like a user saving/removing songs would.
+    """
+
+    def __init__(self, n_tracks=500, latency=0.05, rate_limit=None, retry_after=1,
+                 missing_rate=0.0, user_id='fake_user', seed=0):
+        self.n_tracks = n_tracks
+        self.latency = latency
+        self.rate_limit = rate_limit
+        self.retry_after = retry_after
+        self.missing_rate = missing_rate
+        self.user_id = user_id
+        self.seed = seed
+        self.calls = {'current_user': 0, 'current_user_saved_tracks': 0, 'audio_features': 0}
+        self.throttled = 0
+        self._window = []
+        self._lock = threading.Lock()
+        self._n_artists = max(1, n_tracks // 8)
+        # Track numbers, newest first, and when each was saved (epoch seconds)
+        self._library = list(range(n_tracks))
+        self._added_at = {n: _LIBRARY_EPOCH - 60 * n for n in self._library}
+        self._next_track = n_tracks
+
+    def _request(self, name):
+        with self._lock:
+            self.calls[name] += 1
+            if self.rate_limit is not None:
+                now = time.monotonic()
+                self._window = [t for t in self._window if now - t < 1.0]
+                if len(self._window) >= self.rate_limit:
+                    self.throttled += 1
+                    raise SpotifyException(429, -1, 'API rate limit exceeded',
+                                           headers={'Retry-After': str(self.retry_after)})
+                self._window.append(now)
+        if self.latency:
+            time.sleep(self.latency)
+
+    def _track(self, n):
+        track_id = fake_track_id(n + self.seed * 10_000_000)
+        return {
+            'id': track_id,
+            'uri': f'spotify:track:{track_id}',
+            'name': f'Track {n}',
+            'artists': [{'name': f'Artist {n % self._n_artists}'}],
+            'external_urls': {'spotify': f'https://open.spotify.com/track/{track_id}'},
+        }
+
+    def current_user(self):
+        self._request('current_user')
+        return {'id': self.user_id, 'display_name': self.user_id}
+
+    def current_user_saved_tracks(self, limit=20, offset=0, market=None):
+        if limit > SAVED_TRACKS_MAX_LIMIT:
+            raise SpotifyException(400, -1, 'Invalid limit')
+        self._request('current_user_saved_tracks')
+        with self._lock:
+            page = self._library[offset:offset + limit]
+            total = len(self._library)
+        items = [{'added_at': time.strftime('%Y-%m-%dT%H:%M:%SZ', time.gmtime(self._added_at[n])),
+                  'track': self._track(n)} for n in page]
+        return {'items': items, 'total': total, 'limit': limit, 'offset': offset}
+
+    def save_new_tracks(self, count=1):
+        """Save `count` tracks not in the library yet, a minute apart, newest last. Returns their IDs."""
+        with self._lock:
+            latest = max(self._added_at.values(), default=_LIBRARY_EPOCH)
+            new = list(range(self._next_track, self._next_track + count))
+            self._next_track += count
+            for i, n in enumerate(new):
+                self._added_at[n] = latest + 60 * (i + 1)
+            self._library[:0] = new[::-1]
+            self.n_tracks = len(self._library)
+        return [self._track(n)['id'] for n in new]
+
+    def current_user_saved_tracks_delete(self, tracks=None):
+        """Remove track IDs/URIs from the library."""
+        drop = {track.split(':')[-1] for track in tracks or []}
+        self._request('current_user_saved_tracks')
+        with self._lock:
+            self._library = [n for n in self._library if self._track(n)['id'] not in drop]
+            self.n_tracks = len(self._library)
+
+    def audio_features(self, tracks=[]):
+        if len(tracks) > AUDIO_FEATURES_MAX_IDS:
+            raise SpotifyException(400, -1, 'Too many ids requested')
+        self._request('audio_features')
+        features = []
+        for track in tracks:
+            track_id = track.split(':')[-1]
+            missing = random.Random(track_id + 'missing').random() < self.missing_rate
+            features.append(None if missing else fake_audio_features(track_id))
+        return features
+
+
+class _FakeApiHandler(BaseHTTPRequestHandler):
+    """Serves /v1/me/tracks and /v1/audio-features from the server's FakeSpotify."""
+
+    protocol_version = 'HTTP/1.1'
+
+    def log_message(self, format, *args):
+        pass
+
+    def _send(self, status, body, headers=None):
+        payload = json.dumps(body).encode()
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(payload)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def do_GET(self):
+        url = urlparse(self.path)
+        params = parse_qs(url.query)
+        sp = self.server.sp
+        try:
+            if url.path == '/v1/me/tracks':
+                body = sp.current_user_saved_tracks(limit=int(params.get('limit', ['20'])[0]),
+                                                    offset=int(params.get('offset', ['0'])[0]))
+            elif url.path == '/v1/audio-features':
+                ids = params.get('ids', [''])[0].split(',')
+                body = {'audio_features': sp.audio_features(ids)}
+            elif url.path == '/v1/me':
+                body = sp.current_user()
+            else:
+                return self._send(404, {'error': {'status': 404, 'message': 'Not found'}})
+        except SpotifyException as e:
+            return self._send(e.http_status, {'error': {'status': e.http_status, 'message': e.msg}}, e.headers)
+        self._send(200, body)
+
+
+class FakeSpotifyServer:
+    """
+    Local HTTP server speaking the subset of the Web API the data layer uses,
+    backed by a FakeSpotify. For benchmarking real HTTP clients offline:
+
+        with FakeSpotifyServer(FakeSpotify(5000)) as server:
+            client = AsyncSpotifyClient('token', base_url=server.base_url)
+    """
+
+    def __init__(self, sp=None, host='127.0.0.1', port=0):
+        self.httpd = ThreadingHTTPServer((host, port), _FakeApiHandler)
+        self.httpd.daemon_threads = True
+        self.httpd.sp = sp or FakeSpotify()
+        self._thread = None
+
+    @property
+    def sp(self):
+        return self.httpd.sp
+
+    @property
+    def base_url(self):
+        host, port = self.httpd.server_address[:2]
+        return f'http://{host}:{port}/v1'
+
+    def start(self):
+        self._thread = threading.Thread(target=self.httpd.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
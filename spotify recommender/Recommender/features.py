@@ -1,13 +1,117 @@
+# features.py
+"""
+The one definition of how audio features become similarity vectors.
 
+Raw columns (FEATURE_COLS) are what the catalog and indexes store. A
+FeaturePipeline turns them into vectors in three steps:
+
+  encode     key becomes sin/cos of its pitch-class angle (or one-hot), so
+             B (11) sits next to C (0); unknown key (-1) encodes as zeros
+  weight     continuous columns are standardized, categorical encodings only
+             centred, then every column is multiplied by its weight (a
+             column split into several encodings shares its weight)
+  project    optional PCA down to n_components dimensions
+"""
+import numpy as np
 
-# features.py
 FEATURE_COLS = [
-    'danceability', 'energy', 'key', 'loudness', 'mode', 
-    'speechiness', 'acousticness', 'instrumentalness', 'liveness', 
+    'danceability', 'energy', 'key', 'loudness', 'mode',
+    'speechiness', 'acousticness', 'instrumentalness', 'liveness',
     'valence', 'tempo', 'duration_ms', 'time_signature'
 ]
 
+CATEGORICAL_COLS = ['key', 'mode', 'time_signature']
+
+# Relative importance of each raw column; length and metre matter less than
+# how a track sounds
+DEFAULT_WEIGHTS = {
+    'danceability': 1.0, 'energy': 1.0, 'key': 0.5, 'loudness': 1.0, 'mode': 0.5,
+    'speechiness': 1.0, 'acousticness': 1.0, 'instrumentalness': 1.0, 'liveness': 0.5,
+    'valence': 1.0, 'tempo': 1.0, 'duration_ms': 0.25, 'time_signature': 0.25,
+}
+
+KEY_ENCODINGS = ('cyclic', 'onehot', 'linear')
+
+
 def get_feature_columns():
     """Return the list of Spotify audio feature columns."""
     return FEATURE_COLS
 
+
+class FeaturePipeline:
+    """Encoding, weighting and optional PCA projection of raw FEATURE_COLS rows."""
+
+    def __init__(self, columns=FEATURE_COLS, weights=None, key_encoding='cyclic', n_components=None):
+        if key_encoding not in KEY_ENCODINGS:
+            raise ValueError(f"Unknown key_encoding '{key_encoding}', expected one of {KEY_ENCODINGS}")
+        self.columns = list(columns)
+        self.weights = {col: DEFAULT_WEIGHTS.get(col, 1.0) for col in self.columns}
+        self.weights.update(weights or {})
+        self.key_encoding = key_encoding
+        self.n_components = n_components
+
+        # Encoded column names, which raw column each comes from, and whether it's standardized
+        self.encoded_cols, sources, self.standardized = [], [], []
+        for col in self.columns:
+            if col == 'key' and key_encoding == 'cyclic':
+                names = ['key_sin', 'key_cos']
+            elif col == 'key' and key_encoding == 'onehot':
+                names = [f'key_{k}' for k in range(12)]
+            else:
+                names = [col]
+            self.encoded_cols += names
+            sources += [col] * len(names)
+            categorical = col in CATEGORICAL_COLS and not (col == 'key' and key_encoding == 'linear')
+            self.standardized += [not categorical] * len(names)
+        self.standardized = np.array(self.standardized)
+        self.weight_vector = np.array([self.weights[col] / np.sqrt(sources.count(col)) for col in sources])
+
+    @property
+    def dim(self):
+        """Width of the vectors after encoding (before PCA)."""
+        return len(self.encoded_cols)
+
+    def to_dict(self):
+        return {'columns': self.columns, 'weights': self.weights, 'key_encoding': self.key_encoding,
+                'n_components': self.n_components}
+
+    @classmethod
+    def from_dict(cls, config):
+        return cls(**config)
+
+    def encode(self, raw):
+        """(n, len(columns)) raw rows -> (n, dim) float64 encoded rows."""
+        raw = np.atleast_2d(np.asarray(raw, dtype=np.float64))
+        if 'key' not in self.columns or self.key_encoding == 'linear':
+            return raw
+
+        i = self.columns.index('key')
+        key = raw[:, i]
+        known = (key >= 0) & (key < 12)
+        if self.key_encoding == 'cyclic':
+            angle = 2 * np.pi * key / 12
+            encoded = np.stack([np.sin(angle), np.cos(angle)], axis=1) * known[:, None]
+        else:
+            encoded = np.zeros((len(raw), 12))
+            encoded[known, key[known].astype(int)] = 1.0
+        return np.hstack([raw[:, :i], encoded, raw[:, i + 1:]])
+
+    def scale_for(self, var):
+        """Per encoded column divisor: std for standardized columns (1.0 if constant), else 1."""
+        scale = np.sqrt(np.asarray(var, dtype=np.float64))
+        scale[(scale == 0) | ~self.standardized] = 1.0
+        return scale
+
+    def weigh(self, encoded, mean, scale):
+        """Centre, scale and weight encoded rows."""
+        return (encoded - mean) / scale * self.weight_vector
+
+    def fit_projection(self, weighted):
+        """PCA components (dim, n_components) of weighted rows, or None without n_components."""
+        if not self.n_components or self.n_components >= self.dim or len(weighted) < 2:
+            return None
+        weighted = np.asarray(weighted, dtype=np.float64)
+        centred = weighted - weighted.mean(axis=0)
+        # Eigenvectors of the dim x dim covariance, largest variance first
+        eigvals, eigvecs = np.linalg.eigh(centred.T @ centred)
+        return eigvecs[:, np.argsort(eigvals)[::-1][:self.n_components]]
@@ -0,0 +1,293 @@
+# Recommender/global_index.py
+"""
+Global track index: audio-feature vectors for every track any user has
+fetched, so recommendations can go beyond one user's library.
+
+On disk it is a directory of append-only segments plus a manifest:
+
+    manifest.json          feature pipeline, frozen scaler stats, segment list
+    seg-000001/ids.npy     track IDs, sorted (fixed-width strings)
+               vectors.npy pipeline vectors, unit length, float32
+               raw.npy     raw float32 features
+               track.npy, artist.npy, spotify_link.npy
+
+Every array is memory-mapped on open: startup parses nothing, and worker
+processes opening the same directory share the pages. Lookups by track ID
+are binary searches over the sorted IDs. add() writes only the tracks that
+are new as a fresh segment; compact() merges segments and refits the scaler.
+
+    python -m Recommender.global_index build --path .spotify_cache/global_index
+"""
+import argparse
+import contextlib
+import json
+import logging
+import os
+import shutil
+import sys
+import threading
+
+import numpy as np
+import pandas as pd
+
+from Recommender.catalog import spotify_links
+from Recommender.features import FeaturePipeline
+from Recommender.index import _normalize_rows, top_k
+from Recommender.model import _frame_features, track_ids_from_frame
+
+DEFAULT_INDEX_PATH = os.path.join('.spotify_cache', 'global_index')
+
+_METADATA_COLS = ('track', 'artist', 'spotify_link')
+
+logger = logging.getLogger(__name__)
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+
+
+class _Segment:
+    """One memory-mapped segment; rows sorted by track ID."""
+
+    def __init__(self, path):
+        self.path = path
+        self.ids = np.load(os.path.join(path, 'ids.npy'), mmap_mode='r')
+        self.vectors = np.load(os.path.join(path, 'vectors.npy'), mmap_mode='r')
+        self.raw = np.load(os.path.join(path, 'raw.npy'), mmap_mode='r')
+        self.metadata = {col: np.load(os.path.join(path, f'{col}.npy'), mmap_mode='r') for col in _METADATA_COLS}
+
+    def __len__(self):
+        return len(self.ids)
+
+    def find(self, track_ids):
+        """Row of each track ID in this segment, -1 where absent."""
+        track_ids = np.asarray(track_ids, dtype=str)
+        if not len(self) or not len(track_ids):
+            return np.full(len(track_ids), -1)
+        rows = np.minimum(np.searchsorted(self.ids, track_ids), len(self) - 1)
+        return np.where(self.ids[rows] == track_ids, rows, -1)
+
+
+class GlobalIndex:
+    """Read side of the segment directory, plus incremental writes (see module docstring)."""
+
+    def __init__(self, path=DEFAULT_INDEX_PATH):
+        self.path = path
+        self.pipeline = None
+        self.feature_cols = []
+        self.mean = None
+        self.scale = None
+        self.segments = []
+        self._manifest_mtime = None
+        self._lock = threading.RLock()
+        self.refresh()
+
+    def __len__(self):
+        return sum(len(s) for s in self.segments)
+
+    def __contains__(self, track_id):
+        return any(s.find([track_id])[0] >= 0 for s in self.segments)
+
+    @property
+    def _manifest_path(self):
+        return os.path.join(self.path, 'manifest.json')
+
+    def refresh(self):
+        """Re-open the directory if another process changed it. Returns True when it did."""
+        with self._lock:
+            try:
+                mtime = os.stat(self._manifest_path).st_mtime_ns
+            except FileNotFoundError:
+                return False
+            if mtime == self._manifest_mtime:
+                return False
+            with open(self._manifest_path) as f:
+                manifest = json.load(f)
+            self.pipeline = FeaturePipeline.from_dict(manifest['pipeline'])
+            self.feature_cols = self.pipeline.columns
+            self.mean = np.array(manifest['mean'])
+            self.scale = np.array(manifest['scale'])
+            self.segments = [_Segment(os.path.join(self.path, name)) for name in manifest['segments']]
+            self._manifest_mtime = mtime
+            return True
+
+    def transform(self, features):
+        """Unit-length pipeline vectors for raw feature rows, with the index's frozen scaler."""
+        return _normalize_rows(self.pipeline.weigh(self.pipeline.encode(features), self.mean, self.scale))
+
+    def query(self, features, k=10, exclude_ids=()):
+        """
+        The k tracks most similar to each raw feature row, across all segments.
+        Returns (track_ids, scores, locations): lists per query row, locations
+        being (segment, row) pairs for take().
+        """
+        with self._lock:
+            segments = list(self.segments)
+        queries = self.transform(features)
+        exclude_ids = np.asarray(list(exclude_ids), dtype=str)
+
+        best_scores, best_locs = [], []
+        for s, segment in enumerate(segments):
+            if not len(segment):
+                continue
+            scores = queries @ segment.vectors.T
+            if len(exclude_ids):
+                rows = segment.find(exclude_ids)
+                scores[:, rows[rows >= 0]] = -np.inf
+            rows, seg_scores = top_k(scores, k)
+            best_scores.append(seg_scores)
+            best_locs.append(np.stack([np.full_like(rows, s), rows], axis=-1))
+        if not best_scores:
+            return [[] for _ in queries], [[] for _ in queries], [[] for _ in queries]
+
+        # Merge the per-segment top k
+        scores = np.concatenate(best_scores, axis=1)
+        locs = np.concatenate(best_locs, axis=1)
+        order, scores = top_k(scores, k)
+        locs = np.take_along_axis(locs, order[..., None], axis=1)
+
+        ids, out_scores, out_locs = [], [], []
+        for q in range(len(queries)):
+            valid = np.isfinite(scores[q])
+            ids.append([str(segments[s].ids[r]) for s, r in locs[q][valid]])
+            out_scores.append(scores[q][valid])
+            out_locs.append([(segments[s], r) for s, r in locs[q][valid]])
+        return ids, out_scores, out_locs
+
+    def take(self, locations, feature_cols=()):
+        """Metadata (plus raw feature columns) for (segment, row) pairs, as a DataFrame."""
+        track_ids = [str(segment.ids[r]) for segment, r in locations]
+        frame = {'track_id': track_ids}
+        for col in _METADATA_COLS:
+            frame[col] = [str(segment.metadata[col][r]) or None for segment, r in locations]
+        frame['spotify_link'] = spotify_links(frame['spotify_link'], track_ids)
+        for col in feature_cols:
+            if col in self.feature_cols:
+                i = self.feature_cols.index(col)
+                frame[col] = np.array([segment.raw[r, i] for segment, r in locations], dtype=np.float32)
+            else:
+                frame[col] = np.nan
+        return pd.DataFrame(frame)
+
+    @contextlib.contextmanager
+    def _locked(self):
+        """Inter-process write lock (only within this process where fcntl is missing)."""
+        with self._lock:
+            os.makedirs(self.path, exist_ok=True)
+            with open(os.path.join(self.path, '.lock'), 'w') as lock_file:
+                if fcntl is not None:
+                    fcntl.flock(lock_file, fcntl.LOCK_EX)
+                self.refresh()
+                yield
+
+    def _write_manifest(self, segment_names):
+        manifest = {'pipeline': self.pipeline.to_dict(), 'mean': self.mean.tolist(),
+                    'scale': self.scale.tolist(), 'segments': segment_names}
+        tmp = self._manifest_path + '.tmp'
+        with open(tmp, 'w') as f:
+            json.dump(manifest, f)
+        os.replace(tmp, self._manifest_path)
+        self._manifest_mtime = None
+        self.refresh()
+
+    def _write_segment(self, track_ids, raw, metadata):
+        names = [os.path.basename(s.path) for s in self.segments]
+        number = max([int(n.split('-')[1]) for n in names], default=0) + 1
+        path = os.path.join(self.path, f'seg-{number:06d}')
+        os.makedirs(path, exist_ok=True)
+
+        order = np.argsort(np.asarray(track_ids, dtype=str), kind='stable')
+        raw = raw[order]
+        np.save(os.path.join(path, 'ids.npy'), np.asarray(track_ids, dtype=str)[order])
+        np.save(os.path.join(path, 'raw.npy'), raw.astype(np.float32))
+        np.save(os.path.join(path, 'vectors.npy'), self.transform(raw))
+        for col in _METADATA_COLS:
+            values = metadata.get(col)
+            values = [''] * len(track_ids) if values is None else ['' if v is None or v != v else str(v) for v in values]
+            np.save(os.path.join(path, f'{col}.npy'), np.asarray(values, dtype=str)[order])
+        return os.path.basename(path)
+
+    def _fit_scaler(self, raw):
+        encoded = self.pipeline.encode(raw)
+        self.mean = encoded.mean(axis=0)
+        self.scale = self.pipeline.scale_for(encoded.var(axis=0))
+
+    def add(self, frame, pipeline=None):
+        """
+        Add the tracks of a songs_with_audio or get_audio_features frame that
+        the index doesn't have yet, as one new segment. The first add() fixes
+        the feature pipeline (default: FeaturePipeline() without PCA) and the
+        scaler stats. Returns the number added.
+        """
+        if frame is None or frame.empty or 'danceability' not in frame.columns:
+            return 0
+        frame = frame.dropna(subset=['danceability'])
+        track_ids = np.asarray(track_ids_from_frame(frame), dtype=str)
+        with self._locked():
+            if self.pipeline is None:
+                self.pipeline = pipeline or FeaturePipeline()
+                self.feature_cols = self.pipeline.columns
+
+            # First occurrence of every ID no segment has yet
+            _, first = np.unique(track_ids, return_index=True)
+            new = np.zeros(len(track_ids), dtype=bool)
+            new[first] = True
+            for segment in self.segments:
+                new &= segment.find(track_ids) < 0
+            if not new.any():
+                return 0
+
+            raw = _frame_features(frame[new], self.feature_cols)
+            if self.mean is None:
+                self._fit_scaler(raw)
+            metadata = {col: frame[col].to_numpy()[new] for col in _METADATA_COLS if col in frame.columns}
+            name = self._write_segment(track_ids[new], raw, metadata)
+            self._write_manifest([os.path.basename(s.path) for s in self.segments] + [name])
+            logger.info("Added %d tracks to the global index (%d total)", int(new.sum()), len(self))
+            return int(new.sum())
+
+    def compact(self):
+        """Merge all segments into one and refit the scaler on every track."""
+        with self._locked():
+            if len(self.segments) <= 1 and self.mean is not None:
+                return
+            old = list(self.segments)
+            track_ids = np.concatenate([s.ids for s in old])
+            raw = np.concatenate([np.asarray(s.raw, dtype=np.float64) for s in old])
+            metadata = {col: np.concatenate([s.metadata[col] for s in old]) for col in _METADATA_COLS}
+
+            self._fit_scaler(raw)
+            name = self._write_segment(track_ids, raw, metadata)
+            self._write_manifest([name])
+            for segment in old:
+                shutil.rmtree(segment.path, ignore_errors=True)
+            logger.info("Compacted %d segments into %s (%d tracks)", len(old), name, len(self))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Build or compact the global track index")
+    sub = parser.add_subparsers(dest='command', required=True)
+    build = sub.add_parser('build', help="add tracks from a CSV or the shared audio-feature cache")
+    build.add_argument('--path', default=DEFAULT_INDEX_PATH)
+    build.add_argument('--csv', help="songs_with_audio or audio-features CSV (default: the FeatureCache)")
+    compact = sub.add_parser('compact', help="merge segments and refit the scaler")
+    compact.add_argument('--path', default=DEFAULT_INDEX_PATH)
+    args = parser.parse_args(argv)
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s %(name)s %(levelname)s %(message)s')
+
+    index = GlobalIndex(args.path)
+    if args.command == 'compact':
+        index.compact()
+        return
+
+    if args.csv:
+        frame = pd.read_csv(args.csv)
+    else:
+        from Recommender.cache import get_default_cache
+        frame = pd.DataFrame([f for f in get_default_cache().iter_features() if f is not None])
+    index.add(frame)
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,177 @@
+# Recommender/index.py
+import numpy as np
+
+
+def _normalize_rows(matrix):
+    """Return a float32 copy of matrix with every row scaled to unit length."""
+    matrix = np.ascontiguousarray(matrix, dtype=np.float32)
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return matrix / norms
+
+
+def top_k(scores, k):
+    """Indices and scores of the k highest values in each row, best first."""
+    k = min(k, scores.shape[1])
+    if k <= 0:
+        empty = np.empty((scores.shape[0], 0))
+        return empty.astype(np.int64), empty.astype(np.float32)
+
+    if k < scores.shape[1]:
+        part = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+    else:
+        part = np.tile(np.arange(scores.shape[1]), (scores.shape[0], 1))
+
+    part_scores = np.take_along_axis(scores, part, axis=1)
+    order = np.argsort(-part_scores, axis=1, kind="stable")
+    return np.take_along_axis(part, order, axis=1), np.take_along_axis(part_scores, order, axis=1)
+
+
+class SimilarityIndex:
+    """
+    Top-k cosine similarity search over a standardized feature matrix.
+
+    method="exact" scores every row with one matrix product per query batch.
+    method="lsh" (random-projection hashing) and method="balltree" only score
+    a candidate subset and are meant for very large catalogs.
+    """
+
+    METHODS = ("exact", "lsh", "balltree")
+
+    def __init__(self, method="exact", n_bits=10, n_tables=16, leaf_size=40, random_state=0):
+        if method not in self.METHODS:
+            raise ValueError(f"Unknown method '{method}', expected one of {self.METHODS}")
+        self.method = method
+        self.n_bits = n_bits
+        self.n_tables = n_tables
+        self.leaf_size = leaf_size
+        self.random_state = random_state
+        self.vectors = None
+        self._planes = None
+        self._tables = None
+        self._tree = None
+
+    def __len__(self):
+        return 0 if self.vectors is None else len(self.vectors)
+
+    @classmethod
+    def from_normalized(cls, vectors):
+        """Exact index over rows that are already unit length (e.g. a memory-mapped file), without copying."""
+        index = cls()
+        index.vectors = vectors
+        return index
+
+    def fit(self, features):
+        """Index an (n_tracks, n_features) matrix, e.g. the scaled FEATURE_COLS."""
+        self.vectors = _normalize_rows(features)
+
+        if self.method == "lsh":
+            rng = np.random.default_rng(self.random_state)
+            dim = self.vectors.shape[1]
+            self._planes = rng.standard_normal((self.n_tables, dim, self.n_bits)).astype(np.float32)
+            self._tables = []
+            for codes in self._hash(self.vectors).T:
+                order = np.argsort(codes, kind="stable")
+                keys, starts = np.unique(codes[order], return_index=True)
+                bounds = np.append(starts, len(order))
+                self._tables.append({
+                    key: order[bounds[i]:bounds[i + 1]] for i, key in enumerate(keys)
+                })
+        elif self.method == "balltree":
+            from sklearn.neighbors import BallTree
+            self._tree = BallTree(self.vectors, leaf_size=self.leaf_size)
+
+        return self
+
+    def _hash(self, vectors):
+        """LSH bucket code of every vector in every table, shape (n, n_tables)."""
+        bits = np.einsum("nd,tdb->ntb", vectors, self._planes) > 0
+        weights = 1 << np.arange(self.n_bits, dtype=np.int64)
+        return bits.astype(np.int64) @ weights
+
+    def query(self, rows, k=5, exclude_self=True):
+        """
+        Find the k nearest neighbours of one or more indexed rows.
+
+        Returns (indices, scores) arrays of shape (n_queries, k), best first.
+        """
+        rows = np.atleast_1d(np.asarray(rows, dtype=np.int64))
+        exclude = rows if exclude_self else None
+        return self.query_vectors(self.vectors[rows], k=k, exclude=exclude)
+
+    def query_vectors(self, vectors, k=5, exclude=None):
+        """
+        Find the k nearest indexed rows for arbitrary query vectors.
+
+        exclude optionally gives one row per query to leave out (e.g. the seed itself).
+        """
+        if self.vectors is None:
+            raise RuntimeError("SimilarityIndex has not been fitted")
+
+        queries = _normalize_rows(np.atleast_2d(vectors))
+        if self.method == "exact":
+            return self._query_exact(queries, k, exclude)
+        if self.method == "lsh":
+            return self._query_lsh(queries, k, exclude)
+        return self._query_balltree(queries, k, exclude)
+
+    def _query_exact(self, queries, k, exclude):
+        scores = queries @ self.vectors.T
+        if exclude is not None:
+            scores[np.arange(len(queries)), exclude] = -np.inf
+            k = min(k, scores.shape[1] - 1)
+        return top_k(scores, k)
+
+    def _query_lsh(self, queries, k, exclude):
+        n_results = min(k, len(self.vectors) - (exclude is not None))
+        indices = np.zeros((len(queries), n_results), dtype=np.int64)
+        scores = np.zeros((len(queries), n_results), dtype=np.float32)
+
+        for i, codes in enumerate(self._hash(queries)):
+            buckets = [table.get(code) for table, code in zip(self._tables, codes)]
+            buckets = [b for b in buckets if b is not None]
+            candidates = np.unique(np.concatenate(buckets)) if buckets else np.empty(0, dtype=np.int64)
+            if exclude is not None:
+                candidates = candidates[candidates != exclude[i]]
+
+            if len(candidates) < n_results:
+                # Too few collisions to fill the result, fall back to the exact path
+                row_exclude = None if exclude is None else exclude[i:i + 1]
+                idx, sc = self._query_exact(queries[i:i + 1], k, row_exclude)
+            else:
+                cand_scores = queries[i:i + 1] @ self.vectors[candidates].T
+                idx, sc = top_k(cand_scores, n_results)
+                idx = candidates[idx]
+            indices[i], scores[i] = idx[0], sc[0]
+
+        return indices, scores
+
+    def _query_balltree(self, queries, k, exclude):
+        extra = 0 if exclude is None else 1
+        n_query = min(k + extra, len(self.vectors))
+        dist, idx = self._tree.query(queries, k=n_query)
+        # Unit vectors: squared euclidean distance = 2 - 2 * cosine
+        sims = (1.0 - dist ** 2 / 2.0).astype(np.float32)
+
+        n_results = min(k, len(self.vectors) - extra)
+        indices = np.zeros((len(queries), n_results), dtype=np.int64)
+        scores = np.zeros((len(queries), n_results), dtype=np.float32)
+        for i in range(len(queries)):
+            keep = idx[i] != exclude[i] if exclude is not None else np.ones(n_query, dtype=bool)
+            indices[i] = idx[i][keep][:n_results]
+            scores[i] = sims[i][keep][:n_results]
+        return indices, scores
+
+    def recall(self, k=10, n_queries=200, random_state=0):
+        """Average fraction of the exact top-k that this index returns, over sampled rows."""
+        if self.method == "exact":
+            return 1.0
+
+        rng = np.random.default_rng(random_state)
+        rows = rng.choice(len(self.vectors), size=min(n_queries, len(self.vectors)), replace=False)
+
+        approx, _ = self.query(rows, k=k)
+        exact, _ = self._query_exact(self.vectors[rows], k, rows)
+
+        hits = [len(np.intersect1d(a, e)) / max(len(e), 1) for a, e in zip(approx, exact)]
+        return float(np.mean(hits))
@@ -0,0 +1,288 @@
+# Recommender/metrics.py
+"""
+Hot-path instrumentation: stage timers, counters and value summaries.
+
+    from Recommender import metrics
+
+    with metrics.timer('recommend.similarity'):
+        ...
+    metrics.count('cache.hits', len(found))
+    metrics.observe('api.batch_size', len(batch), endpoint='audio_features')
+
+Recording is off by default and every call then returns after one flag
+check (timer() hands back a shared no-op context manager). Turn it on with
+metrics.enable() or SPOTIFY_METRICS=1. The registry exports as Prometheus
+text (to_prometheus) or plain dicts (to_dict); the recommendation service
+serves it on /metrics and the Streamlit debug panel shows it. Each process
+has its own registry.
+
+profile() wraps a single request in pyinstrument when it's installed, else
+cProfile, and hands back the text report.
+"""
+import bisect
+import contextlib
+import cProfile
+import io
+import os
+import pstats
+import threading
+import time
+
+PROMETHEUS_PREFIX = 'spotify_recommender_'
+
+# Histogram buckets (seconds) for timers
+TIME_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+class _Distribution:
+    """count / sum / min / max of observed values, plus per-bucket counts for timers."""
+
+    __slots__ = ('count', 'sum', 'min', 'max', 'buckets')
+
+    def __init__(self, buckets=None):
+        self.count = 0
+        self.sum = 0.0
+        self.min = float('inf')
+        self.max = float('-inf')
+        # One slot per bound plus an overflow slot; cumulated on export
+        self.buckets = [0] * (len(buckets) + 1) if buckets else None
+
+    def add(self, value, bounds):
+        self.count += 1
+        self.sum += value
+        if value < self.min:
+            self.min = value
+        if value > self.max:
+            self.max = value
+        if self.buckets is not None:
+            self.buckets[bisect.bisect_left(bounds, value)] += 1
+
+    def to_dict(self):
+        return {'count': self.count, 'sum': self.sum, 'mean': self.sum / self.count if self.count else 0.0,
+                'min': self.min if self.count else 0.0, 'max': self.max if self.count else 0.0}
+
+
+class _Timer:
+    __slots__ = ('registry', 'name', 'labels', 'start')
+
+    def __init__(self, registry, name, labels):
+        self.registry = registry
+        self.name = name
+        self.labels = labels
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.registry.record_time(self.name, time.perf_counter() - self.start, **self.labels)
+        return False
+
+
+_NULL_TIMER = contextlib.nullcontext()
+
+
+def _key(name, labels):
+    return name, tuple(sorted((k, str(v)) for k, v in labels.items()))
+
+
+class MetricsRegistry:
+    """Counters, timers (histograms in seconds) and summaries keyed by name + labels."""
+
+    def __init__(self, enabled=False):
+        self.enabled = enabled
+        self._counters = {}
+        self._timers = {}
+        self._summaries = {}
+        self._lock = threading.Lock()
+
+    def count(self, name, value=1, **labels):
+        if not self.enabled:
+            return
+        key = _key(name, labels)
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + value
+
+    def observe(self, name, value, **labels):
+        """Record a value (batch size, payload bytes, ...) in a summary."""
+        if not self.enabled:
+            return
+        key = _key(name, labels)
+        with self._lock:
+            dist = self._summaries.get(key)
+            if dist is None:
+                dist = self._summaries[key] = _Distribution()
+            dist.add(value, None)
+
+    def record_time(self, name, seconds, **labels):
+        if not self.enabled:
+            return
+        key = _key(name, labels)
+        with self._lock:
+            dist = self._timers.get(key)
+            if dist is None:
+                dist = self._timers[key] = _Distribution(TIME_BUCKETS)
+            dist.add(seconds, TIME_BUCKETS)
+
+    def timer(self, name, **labels):
+        """Context manager recording the wall time of its block."""
+        if not self.enabled:
+            return _NULL_TIMER
+        return _Timer(self, name, labels)
+
+    def reset(self):
+        with self._lock:
+            self._counters.clear()
+            self._timers.clear()
+            self._summaries.clear()
+
+    def to_dict(self):
+        """{'counters': [...], 'timers': [...], 'summaries': [...]}, one row per name + labels (json-safe)."""
+        with self._lock:
+            return {
+                'enabled': self.enabled,
+                'pid': os.getpid(),
+                'counters': [{'name': name, 'labels': dict(labels), 'value': value}
+                             for (name, labels), value in sorted(self._counters.items())],
+                'timers': [{'name': name, 'labels': dict(labels), **dist.to_dict()}
+                           for (name, labels), dist in sorted(self._timers.items())],
+                'summaries': [{'name': name, 'labels': dict(labels), **dist.to_dict()}
+                              for (name, labels), dist in sorted(self._summaries.items())],
+            }
+
+    def to_prometheus(self):
+        """Prometheus text exposition format (counters, histograms, summaries)."""
+        def metric(name):
+            return PROMETHEUS_PREFIX + name.replace('.', '_').replace('-', '_')
+
+        def fmt_labels(labels, **extra):
+            pairs = list(labels) + list(extra.items())
+            if not pairs:
+                return ''
+            escaped = (str(v).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n') for _, v in pairs)
+            return '{' + ','.join(f'{k}="{v}"' for (k, _), v in zip(pairs, escaped)) + '}'
+
+        lines = []
+        with self._lock:
+            typed = set()
+            for (name, labels), value in sorted(self._counters.items()):
+                name = metric(name) + '_total'
+                if name not in typed:
+                    lines.append(f'# TYPE {name} counter')
+                    typed.add(name)
+                lines.append(f'{name}{fmt_labels(labels)} {value}')
+            for (name, labels), dist in sorted(self._timers.items()):
+                name = metric(name) + '_seconds'
+                if name not in typed:
+                    lines.append(f'# TYPE {name} histogram')
+                    typed.add(name)
+                cumulative = 0
+                for bound, count in zip(TIME_BUCKETS, dist.buckets):
+                    cumulative += count
+                    lines.append(f'{name}_bucket{fmt_labels(labels, le=repr(bound))} {cumulative}')
+                lines.append(f'{name}_bucket{fmt_labels(labels, le="+Inf")} {dist.count}')
+                lines.append(f'{name}_sum{fmt_labels(labels)} {dist.sum!r}')
+                lines.append(f'{name}_count{fmt_labels(labels)} {dist.count}')
+            for (name, labels), dist in sorted(self._summaries.items()):
+                name = metric(name)
+                if name not in typed:
+                    lines.append(f'# TYPE {name} summary')
+                    typed.add(name)
+                lines.append(f'{name}_sum{fmt_labels(labels)} {dist.sum!r}')
+                lines.append(f'{name}_count{fmt_labels(labels)} {dist.count}')
+        return '\n'.join(lines) + '\n'
+
+
+REGISTRY = MetricsRegistry(enabled=os.environ.get('SPOTIFY_METRICS', '').lower() in ('1', 'true', 'yes'))
+
+
+def enable(enabled=True):
+    REGISTRY.enabled = enabled
+
+
+def disable():
+    REGISTRY.enabled = False
+
+
+def enabled():
+    return REGISTRY.enabled
+
+
+def count(name, value=1, **labels):
+    if REGISTRY.enabled:
+        REGISTRY.count(name, value, **labels)
+
+
+def observe(name, value, **labels):
+    if REGISTRY.enabled:
+        REGISTRY.observe(name, value, **labels)
+
+
+def record_time(name, seconds, **labels):
+    if REGISTRY.enabled:
+        REGISTRY.record_time(name, seconds, **labels)
+
+
+def timer(name, **labels):
+    if not REGISTRY.enabled:
+        return _NULL_TIMER
+    return _Timer(REGISTRY, name, labels)
+
+
+def to_dict():
+    return REGISTRY.to_dict()
+
+
+def to_prometheus():
+    return REGISTRY.to_prometheus()
+
+
+class ProfileReport:
+    """Filled in by profile() when its block exits."""
+
+    def __init__(self):
+        self.tool = None
+        self.report = None
+        self.seconds = None
+
+
+@contextlib.contextmanager
+def profile(enabled=True, limit=40):
+    """
+    Profile the block when enabled (per request, independent of metrics
+    recording). Yields a ProfileReport whose .report is the text output:
+    pyinstrument's call tree if installed, else the top `limit` cProfile
+    entries by cumulative time.
+    """
+    result = ProfileReport()
+    if not enabled:
+        yield result
+        return
+
+    try:
+        from pyinstrument import Profiler
+    except ImportError:
+        Profiler = None
+
+    start = time.perf_counter()
+    if Profiler is not None:
+        profiler = Profiler()
+        profiler.start()
+        try:
+            yield result
+        finally:
+            profiler.stop()
+            result.tool, result.report = 'pyinstrument', profiler.output_text()
+            result.seconds = time.perf_counter() - start
+        return
+
+    profiler = cProfile.Profile()
+    profiler.enable()
+    try:
+        yield result
+    finally:
+        profiler.disable()
+        out = io.StringIO()
+        pstats.Stats(profiler, stream=out).sort_stats('cumulative').print_stats(limit)
+        result.tool, result.report = 'cProfile', out.getvalue()
+        result.seconds = time.perf_counter() - start
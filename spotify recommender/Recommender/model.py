@@ -0,0 +1,278 @@
+# Recommender/model.py
+import copy
+import json
+import os
+
+import numpy as np
+
+from Recommender import metrics
+from Recommender.features import FeaturePipeline
+from Recommender.index import SimilarityIndex
+
+
+def track_ids_from_frame(frame):
+    """Spotify track IDs for every row of a songs frame, taken from the 'uri' column."""
+    if 'uri' in frame.columns:
+        return [str(uri).rsplit(':', 1)[-1] for uri in frame['uri']]
+    return [str(track_id) for track_id in frame['id']]
+
+
+def _frame_features(frame, feature_cols):
+    """Feature columns of frame as float64, with missing columns/values filled with 0."""
+    return frame.reindex(columns=feature_cols, fill_value=0.0).fillna(0.0).to_numpy(dtype=np.float64)
+
+
+class FeatureModel:
+    """
+    Audio-feature vectors keyed by track ID, built by a FeaturePipeline.
+
+    Keeps StandardScaler-style statistics (count, mean and sum of squared
+    deviations) of the encoded features that are updated incrementally when
+    tracks are added or removed, so the library never has to be
+    re-standardized from scratch. The weighted (and optionally PCA-reduced)
+    float32 matrix and its SimilarityIndex are rebuilt lazily only after the
+    library changes. index_params are passed to SimilarityIndex (e.g.
+    {'method': 'lsh', 'n_bits': 12}).
+    """
+
+    def __init__(self, pipeline=None, index_params=None):
+        self.pipeline = pipeline or FeaturePipeline()
+        self.index_params = dict(index_params or {})
+        self.feature_cols = self.pipeline.columns
+        self._reset()
+
+    def _reset(self):
+        self.ids = []
+        self.id_to_row = {}
+        self.raw = np.empty((0, len(self.feature_cols)), dtype=np.float32)
+        self.count = 0
+        self.mean = np.zeros(self.pipeline.dim)
+        self.m2 = np.zeros(self.pipeline.dim)
+        self._scaled = None
+        self._components = None
+        self._index = None
+        self.source_version = None
+
+    def __len__(self):
+        return len(self.ids)
+
+    def __contains__(self, track_id):
+        return track_id in self.id_to_row
+
+    @property
+    def var(self):
+        return self.m2 / self.count if self.count else np.zeros_like(self.m2)
+
+    @property
+    def scale(self):
+        """Per encoded column standard deviation (1.0 for constant and categorical columns)."""
+        return self.pipeline.scale_for(self.var)
+
+    @property
+    def scaled(self):
+        """The pipeline's float32 vectors, one row per track in self.ids."""
+        if self._scaled is None:
+            with metrics.timer('model.scale'):
+                weighted = self.pipeline.weigh(self.pipeline.encode(self.raw), self.mean, self.scale)
+                self._components = self.pipeline.fit_projection(weighted)
+                if self._components is not None:
+                    weighted = weighted @ self._components
+                self._scaled = weighted.astype(np.float32)
+        return self._scaled
+
+    @property
+    def index(self):
+        """SimilarityIndex over the scaled matrix (exact by default), fitted once per library version."""
+        if self._index is None:
+            scaled = self.scaled
+            with metrics.timer('model.index_fit', method=self.index_params.get('method', 'exact')):
+                self._index = SimilarityIndex(**self.index_params).fit(scaled)
+        return self._index
+
+    def build_vectors(self):
+        """Compute the pipeline vectors (and the PCA projection they fit) now rather than on first use."""
+        return self.scaled
+
+    def build_index(self):
+        """Fit the SimilarityIndex now rather than on the first query (e.g. before publishing the model)."""
+        return self.index
+
+    def transform(self, features):
+        """Vectors for raw feature rows with the current statistics (and PCA projection)."""
+        if self._components is None and self.pipeline.n_components:
+            # The projection is fitted together with the library's vectors
+            self.build_vectors()
+        weighted = self.pipeline.weigh(self.pipeline.encode(features), self.mean, self.scale)
+        if self._components is not None:
+            weighted = weighted @ self._components
+        return weighted.astype(np.float32)
+
+    def copy(self):
+        """
+        A model that can be changed without affecting this one. Arrays are
+        shared: they are replaced on change, never written in place.
+        """
+        model = copy.copy(self)
+        model.ids = list(self.ids)
+        model.id_to_row = dict(self.id_to_row)
+        return model
+
+    def rows(self, track_ids):
+        """Row positions of the given track IDs (KeyError for unknown IDs)."""
+        return np.array([self.id_to_row[t] for t in track_ids], dtype=np.int64)
+
+    def _invalidate(self):
+        self._scaled = None
+        self._components = None
+        self._index = None
+        self.source_version = None
+
+    def add(self, frame, track_ids=None):
+        """Add the tracks in frame that are not in the model yet. Returns the number added."""
+        if track_ids is None:
+            track_ids = track_ids_from_frame(frame)
+
+        new_rows = self._new_positions(track_ids)
+        if not new_rows:
+            return 0
+        return self._append(list(new_rows), _frame_features(frame.iloc[list(new_rows.values())], self.feature_cols))
+
+    def add_features(self, track_ids, features):
+        """Add tracks given as IDs plus a raw (n, n_features) matrix. Returns the number added."""
+        new_rows = self._new_positions(track_ids)
+        if not new_rows:
+            return 0
+        return self._append(list(new_rows), np.asarray(features, dtype=np.float64)[list(new_rows.values())])
+
+    def _new_positions(self, track_ids):
+        """Position of the first occurrence of every track ID we don't have yet."""
+        new_rows = {}
+        for pos, track_id in enumerate(track_ids):
+            if track_id not in self.id_to_row and track_id not in new_rows:
+                new_rows[track_id] = pos
+        return new_rows
+
+    def _append(self, new_ids, new):
+        n_new = len(new)
+        encoded = self.pipeline.encode(new)
+        new_mean = encoded.mean(axis=0)
+        new_m2 = ((encoded - new_mean) ** 2).sum(axis=0)
+
+        # Chan et al. parallel update of mean / M2
+        total = self.count + n_new
+        delta = new_mean - self.mean
+        self.mean = self.mean + delta * n_new / total
+        self.m2 = self.m2 + new_m2 + delta ** 2 * self.count * n_new / total
+        self.count = total
+
+        for track_id in new_ids:
+            self.id_to_row[track_id] = len(self.ids)
+            self.ids.append(track_id)
+        self.raw = np.ascontiguousarray(np.vstack([self.raw, new.astype(np.float32)]))
+
+        self._invalidate()
+        return n_new
+
+    def remove(self, track_ids):
+        """Drop tracks from the model. Returns the number removed."""
+        drop_rows = sorted({self.id_to_row[t] for t in track_ids if t in self.id_to_row})
+        if not drop_rows:
+            return 0
+
+        if len(drop_rows) == self.count:
+            self._reset()
+            return len(drop_rows)
+
+        old = self.pipeline.encode(self.raw[drop_rows])
+        n_old = len(old)
+        old_mean = old.mean(axis=0)
+        old_m2 = ((old - old_mean) ** 2).sum(axis=0)
+
+        # Reverse of the parallel update: take the removed block back out
+        remaining = self.count - n_old
+        rest_mean = (self.mean * self.count - old_mean * n_old) / remaining
+        delta = old_mean - rest_mean
+        self.m2 = np.maximum(self.m2 - old_m2 - delta ** 2 * remaining * n_old / self.count, 0.0)
+        self.mean = rest_mean
+        self.count = remaining
+
+        keep = np.ones(len(self.ids), dtype=bool)
+        keep[drop_rows] = False
+        self.raw = np.ascontiguousarray(self.raw[keep])
+        self.ids = [t for t, k in zip(self.ids, keep) if k]
+        self.id_to_row = {t: i for i, t in enumerate(self.ids)}
+
+        self._invalidate()
+        return n_old
+
+    def sync(self, frame):
+        """Make the model hold exactly the tracks in frame, adding/removing only the difference."""
+        track_ids = track_ids_from_frame(frame)
+        wanted = set(track_ids)
+        stale = [t for t in self.ids if t not in wanted]
+        return self.add(frame, track_ids), self.remove(stale)
+
+    def sync_catalog(self, catalog):
+        """
+        Make the model hold exactly the catalog's tracks, in catalog row order,
+        so model rows and catalog rows are interchangeable. A no-op when the
+        model was already synced with this catalog.
+        """
+        if self.source_version == catalog.version:
+            return
+        if self.ids != catalog.track_ids:
+            wanted = catalog.id_to_row
+            self.remove([t for t in self.ids if t not in wanted])
+            self.add_features(catalog.track_ids, catalog.features)
+            self.reorder(catalog.track_ids)
+        self.source_version = catalog.version
+
+    def reorder(self, track_ids):
+        """Permute rows into the order of track_ids (same set of IDs). Statistics are unchanged."""
+        if self.ids == list(track_ids):
+            return
+        perm = self.rows(track_ids)
+        self.raw = np.ascontiguousarray(self.raw[perm])
+        if self._scaled is not None:
+            self._scaled = np.ascontiguousarray(self._scaled[perm])
+        self._index = None
+        self.ids = list(track_ids)
+        self.id_to_row = {t: i for i, t in enumerate(self.ids)}
+
+    def save(self, path):
+        """Save to a directory of .npy files that load() can memory-map."""
+        os.makedirs(path, exist_ok=True)
+        np.save(os.path.join(path, 'raw.npy'), self.raw)
+        np.save(os.path.join(path, 'scaled.npy'), self.scaled)
+        np.save(os.path.join(path, 'vectors.npy'), self.index.vectors)
+        np.save(os.path.join(path, 'ids.npy'), np.array(self.ids, dtype=str))
+        stats = {'mean': self.mean, 'm2': self.m2, 'count': self.count}
+        if self._components is not None:
+            stats['components'] = self._components
+        np.savez(os.path.join(path, 'stats.npz'), **stats)
+        with open(os.path.join(path, 'meta.json'), 'w') as f:
+            json.dump({'feature_cols': self.feature_cols, 'pipeline': self.pipeline.to_dict()}, f)
+
+    @classmethod
+    def load(cls, path, mmap=True):
+        """Load a model written by save(); with mmap the matrices stay on disk until touched."""
+        mmap_mode = 'r' if mmap else None
+        with open(os.path.join(path, 'meta.json')) as f:
+            meta = json.load(f)
+
+        model = cls(FeaturePipeline.from_dict(meta['pipeline']))
+        model.raw = np.load(os.path.join(path, 'raw.npy'), mmap_mode=mmap_mode)
+        model._scaled = np.load(os.path.join(path, 'scaled.npy'), mmap_mode=mmap_mode)
+        vectors_path = os.path.join(path, 'vectors.npy')
+        if os.path.exists(vectors_path):
+            model._index = SimilarityIndex.from_normalized(np.load(vectors_path, mmap_mode=mmap_mode))
+        model.ids = np.load(os.path.join(path, 'ids.npy')).tolist()
+        model.id_to_row = {t: i for i, t in enumerate(model.ids)}
+
+        stats = np.load(os.path.join(path, 'stats.npz'))
+        model.mean = stats['mean']
+        model.m2 = stats['m2']
+        model.count = int(stats['count'])
+        if 'components' in stats:
+            model._components = stats['components']
+        return model
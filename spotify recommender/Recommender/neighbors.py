@@ -0,0 +1,269 @@
+# Recommender/neighbors.py
+"""
+Materialized top-k neighbour table: the k most similar tracks of every
+library track, computed once per library version instead of on every
+"Find Similar Songs" click.
+
+    neighbors.npy   (n_tracks, k) int32    neighbour rows, best first
+    scores.npy      (n_tracks, k) float32  cosine similarity of each neighbour
+    ids.npy         track IDs; row r of the table is track ids[r]
+    meta.json       {"k": k, "depth": exact neighbours guaranteed in every row}
+
+Rows line up with the FeatureModel (and catalog) the table was built from,
+so a lookup is two O(k) slices. build() scores row blocks against the whole
+library (block x n at a time, never n x n) and spreads the blocks over a
+process pool that memory-maps the vectors. refresh() carries a table over
+to the next library version and recomputes only what the change touched:
+new tracks get full rows, every other row is rescored, loses its removed
+neighbours and has the new tracks merged in, and only rows left with too
+short an exact prefix are recomputed. Larger changes move the scaler
+statistics enough that refresh() rebuilds instead.
+
+    python -m Recommender.neighbors build --library .spotify_cache/library --k 50 --workers 4
+"""
+import argparse
+import json
+import logging
+import multiprocessing
+import os
+import shutil
+import sys
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+from Recommender import metrics
+from Recommender.index import top_k
+
+# Neighbours kept per track: recommend_from_song needs top_n * CANDIDATE_FACTOR
+DEFAULT_K = 50
+
+# Memory for one block of scores (rows x n_tracks float32)
+DEFAULT_BLOCK_BYTES = 64 * 1024 * 1024
+
+# Share of the library that may change before refresh() rebuilds the table
+REBUILD_FRACTION = 0.1
+
+logger = logging.getLogger(__name__)
+
+# Vectors of a pool worker, memory-mapped once by _init_worker
+_worker_vectors = None
+
+
+def _rows_top_k(vectors, rows, k):
+    """Top k neighbours (never the track itself) of the given rows, as int32 / float32."""
+    scores = vectors[rows] @ vectors.T
+    scores[np.arange(len(rows)), rows] = -np.inf
+    neighbors, scores = top_k(scores, k)
+    return neighbors.astype(np.int32), scores.astype(np.float32)
+
+
+def _init_worker(vectors_path):
+    global _worker_vectors
+    _worker_vectors = np.load(vectors_path, mmap_mode='r')
+
+
+def _block_top_k(rows, k):
+    return _rows_top_k(_worker_vectors, rows, k)
+
+
+def _block_rows(rows, n_tracks, block_bytes):
+    size = max(1, block_bytes // (4 * max(n_tracks, 1)))
+    return [rows[i:i + size] for i in range(0, len(rows), size)]
+
+
+def compute_rows(vectors, rows, k, workers=1, block_bytes=DEFAULT_BLOCK_BYTES):
+    """
+    Top-k neighbours of `rows` over unit-length `vectors`, in blocks of about
+    block_bytes of scores. With workers > 1 the blocks run on a process pool
+    (spawned, so it's safe from threaded servers); the vectors reach the
+    workers as a memory-mapped .npy file, not pickled per block.
+    """
+    rows = np.asarray(rows, dtype=np.int64)
+    k = min(k, len(vectors) - 1)
+    neighbors = np.empty((len(rows), max(k, 0)), dtype=np.int32)
+    scores = np.empty((len(rows), max(k, 0)), dtype=np.float32)
+    if not len(rows) or k <= 0:
+        return neighbors, scores
+
+    blocks = _block_rows(rows, len(vectors), block_bytes)
+    starts = np.cumsum([0] + [len(b) for b in blocks])
+    if workers <= 1 or len(blocks) == 1:
+        for start, block in zip(starts, blocks):
+            neighbors[start:start + len(block)], scores[start:start + len(block)] = _rows_top_k(vectors, block, k)
+        return neighbors, scores
+
+    # Workers map the vectors from disk: reuse the file when they're already memory-mapped
+    tmp_dir = None
+    if isinstance(vectors, np.memmap) and vectors.offset == 0 and vectors.flags['C_CONTIGUOUS']:
+        vectors_path = vectors.filename
+    else:
+        tmp_dir = tempfile.mkdtemp(prefix='neighbors-')
+        vectors_path = os.path.join(tmp_dir, 'vectors.npy')
+        np.save(vectors_path, np.ascontiguousarray(vectors, dtype=np.float32))
+    try:
+        spawn = multiprocessing.get_context('spawn')
+        with ProcessPoolExecutor(max_workers=min(workers, len(blocks)), mp_context=spawn,
+                                 initializer=_init_worker, initargs=(vectors_path,)) as pool:
+            for start, block, (block_neighbors, block_scores) in zip(
+                    starts, blocks, pool.map(_block_top_k, blocks, [k] * len(blocks))):
+                neighbors[start:start + len(block)] = block_neighbors
+                scores[start:start + len(block)] = block_scores
+    finally:
+        if tmp_dir is not None:
+            shutil.rmtree(tmp_dir, ignore_errors=True)
+    return neighbors, scores
+
+
+class NeighborTable:
+    """
+    Precomputed top-k neighbours of every track of one library version (see
+    module docstring). The first `depth` entries of every row are exact; a
+    refresh can leave shorter exact prefixes, the rest of the row is -inf.
+    """
+
+    def __init__(self, ids, neighbors, scores, k=DEFAULT_K, depth=None):
+        self.ids = list(ids)
+        self.neighbors = neighbors
+        self.scores = scores
+        self.k = k
+        self.depth = neighbors.shape[1] if depth is None else depth
+        # catalog.version the table was built for; recommend_from_song only uses a matching table
+        self.source_version = None
+
+    def __len__(self):
+        return len(self.ids)
+
+    @classmethod
+    def build(cls, model, k=DEFAULT_K, workers=None, block_bytes=DEFAULT_BLOCK_BYTES):
+        """Table over every track of a FeatureModel, in model row order."""
+        workers = workers or os.cpu_count() or 1
+        vectors = model.index.vectors
+        with metrics.timer('neighbors.build'):
+            neighbors, scores = compute_rows(vectors, np.arange(len(vectors)), k, workers, block_bytes)
+        table = cls(model.ids, neighbors, scores, k)
+        table.source_version = model.source_version
+        return table
+
+    def covers(self, catalog, k):
+        """True when the table was built for this catalog version and every row has k exact neighbours."""
+        return (self.source_version is not None and self.source_version == catalog.version
+                and (k <= self.depth or self.depth >= len(self) - 1))
+
+    def query(self, rows, k=5):
+        """(neighbour rows, scores) of shape (n_rows, k), best first, like SimilarityIndex.query."""
+        rows = np.atleast_1d(rows)
+        return self.neighbors[rows, :k], self.scores[rows, :k]
+
+    def refresh(self, model, workers=None, block_bytes=DEFAULT_BLOCK_BYTES, rebuild_fraction=REBUILD_FRACTION,
+                min_depth=None):
+        """
+        Table for the next version of the library in `model`, recomputing only
+        the rows the change affects (see module docstring). Carried-over rows
+        keep their exact prefix: removed neighbours are dropped, and new tracks
+        are merged in where they beat the last remaining neighbour. Rows left
+        with fewer than min_depth (default k / 2) exact neighbours are
+        recomputed. Returns a new table; this one is left as it is.
+        """
+        workers = workers or os.cpu_count() or 1
+        min_depth = self.k // 2 if min_depth is None else min_depth
+        ids = model.ids
+        n = len(ids)
+        width = min(self.k, n - 1)
+        id_to_row = {t: i for i, t in enumerate(self.ids)}
+        old_row = np.array([id_to_row.get(t, -1) for t in ids], dtype=np.int64)
+        kept = old_row >= 0
+        n_added = int((~kept).sum())
+        n_removed = len(self) - int(kept.sum())
+        if n_added + n_removed > rebuild_fraction * n or width != self.neighbors.shape[1]:
+            return self.build(model, self.k, workers, block_bytes)
+        if not n_added and not n_removed and self.ids == ids:
+            table = NeighborTable(ids, self.neighbors, self.scores, self.k, self.depth)
+            table.source_version = model.source_version
+            return table
+
+        start = time.perf_counter()
+        vectors = model.index.vectors
+        old_to_new = np.full(len(self), -1, dtype=np.int32)
+        old_to_new[old_row[kept]] = np.flatnonzero(kept)
+        added = np.flatnonzero(~kept)
+        neighbors = np.empty((n, width), dtype=np.int32)
+        scores = np.full((n, width), -np.inf, dtype=np.float32)
+        depth = np.zeros(n, dtype=np.int64)
+
+        # Carried-over rows: rescore the remaining neighbours with the new
+        # vectors and merge in the new tracks, a block of rows at a time
+        kept_rows = np.flatnonzero(kept)
+        size = max(1, block_bytes // (4 * (width + len(added)) * max(vectors.shape[1], 1)))
+        for i in range(0, len(kept_rows), size):
+            rows = kept_rows[i:i + size]
+            old = old_row[rows]
+            carried = old_to_new[self.neighbors[old]]
+            valid = (carried >= 0) & np.isfinite(self.scores[old])
+            row_vectors = vectors[rows]
+            carried_scores = np.where(valid, np.einsum('nd,nkd->nk', row_vectors, vectors[carried]), -np.inf)
+            # Below the last remaining neighbour, tracks we never kept could rank higher
+            cutoff = np.where(valid.all(axis=1), -np.inf, np.where(valid, carried_scores, np.inf).min(axis=1))
+
+            candidates = np.concatenate([carried, np.broadcast_to(added, (len(rows), len(added)))], axis=1)
+            candidate_scores = np.concatenate([carried_scores, row_vectors @ vectors[added].T], axis=1)
+            order, top_scores = top_k(candidate_scores, width)
+            exact = top_scores >= cutoff[:, None]
+            neighbors[rows] = np.take_along_axis(candidates, order, axis=1)
+            scores[rows] = np.where(exact, top_scores, -np.inf)
+            depth[rows] = exact.sum(axis=1)
+
+        recompute = np.flatnonzero(depth < min(min_depth, width))
+        neighbors[recompute], scores[recompute] = compute_rows(vectors, recompute, width, workers, block_bytes)
+        depth[recompute] = width
+        metrics.record_time('neighbors.refresh', time.perf_counter() - start)
+        logger.info("Refreshed neighbour table: %d added, %d removed, %d of %d rows recomputed",
+                    n_added, n_removed, len(recompute), n)
+
+        table = NeighborTable(ids, neighbors, scores, self.k, int(depth.min()) if n else 0)
+        table.source_version = model.source_version
+        return table
+
+    def save(self, path):
+        """Save to a directory of .npy files that load() can memory-map."""
+        os.makedirs(path, exist_ok=True)
+        np.save(os.path.join(path, 'neighbors.npy'), np.asarray(self.neighbors, dtype=np.int32))
+        np.save(os.path.join(path, 'scores.npy'), np.asarray(self.scores, dtype=np.float32))
+        np.save(os.path.join(path, 'ids.npy'), np.array(self.ids, dtype=str))
+        with open(os.path.join(path, 'meta.json'), 'w') as f:
+            json.dump({'k': self.k, 'depth': self.depth}, f)
+
+    @classmethod
+    def load(cls, path, mmap=True):
+        """Load a table written by save(); with mmap the rows stay on disk until read."""
+        mmap_mode = 'r' if mmap else None
+        with open(os.path.join(path, 'meta.json')) as f:
+            meta = json.load(f)
+        return cls(np.load(os.path.join(path, 'ids.npy')).tolist(),
+                   np.load(os.path.join(path, 'neighbors.npy'), mmap_mode=mmap_mode),
+                   np.load(os.path.join(path, 'scores.npy'), mmap_mode=mmap_mode),
+                   meta['k'], meta['depth'])
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Precompute the neighbour table of a library directory")
+    sub = parser.add_subparsers(dest='command', required=True)
+    build = sub.add_parser('build', help="compute top-k neighbours of every track (saved with the library)")
+    build.add_argument('--library', required=True)
+    build.add_argument('--k', type=int, default=DEFAULT_K)
+    build.add_argument('--workers', type=int, default=os.cpu_count() or 1)
+    args = parser.parse_args(argv)
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s %(name)s %(levelname)s %(message)s')
+
+    from Recommender.warmstart import load_library, save_neighbors
+    _, model = load_library(args.library)
+    start = time.perf_counter()
+    table = NeighborTable.build(model, args.k, args.workers)
+    save_neighbors(args.library, table)
+    logger.info("Wrote top-%d neighbours of %d tracks in %.1fs", args.k, len(table), time.perf_counter() - start)
+
+
+if __name__ == '__main__':
+    sys.exit(main())
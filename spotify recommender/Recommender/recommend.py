@@ -1,96 +1,208 @@
+import logging
+
+import numpy as np
 import pandas as pd
-from sklearn.preprocessing import StandardScaler
-from sklearn.metrics.pairwise import cosine_similarity
 
-FEATURE_COLS = [
-    'danceability', 'energy', 'key', 'loudness', 'mode', 
-    'speechiness', 'acousticness', 'instrumentalness', 'liveness', 
-    'valence', 'tempo'
-]
+from Recommender import metrics
+from Recommender.catalog import TrackCatalog
+from Recommender.features import FEATURE_COLS
+from Recommender.index import top_k
+from Recommender.model import FeatureModel
+from Recommender.rerank import DEFAULT_RERANKERS, rerank, rerank_keys
+
+# Candidates scored per requested result, so rerankers have room to drop some
+CANDIDATE_FACTOR = 5
+
+logger = logging.getLogger(__name__)
+
+# Feature model reused across calls when the caller doesn't keep its own
+_default_model = None
+
+def as_catalog(songs) -> TrackCatalog:
+    """Accept either a TrackCatalog or a songs_with_audio frame."""
+    if isinstance(songs, TrackCatalog):
+        return songs
+    return TrackCatalog.from_frame(songs, FEATURE_COLS)
+
+def get_feature_model(songs, model: FeatureModel = None) -> FeatureModel:
+    """
+    Return a FeatureModel holding exactly the catalog's tracks, in catalog row order.
+    Only tracks added/removed since the last call are (un)scaled, and a model
+    already synced with this catalog is returned as is.
+    """
+    global _default_model
+    if model is None:
+        if _default_model is None:
+            _default_model = FeatureModel()
+        model = _default_model
+    
+    model.sync_catalog(as_catalog(songs))
+    return model
+
+def _final_top(scores, candidates, meta, top_n, rerankers):
+    """
+    Rerank a (q, c) candidate array in one pass and keep the top_n per row.
+    Returns (candidates, reranked scores, original scores), each (q, top_n);
+    dropped or missing entries have a reranked score of -inf.
+    """
+    reranked = rerank(scores, meta, rerankers) if rerankers else scores
+    order, top_scores = top_k(reranked, top_n)
+    return (np.take_along_axis(candidates, order, axis=1), top_scores,
+            np.take_along_axis(np.asarray(scores), order, axis=1))
 
-def recommend_from_song(selected_song_display: str, songs_with_audio: pd.DataFrame, top_n: int = 5) -> pd.DataFrame:
+def recommend_from_song(selected_song, songs_with_audio, top_n: int = 5,
+                        model: FeatureModel = None, candidates=None,
+                        rerankers=DEFAULT_RERANKERS, neighbors=None) -> pd.DataFrame:
     """
-    Recommend similar songs based on audio features
+    Recommend similar songs based on audio features.
+    selected_song is a track ID or a "Track by Artist" display string;
+    songs_with_audio is a TrackCatalog or the merged songs frame.
+    With candidates (a GlobalIndex) the seed is matched against the global
+    track index instead, returning only tracks outside songs_with_audio.
+    
+    Scoring is staged: the index returns top_n * CANDIDATE_FACTOR
+    candidates, the rerankers (dedup, artist diversity) adjust their scores
+    and the best top_n are returned. A NeighborTable built for this catalog
+    version replaces the index query with a lookup of precomputed rows.
+    similarity_score is the cosine similarity to the seed; rerank_score is
+    what the results are ordered by (similarity minus diversity penalties).
     """
     try:
-        # Filter out songs without audio features
-        valid_songs = songs_with_audio.dropna(subset=['danceability']).copy()
+        catalog = as_catalog(songs_with_audio)
         
-        if valid_songs.empty:
-            st.write("❌ No valid songs with audio features")
+        if len(catalog) == 0:
+            logger.warning("No valid songs with audio features")
             return pd.DataFrame()
         
-        # Extract track name from the display string (format: "Track by Artist")
-        selected_track = selected_song_display.split(" by ")[0].strip()
-        
-        # Find the selected song (more flexible matching)
-        selected_song_data = valid_songs[
-            valid_songs['track'].str.lower().str.contains(selected_track.lower(), na=False)
-        ]
-        
-        if selected_song_data.empty:
-            st.write(f"❌ Could not find '{selected_track}' in the data")
-            st.write(f"Available tracks: {valid_songs['track'].tolist()}")
+        selected_idx = catalog.find(selected_song)
+        if selected_idx is None:
+            logger.warning("Could not find '%s' in the data", selected_song)
             return pd.DataFrame()
         
-        # Reset index for reliable indexing
-        valid_songs = valid_songs.reset_index(drop=True)
-        selected_idx = selected_song_data.index[0]
-        
-        # Ensure all required feature columns exist
-        for col in FEATURE_COLS:
-            if col not in valid_songs.columns:
-                valid_songs[col] = 0.0
-
-        # Fill any remaining NaN values
-        valid_songs[FEATURE_COLS] = valid_songs[FEATURE_COLS].fillna(0.0)
-        
-        # Standardize the features
-        scaler = StandardScaler()
-        scaled_features = scaler.fit_transform(valid_songs[FEATURE_COLS])
+        n_candidates = top_n * CANDIDATE_FACTOR if rerankers else top_n
+        if candidates is not None:
+            seed = catalog.features[selected_idx, [catalog.feature_cols.index(c) for c in candidates.feature_cols]]
+            with metrics.timer('recommend.similarity', scope='global'):
+                _, scores, locations = candidates.query(seed, k=n_candidates, exclude_ids=catalog.track_ids)
+            with metrics.timer('recommend.rerank', scope='global'):
+                pool = candidates.take(locations[0], ['danceability', 'energy', 'valence'])
+                # Seed goes first so its title key can be compared with the pool's
+                title_key, artist_key = rerank_keys([catalog.metadata['track'][selected_idx], *pool['track']],
+                                                    [catalog.metadata['artist'][selected_idx], *pool['artist']])
+                meta = {'title_key': title_key[None, 1:], 'artist_key': artist_key[None, 1:],
+                        'seed_key': title_key[:1]}
+                top_idx, top_scores, similarity = _final_top(scores[0][None, :], np.arange(len(pool))[None, :],
+                                                             meta, top_n, rerankers)
+            with metrics.timer('recommend.assemble', scope='global'):
+                valid = np.isfinite(top_scores[0])
+                recommendations = pool.iloc[top_idx[0][valid]].reset_index(drop=True)
+        else:
+            if neighbors is not None and neighbors.covers(catalog, n_candidates):
+                # Candidates were precomputed for this library version
+                with metrics.timer('recommend.similarity', scope='table'):
+                    cand_rows, cand_scores = neighbors.query(selected_idx, k=n_candidates)
+            else:
+                # Pipeline vectors are kept between calls; model rows == catalog rows
+                model = get_feature_model(catalog, model)
+                
+                # Candidate generation + vectorized scoring against every other song
+                with metrics.timer('recommend.similarity', scope='library'):
+                    cand_rows, cand_scores = model.index.query(selected_idx, k=n_candidates)
+            with metrics.timer('recommend.rerank', scope='library'):
+                title_key, artist_key = catalog.rerank_keys
+                meta = {'title_key': title_key[cand_rows], 'artist_key': artist_key[cand_rows],
+                        'seed_key': title_key[[selected_idx]]}
+                top_idx, top_scores, similarity = _final_top(cand_scores, cand_rows, meta, top_n, rerankers)
+            with metrics.timer('recommend.assemble', scope='library'):
+                valid = np.isfinite(top_scores[0])
+                recommendations = catalog.take(top_idx[0][valid], ['danceability', 'energy', 'valence'])
         
-        # Calculate cosine similarity
-        similarity_matrix = cosine_similarity(scaled_features)
+        recommendations.insert(4, 'similarity_score', similarity[0][valid].astype(float))
+        recommendations.insert(5, 'rerank_score', top_scores[0][valid].astype(float))
+        return recommendations.drop(columns='track_id')
         
-        # Get similarity scores for the selected song
-        similarity_scores = list(enumerate(similarity_matrix[selected_idx]))
+    except Exception:
+        logger.exception("Error in recommendation")
+        return pd.DataFrame()
+
+
+AGGREGATIONS = ('mean', 'max', 'rrf')
+
+def recommend_batch(seed_ids, songs_with_audio, top_n: int = 10, aggregate: str = 'mean',
+                    exclude_ids=None, model: FeatureModel = None, rrf_k: int = 60,
+                    rerankers=DEFAULT_RERANKERS) -> pd.DataFrame:
+    """
+    Recommend songs for many seed tracks at once, e.g. a whole playlist.
+
+    seed_ids is a list of track IDs, or a dict of {group: [track IDs]} to
+    build several mixes (one per user/playlist) in the same call. All seeds
+    are scored with a single matrix multiply and combined with `aggregate`:
+    'mean' (cosine to the mean seed vector), 'max' (best score against any
+    seed) or 'rrf' (reciprocal-rank fusion of each seed's ranking).
+    Seeds and exclude_ids (e.g. already-saved tracks) are never returned.
+    The top candidates of every group are reranked together in one pass;
+    score is the aggregated similarity, rerank_score what rank follows.
+    """
+    if aggregate not in AGGREGATIONS:
+        raise ValueError(f"Unknown aggregate '{aggregate}', expected one of {AGGREGATIONS}")
+    
+    groups = seed_ids if isinstance(seed_ids, dict) else {None: seed_ids}
+    catalog = as_catalog(songs_with_audio)
+    model = get_feature_model(catalog, model)
+    
+    # Known seeds only, laid out group after group
+    group_names, seed_rows, group_sizes = [], [], []
+    for name, ids in groups.items():
+        rows = [model.id_to_row[t] for t in dict.fromkeys(ids) if t in model.id_to_row]
+        if rows:
+            group_names.append(name)
+            seed_rows.extend(rows)
+            group_sizes.append(len(rows))
+    if not seed_rows:
+        return pd.DataFrame()
+    
+    with metrics.timer('recommend.similarity', scope='batch'):
+        vectors = model.index.vectors
+        seed_rows = np.array(seed_rows)
+        starts = np.concatenate([[0], np.cumsum(group_sizes)[:-1]])
         
-        # Sort by similarity (highest first)
-        similarity_scores = sorted(similarity_scores, key=lambda x: x[1], reverse=True)
+        if aggregate == 'mean':
+            centroids = np.add.reduceat(vectors[seed_rows], starts, axis=0)
+            centroids /= np.maximum(np.linalg.norm(centroids, axis=1, keepdims=True), 1e-12)
+            scores = centroids @ vectors.T
+        else:
+            seed_scores = vectors[seed_rows] @ vectors.T
+            if aggregate == 'max':
+                scores = np.maximum.reduceat(seed_scores, starts, axis=0)
+            else:
+                # Each seed contributes 1 / (rrf_k + rank) for its own top candidates
+                depth = min(len(model), max(100, 10 * top_n))
+                ranked, _ = top_k(seed_scores, depth)
+                contrib = np.zeros_like(seed_scores)
+                np.put_along_axis(contrib, ranked, 1.0 / (rrf_k + np.arange(1, depth + 1, dtype=np.float32)), axis=1)
+                scores = np.add.reduceat(contrib, starts, axis=0)
         
-        # Get top N recommendations (excluding the song itself)
-        top_recommendations = []
-        for idx, score in similarity_scores[1:top_n+1]:  # Skip first (itself)
-            song_data = valid_songs.iloc[idx]
-            
-            # Create Spotify link
-            spotify_link = song_data.get('spotify_link')
-            if pd.isna(spotify_link) or not spotify_link:
-                uri = song_data.get('uri', '')
-                if uri and 'spotify:track:' in uri:
-                    track_id = uri.split(':')[-1]
-                    spotify_link = f"https://open.spotify.com/track/{track_id}"
-                else:
-                    track_id = song_data.get('id', '')
-                    if track_id:
-                        spotify_link = f"https://open.spotify.com/track/{track_id}"
-                    else:
-                        spotify_link = "#"
-            
-            top_recommendations.append({
-                'track': song_data['track'],
-                'artist': song_data['artist'],
-                'spotify_link': spotify_link,
-                'similarity_score': score,
-                'danceability': song_data.get('danceability'),
-                'energy': song_data.get('energy'),
-                'valence': song_data.get('valence')
-            })
+        # Never recommend the seeds themselves or excluded tracks
+        scores[np.repeat(np.arange(len(group_names)), group_sizes), seed_rows] = -np.inf
+        if exclude_ids is not None:
+            excluded = [model.id_to_row[t] for t in exclude_ids if t in model.id_to_row]
+            scores[:, excluded] = -np.inf
         
-        return pd.DataFrame(top_recommendations)
+        n_candidates = top_n * CANDIDATE_FACTOR if rerankers else top_n
+        cand_rows, cand_scores = top_k(scores, n_candidates)
+    
+    with metrics.timer('recommend.rerank', scope='batch'):
+        title_key, artist_key = catalog.rerank_keys
+        meta = {'title_key': title_key[cand_rows], 'artist_key': artist_key[cand_rows]}
+        top_rows, top_scores, raw_scores = _final_top(cand_scores, cand_rows, meta, top_n, rerankers)
+    
+    with metrics.timer('recommend.assemble', scope='batch'):
+        valid = np.isfinite(top_scores)
+        result = catalog.take(top_rows[valid], ['danceability', 'energy', 'valence'])
+        result.insert(4, 'score', raw_scores[valid])
+        result.insert(5, 'rerank_score', top_scores[valid])
+        result.insert(6, 'rank', np.nonzero(valid)[1] + 1)
         
-    except Exception as e:
-        st.error(f"Error in recommendation: {e}")
-        import traceback
-        st.write(f"Detailed error: {traceback.format_exc()}")
-        return pd.DataFrame()
\ No newline at end of file
+        if isinstance(seed_ids, dict):
+            result.insert(0, 'seed_group', np.repeat(group_names, valid.sum(axis=1)))
+    return result
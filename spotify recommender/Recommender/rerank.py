@@ -0,0 +1,101 @@
+# Recommender/rerank.py
+"""
+Rerankers for the last stage of recommendation.
+
+Each reranker takes the (n_queries, n_candidates) score array, candidates
+sorted best first in every row, plus a dict of integer key arrays of the
+same shape ('title_key', 'artist_key'; see rerank_keys) and returns
+adjusted scores. They work on the whole array at once: per-row "seen
+before" checks are done by sorting (row, key) pairs, not by looping over rows.
+"""
+import numpy as np
+import pandas as pd
+
+# Words that mark another version of the same recording
+_VERSION_WORDS = r'(?:remaster(?:ed)?|live|(?:re)?mix|edit|version|mono|stereo|feat\.?|ft\.|featuring)(?!\w)'
+
+# "Song - Remastered 2011", "Song (Live)", "Song [Radio Edit]", "Song (feat. X)" -> "song",
+# but "Part 1 - Intro" and "Part 1 - Outro" stay apart: only brackets and
+# " - " parts holding a version word are stripped
+_VERSION_SUFFIX = (rf'(?i)\s*[\(\[][^\)\]]*\b{_VERSION_WORDS}[^\)\]]*[\)\]]'
+                   rf'|(?:\s+-\s+[^-]*\b{_VERSION_WORDS}[^-]*)+$')
+
+
+def _occurrence(keys):
+    """
+    For a (q, c) array of non-negative integer keys: how many earlier columns
+    in the same row hold the same key (0 for the first occurrence).
+    """
+    q, c = keys.shape
+    codes = keys.ravel().astype(np.int64)
+    pair = np.repeat(np.arange(q), c) * (int(codes.max()) + 1 if len(codes) else 1) + codes
+    order = np.argsort(pair, kind='stable')
+    sorted_pair = pair[order]
+    starts = np.flatnonzero(np.r_[True, sorted_pair[1:] != sorted_pair[:-1]])
+    group_start = np.repeat(starts, np.diff(np.r_[starts, len(pair)]))
+    counts = np.empty(len(pair), dtype=np.int64)
+    counts[order] = np.arange(len(pair)) - group_start
+    return counts.reshape(q, c)
+
+
+def rerank_keys(tracks, artists):
+    """
+    Integer (title_key, artist_key) arrays for parallel track/artist name
+    arrays: equal title keys mean the same song by the same artist once
+    version suffixes and case are removed. Computed once per catalog.
+    """
+    artist = pd.Series(np.asarray(artists, dtype=object)).fillna('').astype(str).str.lower()
+    titles = (pd.Series(np.asarray(tracks, dtype=object)).fillna('').astype(str)
+              .str.replace(_VERSION_SUFFIX, '', regex=True).str.strip().str.lower())
+    title_key, _ = pd.factorize(titles + '|' + artist)
+    artist_key, _ = pd.factorize(artist)
+    return title_key, artist_key
+
+
+class Dedup:
+    """
+    Drop other versions of the same song (remasters, live or radio edits):
+    only the best-scored candidate per normalized title + artist survives,
+    and versions of the seed itself are dropped when meta has 'seed_key'.
+    """
+
+    def __call__(self, scores, meta):
+        keys = meta['title_key']
+        scores = np.where(_occurrence(keys) > 0, -np.inf, scores)
+        if 'seed_key' in meta:
+            scores = np.where(keys == np.asarray(meta['seed_key'])[:, None], -np.inf, scores)
+        return scores
+
+
+class ArtistDiversity:
+    """
+    Penalize repeated artists: the n-th candidate by the same artist in a row
+    (n = 0, 1, ...) loses `penalty * n`, and anything past max_per_artist is
+    dropped.
+    """
+
+    def __init__(self, max_per_artist=2, penalty=0.05):
+        self.max_per_artist = max_per_artist
+        self.penalty = penalty
+
+    def __call__(self, scores, meta):
+        # Rank by the current scores so "earlier" means better
+        order = np.argsort(-scores, axis=1, kind='stable')
+        ranked = np.take_along_axis(meta['artist_key'], order, axis=1)
+        seen = np.empty_like(order)
+        np.put_along_axis(seen, order, _occurrence(ranked), axis=1)
+
+        scores = scores - self.penalty * seen
+        if self.max_per_artist is not None:
+            scores = np.where(seen >= self.max_per_artist, -np.inf, scores)
+        return scores
+
+
+DEFAULT_RERANKERS = (Dedup(), ArtistDiversity())
+
+
+def rerank(scores, meta, rerankers=DEFAULT_RERANKERS):
+    """Apply rerankers in order to a (q, c) candidate score array."""
+    for reranker in rerankers:
+        scores = reranker(scores, meta)
+    return scores
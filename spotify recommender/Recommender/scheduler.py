@@ -0,0 +1,188 @@
+# Recommender/scheduler.py
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+from Recommender import metrics
+
+
+class TokenBucket:
+    """Thread-safe token bucket: `rate` requests per second with bursts up to `capacity`."""
+
+    def __init__(self, rate=10.0, capacity=10):
+        self.rate = rate
+        self.capacity = capacity
+        self._tokens = float(capacity)
+        self._updated = time.monotonic()
+        self._paused_until = 0.0
+        self._lock = threading.Lock()
+
+    def pause(self, seconds):
+        """Stop handing out tokens for `seconds` (used for Retry-After)."""
+        with self._lock:
+            self._paused_until = max(self._paused_until, time.monotonic() + seconds)
+            self._tokens = 0.0
+
+    def acquire(self):
+        """Block until a token is available."""
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                if now >= self._paused_until:
+                    start = max(self._updated, self._paused_until)
+                    self._tokens = min(self.capacity, self._tokens + (now - start) * self.rate)
+                    self._updated = now
+                    if self._tokens >= 1:
+                        self._tokens -= 1
+                        return
+                    wait = (1 - self._tokens) / self.rate
+                else:
+                    wait = self._paused_until - now
+            time.sleep(wait)
+
+
+class BatchMetrics:
+    """Per-batch latency / retry records and throughput summary for one or more scheduler runs."""
+
+    def __init__(self):
+        self.batches = []
+        self.started = None
+        self.finished = None
+        self._lock = threading.Lock()
+
+    def record(self, size, latency, attempts, ok):
+        with self._lock:
+            self.batches.append({'size': size, 'latency': latency, 'attempts': attempts, 'ok': ok})
+
+    def summary(self):
+        """Aggregate numbers as a plain dict (safe to json.dump)."""
+        latencies = sorted(b['latency'] for b in self.batches)
+        elapsed = (self.finished or time.monotonic()) - (self.started or time.monotonic())
+        items = sum(b['size'] for b in self.batches if b['ok'])
+
+        def percentile(p):
+            if not latencies:
+                return 0.0
+            return latencies[min(len(latencies) - 1, int(p / 100 * len(latencies)))]
+
+        return {
+            'batches': len(self.batches),
+            'failed_batches': sum(1 for b in self.batches if not b['ok']),
+            'items': items,
+            'retries': sum(b['attempts'] - 1 for b in self.batches),
+            'elapsed_s': elapsed,
+            'throughput_items_per_s': items / elapsed if elapsed > 0 else 0.0,
+            'latency_p50_s': percentile(50),
+            'latency_p95_s': percentile(95),
+            'latency_max_s': latencies[-1] if latencies else 0.0,
+        }
+
+
+def _retry_after(exc):
+    """Seconds from a Retry-After header on a spotipy/requests error, if any."""
+    headers = getattr(exc, 'headers', None) or {}
+    value = headers.get('Retry-After') or headers.get('retry-after')
+    try:
+        return float(value) if value is not None else None
+    except (TypeError, ValueError):
+        return None
+
+
+def _is_retryable(exc):
+    status = getattr(exc, 'http_status', None)
+    if status is None:
+        # Connection errors, timeouts etc.
+        return True
+    return status == 429 or status >= 500
+
+
+class BatchScheduler:
+    """
+    Splits items into batches and runs `fn(batch)` with up to `max_in_flight`
+    batches at once, throttled by a shared TokenBucket.
+
+    Failed batches are retried on their own with jittered exponential backoff;
+    429 responses pause the whole bucket for the Retry-After period.
+    """
+
+    def __init__(self, batch_size=100, max_in_flight=4, rate=10.0, burst=10,
+                 max_retries=5, backoff=0.5, max_backoff=30.0):
+        self.batch_size = batch_size
+        self.max_in_flight = max_in_flight
+        self.limiter = TokenBucket(rate, burst)
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        # Every batch over the scheduler's lifetime; run() also fills per-run metrics
+        self.metrics = BatchMetrics()
+        self.metrics.started = time.monotonic()
+
+    def run_batch(self, fn, batch, run_metrics=None):
+        """
+        Call fn(batch) once a token is free, retrying as described above.
+        Returns (result, None), or (None, error) once retries run out. The
+        batch is recorded in self.metrics and in run_metrics, if given.
+        """
+        recorders = (self.metrics,) if run_metrics is None else (self.metrics, run_metrics)
+        endpoint = getattr(fn, '__name__', 'batch')
+        metrics.observe('api.batch_size', len(batch), endpoint=endpoint)
+        attempt = 0
+        while True:
+            attempt += 1
+            with metrics.timer('api.rate_limit_wait', endpoint=endpoint):
+                self.limiter.acquire()
+            start = time.monotonic()
+            try:
+                result = fn(batch)
+                latency = time.monotonic() - start
+                for recorder in recorders:
+                    recorder.record(len(batch), latency, attempt, True)
+                metrics.record_time('api.request', latency, endpoint=endpoint)
+                return result, None
+            except Exception as e:
+                metrics.count('api.errors', endpoint=endpoint, status=getattr(e, 'http_status', None) or 'none')
+                if attempt > self.max_retries or not _is_retryable(e):
+                    for recorder in recorders:
+                        recorder.record(len(batch), time.monotonic() - start, attempt, False)
+                    metrics.count('api.failed_batches', endpoint=endpoint)
+                    return None, e
+                metrics.count('api.retries', endpoint=endpoint)
+
+                retry_after = _retry_after(e)
+                if retry_after is not None:
+                    self.limiter.pause(retry_after)
+                    wait = retry_after
+                else:
+                    wait = random.uniform(0, min(self.max_backoff, self.backoff * 2 ** (attempt - 1)))
+                time.sleep(wait)
+
+    def run(self, fn, items, progress=None, run_metrics=None):
+        """
+        Call fn on every batch of items.
+
+        Returns a list of (batch, result, error) tuples in input order; error is
+        None for batches that eventually succeeded. progress(done_items, total_items)
+        is called from the calling thread as batches finish. Pass a fresh
+        BatchMetrics as run_metrics to get this run's numbers on their own;
+        self.metrics keeps accumulating across runs (and threads sharing the
+        scheduler).
+        """
+        batches = [items[i:i + self.batch_size] for i in range(0, len(items), self.batch_size)]
+        if run_metrics is not None:
+            run_metrics.started = time.monotonic()
+        outcomes = [None] * len(batches)
+
+        with ThreadPoolExecutor(max_workers=self.max_in_flight) as pool:
+            futures = {pool.submit(self.run_batch, fn, batch, run_metrics): i for i, batch in enumerate(batches)}
+            done = 0
+            for future in as_completed(futures):
+                i = futures[future]
+                outcomes[i] = future.result()
+                done += len(batches[i])
+                if progress is not None:
+                    progress(done, len(items))
+
+        if run_metrics is not None:
+            run_metrics.finished = time.monotonic()
+        return [(batch, result, error) for batch, (result, error) in zip(batches, outcomes)]
@@ -0,0 +1,272 @@
+# Recommender/service.py
+"""
+Headless HTTP/JSON recommendation service (stdlib only).
+
+Build a library directory once, then serve it from several worker processes
+that share the memory-mapped catalog and feature matrix:
+
+    python -m Recommender.service build --csv songs_with_audio.csv --library .spotify_cache/library --neighbors 50
+    python -m Recommender.service serve --library .spotify_cache/library --workers 4 --port 8000
+
+Endpoints:
+    GET  /health
+    GET  /recommend?track_id=<id>&top_n=5[&scope=global][&profile=1]
+    POST /recommend/batch   {"seed_ids": [...], "top_n": 10, "aggregate": "mean", "exclude_ids": [...]}
+    GET  /metrics[?format=json]
+
+Metrics are recorded with `serve --metrics` (or SPOTIFY_METRICS=1); each
+worker process keeps its own, so /metrics reports the worker that answered.
+profile=1 (or "profile": true in a batch request) adds a profiler report
+of that request to the response.
+"""
+import argparse
+import json
+import logging
+import os
+import signal
+import sys
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+from Recommender import metrics
+from Recommender.global_index import GlobalIndex
+from Recommender.recommend import AGGREGATIONS, recommend_batch, recommend_from_song
+from Recommender.versioned import current_version
+from Recommender.warmstart import load_library, load_neighbors, save_library, warm_up
+
+logger = logging.getLogger(__name__)
+
+MAX_TOP_N = 100
+
+
+def _profile_field(report):
+    """', "profile": {...}' for a response body when the request was profiled, else ''."""
+    if report.report is None:
+        return ''
+    return ', "profile": %s' % json.dumps({'tool': report.tool, 'seconds': report.seconds, 'report': report.report})
+
+
+class RecommendationHandler(BaseHTTPRequestHandler):
+    """JSON endpoints over a read-only catalog + feature model (set on the server)."""
+
+    protocol_version = 'HTTP/1.1'
+
+    def log_message(self, format, *args):
+        logger.debug("%s - %s", self.address_string(), format % args)
+
+    def _send(self, status, body, content_type='application/json'):
+        payload = body.encode() if isinstance(body, str) else json.dumps(body).encode()
+        metrics.count('service.responses', status=status)
+        self.send_response(status)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def _top_n(self, value, default):
+        top_n = int(value) if value is not None else default
+        if not 1 <= top_n <= MAX_TOP_N:
+            raise ValueError(f"top_n must be between 1 and {MAX_TOP_N}")
+        return top_n
+
+    def _id_list(self, value, name):
+        if not isinstance(value, list) or not all(isinstance(t, str) for t in value):
+            raise ValueError(f"{name} must be a list of track ID strings")
+        return value
+
+    def _seed_ids(self, value):
+        groups = value if isinstance(value, dict) else {None: value}
+        for group, ids in groups.items():
+            if not self._id_list(ids, 'seed_ids' if group is None else f"seed_ids['{group}']"):
+                raise ValueError("seed_ids must not be empty")
+        if not groups:
+            raise ValueError("seed_ids must not be empty")
+        return value
+
+    def _internal_error(self, endpoint):
+        """Log the exception being handled and answer 500 (the details stay in the log)."""
+        logger.exception("%s failed for %s", endpoint, self.path)
+        metrics.count('service.errors', endpoint=endpoint)
+        return self._send(500, {'error': 'Internal server error'})
+
+    def do_GET(self):
+        url = urlparse(self.path)
+        catalog, model = self.server.catalog, self.server.model
+
+        if url.path == '/health':
+            return self._send(200, {'status': 'ok', 'tracks': len(catalog), 'pid': os.getpid()})
+
+        if url.path == '/metrics':
+            if parse_qs(url.query).get('format', [''])[0] == 'json':
+                return self._send(200, metrics.to_dict())
+            return self._send(200, metrics.to_prometheus(), content_type='text/plain; version=0.0.4')
+
+        if url.path == '/recommend':
+            params = parse_qs(url.query)
+            track_id = params.get('track_id', [None])[0]
+            try:
+                top_n = self._top_n(params.get('top_n', [None])[0], 5)
+            except ValueError as e:
+                return self._send(400, {'error': str(e)})
+            if not track_id or track_id not in catalog:
+                return self._send(404, {'error': f"Unknown track_id '{track_id}'"})
+
+            # scope=global ranks tracks outside the library from the global index
+            candidates = None
+            if params.get('scope', ['library'])[0] == 'global':
+                candidates = self.server.global_index
+                if candidates is None:
+                    return self._send(400, {'error': "Server has no global index"})
+                candidates.refresh()
+
+            try:
+                with metrics.profile(params.get('profile', ['0'])[0] == '1') as report:
+                    with metrics.timer('service.request', endpoint='recommend'):
+                        recommendations = recommend_from_song(track_id, catalog, top_n=top_n, model=model,
+                                                              candidates=candidates, neighbors=self.server.neighbors)
+                body = '{"track_id": %s, "recommendations": %s%s}' % (
+                    json.dumps(track_id), recommendations.to_json(orient='records'), _profile_field(report))
+            except Exception:
+                return self._internal_error('recommend')
+            return self._send(200, body)
+
+        return self._send(404, {'error': 'Not found'})
+
+    def do_POST(self):
+        url = urlparse(self.path)
+        if url.path != '/recommend/batch':
+            return self._send(404, {'error': 'Not found'})
+
+        try:
+            length = int(self.headers.get('Content-Length', 0))
+            request = json.loads(self.rfile.read(length) or b'{}')
+            seed_ids = self._seed_ids(request['seed_ids'])
+            exclude_ids = request.get('exclude_ids')
+            if exclude_ids is not None:
+                exclude_ids = self._id_list(exclude_ids, 'exclude_ids')
+            top_n = self._top_n(request.get('top_n'), 10)
+            aggregate = request.get('aggregate', 'mean')
+            if aggregate not in AGGREGATIONS:
+                raise ValueError(f"aggregate must be one of {AGGREGATIONS}")
+        except (KeyError, ValueError, TypeError) as e:
+            return self._send(400, {'error': f"Bad request: {e}"})
+
+        try:
+            with metrics.profile(bool(request.get('profile'))) as report:
+                with metrics.timer('service.request', endpoint='recommend_batch'):
+                    recommendations = recommend_batch(seed_ids, self.server.catalog, top_n=top_n, aggregate=aggregate,
+                                                      exclude_ids=exclude_ids, model=self.server.model)
+            body = '{"recommendations": %s%s}' % (recommendations.to_json(orient='records'), _profile_field(report))
+        except Exception:
+            return self._internal_error('recommend_batch')
+        return self._send(200, body)
+
+
+def make_server(library_path, host='127.0.0.1', port=8000, global_index_path=None):
+    """Bind the HTTP server and attach the memory-mapped library (neighbour table, global index) to it."""
+    server = ThreadingHTTPServer((host, port), RecommendationHandler)
+    library = current_version(library_path)
+    server.catalog, server.model = load_library(library)
+    server.neighbors = load_neighbors(library, server.catalog)
+    server.global_index = GlobalIndex(global_index_path) if global_index_path else None
+    return server
+
+
+def serve(library_path, host='127.0.0.1', port=8000, workers=1, global_index_path=None):
+    """
+    Serve forever. With workers > 1 the parent binds the socket, loads the
+    library and warms it up, then forks workers that accept on the same
+    socket and share the memory-mapped arrays and everything the warm-up
+    loaded.
+    """
+    server = make_server(library_path, host, port, global_index_path)
+    warm_up(server.catalog, server.model, server.neighbors)
+    logger.info("Serving %d tracks on http://%s:%d with %d worker(s)", len(server.catalog), host, port, workers)
+
+    if workers <= 1 or not hasattr(os, 'fork'):
+        server.serve_forever()
+        return
+
+    children = []
+    for _ in range(workers):
+        pid = os.fork()
+        if pid == 0:
+            signal.signal(signal.SIGTERM, lambda *_: os._exit(0))
+            try:
+                server.serve_forever()
+            finally:
+                os._exit(0)
+        children.append(pid)
+
+    def stop(*_):
+        for pid in children:
+            try:
+                os.kill(pid, signal.SIGTERM)
+            except ProcessLookupError:
+                pass
+
+    signal.signal(signal.SIGTERM, stop)
+    try:
+        for pid in children:
+            os.waitpid(pid, 0)
+    except KeyboardInterrupt:
+        stop()
+    finally:
+        server.server_close()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Headless recommendation service")
+    sub = parser.add_subparsers(dest='command', required=True)
+
+    build = sub.add_parser('build', help="build a library directory from a songs_with_audio CSV/snapshot or a fake library")
+    build.add_argument('--library', required=True)
+    source = build.add_mutually_exclusive_group(required=True)
+    source.add_argument('--csv', help="merged saved songs + audio features")
+    source.add_argument('--snapshot', help="merged songs as an .arrow or .parquet snapshot (Recommender.snapshot)")
+    source.add_argument('--fake', type=int, metavar='N', help="N tracks from the offline FakeSpotify client")
+    build.add_argument('--neighbors', type=int, metavar='K', help="also precompute the top-K neighbour table")
+
+    run = sub.add_parser('serve', help="serve a library directory")
+    run.add_argument('--library', required=True)
+    run.add_argument('--host', default='127.0.0.1')
+    run.add_argument('--port', type=int, default=8000)
+    run.add_argument('--workers', type=int, default=os.cpu_count() or 1)
+    run.add_argument('--global-index', help="global track index directory for scope=global")
+    run.add_argument('--metrics', action='store_true', help="record metrics for /metrics")
+
+    args = parser.parse_args(argv)
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s %(process)d %(name)s %(levelname)s %(message)s')
+
+    if args.command == 'build':
+        if args.csv:
+            import pandas as pd
+            songs_with_audio = pd.read_csv(args.csv)
+        elif args.snapshot:
+            from Recommender.snapshot import read_snapshot
+            songs_with_audio = read_snapshot(args.snapshot)
+        else:
+            from Recommender.cache import FeatureCache
+            from Recommender.data import get_audio_features, get_user_saved_songs
+            from Recommender.fake import FakeSpotify
+            from Recommender.scheduler import BatchScheduler
+            sp = FakeSpotify(args.fake, latency=0)
+            scheduler = BatchScheduler(rate=1000, burst=1000)
+            saved_songs = get_user_saved_songs(sp, scheduler=scheduler)
+            audio_data = get_audio_features(sp, saved_songs['uri'].tolist(), cache=FeatureCache(':memory:'),
+                                            scheduler=scheduler)
+            songs_with_audio = saved_songs.merge(audio_data, on='uri', how='left')
+        catalog, model = save_library(args.library, songs_with_audio)
+        if args.neighbors:
+            from Recommender.neighbors import NeighborTable
+            from Recommender.warmstart import save_neighbors
+            save_neighbors(args.library, NeighborTable.build(model, args.neighbors))
+        logger.info("Wrote %d tracks to %s", len(catalog), args.library)
+    else:
+        if args.metrics:
+            metrics.enable()
+        serve(args.library, args.host, args.port, args.workers, args.global_index)
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,149 @@
+# Recommender/snapshot.py
+"""
+Columnar snapshots of a user's library: saved tracks with their audio
+features pre-joined, compactly typed, in one Arrow IPC or Parquet file.
+
+    artist                              categorical (dictionary encoded)
+    key, mode, time_signature           Int8 (nullable: tracks without features)
+    other audio features                float32
+    id, uri, track, spotify_link, ...   strings
+
+Arrow IPC files (.arrow) are written uncompressed so read_snapshot() can
+memory-map them: numeric columns are wrapped without copying and pages are
+only read when touched. Parquet (.parquet) is the compressed export format.
+The schema metadata records SNAPSHOT_VERSION; files from a newer version are
+refused instead of misread.
+
+    python -m Recommender.snapshot convert songs_with_audio.csv library.arrow
+"""
+import argparse
+import json
+import logging
+import os
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+from Recommender.data import AUDIO_FEATURE_COLS
+from Recommender.features import CATEGORICAL_COLS
+
+SNAPSHOT_VERSION = 1
+
+_METADATA_KEY = b'spotify_recommender'
+
+logger = logging.getLogger(__name__)
+
+CATEGORY_COLS = ['artist']
+
+
+def compact_songs(frame):
+    """A copy of a songs frame with the compact snapshot dtypes (see module docstring)."""
+    frame = frame.copy()
+    for col in CATEGORY_COLS:
+        if col in frame.columns and not isinstance(frame[col].dtype, pd.CategoricalDtype):
+            frame[col] = frame[col].astype('category')
+    for col in AUDIO_FEATURE_COLS:
+        if col not in frame.columns or col in ('id', 'uri'):
+            continue
+        if col in CATEGORICAL_COLS:
+            frame[col] = pd.to_numeric(frame[col]).round().astype(pd.Int8Dtype())
+        else:
+            frame[col] = pd.to_numeric(frame[col]).astype(np.float32)
+    return frame
+
+
+def _format(path):
+    ext = os.path.splitext(path)[1].lower()
+    if ext in ('.arrow', '.feather', '.ipc'):
+        return 'arrow'
+    if ext in ('.parquet', '.pq'):
+        return 'parquet'
+    if ext == '.csv':
+        return 'csv'
+    raise ValueError(f"Unknown snapshot format for '{path}', expected .arrow, .parquet or .csv")
+
+
+def write_snapshot(frame, path, user_id=None):
+    """
+    Write a songs frame to path (.arrow or .parquet) with compact dtypes.
+    The file is written next to path and renamed, so readers never see
+    half of it. Returns the number of rows.
+    """
+    frame = compact_songs(frame)
+    table = pa.Table.from_pandas(frame, preserve_index=False)
+    # Keep NaN as NaN (from_pandas turns it into nulls), so reads can wrap float columns as they are
+    for i, name in enumerate(table.column_names):
+        if frame[name].dtype == np.float32:
+            table = table.set_column(i, name, pa.array(frame[name].to_numpy(), type=pa.float32()))
+    meta = {'version': SNAPSHOT_VERSION, 'user_id': user_id, 'created_at': time.time()}
+    table = table.replace_schema_metadata({**(table.schema.metadata or {}), _METADATA_KEY: json.dumps(meta)})
+
+    tmp = path + '.tmp'
+    if _format(path) == 'parquet':
+        pq.write_table(table, tmp, compression='zstd')
+    else:
+        with pa.OSFile(tmp, 'wb') as sink, pa.ipc.new_file(sink, table.schema) as writer:
+            writer.write_table(table)
+    os.replace(tmp, path)
+    return table.num_rows
+
+
+def snapshot_info(path):
+    """The metadata stored with a snapshot: version, user_id, created_at."""
+    if _format(path) == 'parquet':
+        metadata = pq.read_schema(path).metadata
+    else:
+        with pa.memory_map(path, 'r') as source:
+            metadata = pa.ipc.open_file(source).schema.metadata
+    info = json.loads((metadata or {}).get(_METADATA_KEY, b'{}'))
+    version = info.get('version')
+    if version is None or version > SNAPSHOT_VERSION:
+        raise ValueError(f"{path} is not a snapshot this version can read (snapshot version {version})")
+    return info
+
+
+def read_snapshot(path, columns=None, mmap=True):
+    """
+    Read a snapshot written by write_snapshot() as a DataFrame. Arrow IPC
+    files are memory-mapped with mmap; numeric columns then point into the
+    mapping instead of being copied (the frame keeps it open).
+    """
+    snapshot_info(path)
+    if _format(path) == 'parquet':
+        table = pq.read_table(path, columns=columns)
+    else:
+        source = pa.memory_map(path, 'r') if mmap else pa.OSFile(path, 'rb')
+        table = pa.ipc.open_file(source).read_all()
+        if columns is not None:
+            table = table.select(columns)
+    # One block per column, so columns without nulls can stay zero-copy views
+    return table.to_pandas(split_blocks=True)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Convert songs frames between CSV and columnar snapshots")
+    sub = parser.add_subparsers(dest='command', required=True)
+    convert = sub.add_parser('convert', help="convert between .csv, .arrow and .parquet (by file extension)")
+    convert.add_argument('source')
+    convert.add_argument('target')
+    convert.add_argument('--user-id')
+    args = parser.parse_args(argv)
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s %(name)s %(levelname)s %(message)s')
+
+    if _format(args.source) == 'csv':
+        frame = pd.read_csv(args.source)
+    else:
+        frame = read_snapshot(args.source)
+    if _format(args.target) == 'csv':
+        frame.to_csv(args.target, index=False)
+    else:
+        write_snapshot(frame, args.target, args.user_id)
+    logger.info("Wrote %d rows to %s", len(frame), args.target)
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,316 @@
+# Recommender/sync.py
+"""
+Background library sync: keeps one user's saved songs, audio features and
+similarity index current without making page loads wait for Spotify.
+
+A LibrarySync thread polls the saved-tracks endpoint every `interval`
+seconds. Saved tracks come back newest first, so a poll reads pages only
+until it reaches tracks saved before the previous poll (usually a single
+request) and fetches audio features just for the new tracks. When the
+library total doesn't add up afterwards, tracks were removed and the track
+list is re-read (still no feature requests for known tracks).
+
+Every change is applied to a copy of the FeatureModel incrementally and
+published as a new LibrarySnapshot with a single reference swap. Snapshots
+are never modified after publishing, so readers take `sync.snapshot` and
+use it without locks or waiting. After each swap the sync thread carries
+the top-k NeighborTable over to the new version (`sync.neighbors`); until
+it's done, recommend_from_song sees a version mismatch and queries the
+index instead. Merged songs frames use the compact snapshot dtypes
+(categorical artist, Int8 key/mode/time_signature, float32 features).
+
+Each snapshot is also written under .spotify_cache/sync/<user> as a
+warm-start artifact (catalog, fitted model and the songs frame as an Arrow
+snapshot), so a restarted process memory-maps the last known library and
+publishes it before its first poll, without refetching features or
+refitting.
+"""
+import logging
+import os
+import threading
+import time
+
+import pandas as pd
+
+from Recommender import metrics
+from Recommender.cache import get_default_cache
+from Recommender.data import (AUDIO_FEATURE_COLS, SAVED_TRACK_COLS, SAVED_TRACKS_PAGE_SIZE,
+                              _saved_track_row, get_audio_features, get_user_saved_songs, saved_tracks_page,
+                              saved_tracks_scheduler)
+from Recommender.model import FeatureModel
+from Recommender.neighbors import DEFAULT_K, NeighborTable
+from Recommender.recommend import as_catalog, get_feature_model
+from Recommender.snapshot import compact_songs
+from Recommender.versioned import current_version
+from Recommender.warmstart import load_library, load_neighbors, load_songs, save_library, save_neighbors
+
+DEFAULT_SYNC_PATH = os.path.join('.spotify_cache', 'sync')
+DEFAULT_SYNC_INTERVAL = 300
+
+logger = logging.getLogger(__name__)
+
+
+class LibrarySnapshot:
+    """One consistent view of a user's library; never modified once published."""
+
+    def __init__(self, user_id, saved_songs, songs_with_audio, catalog, model, version, synced_at):
+        self.user_id = user_id
+        self.saved_songs = saved_songs
+        self.songs_with_audio = songs_with_audio
+        self.catalog = catalog
+        self.model = model
+        self.version = version
+        self.synced_at = synced_at
+
+    def __len__(self):
+        return len(self.saved_songs)
+
+
+def read_new_saved_tracks(sp, since, page_size=SAVED_TRACKS_PAGE_SIZE, scheduler=None):
+    """
+    Saved tracks added at or after `since` (an added_at timestamp), newest
+    first, reading pages only until older tracks show up.
+    Returns (saved-songs frame, library total).
+    """
+    scheduler = scheduler or saved_tracks_scheduler(1)
+    rows, offset = [], 0
+    while True:
+        page = saved_tracks_page(sp, page_size, offset, scheduler)
+        items = page.get('items', [])
+        total = page.get('total', offset + len(items))
+        for item in items:
+            if (item.get('added_at') or '') < since:
+                return pd.DataFrame(rows, columns=SAVED_TRACK_COLS), total
+            row = _saved_track_row(item)
+            if row is not None:
+                rows.append(row)
+        offset += len(items)
+        if not items or offset >= total:
+            return pd.DataFrame(rows, columns=SAVED_TRACK_COLS), total
+
+
+class LibrarySync:
+    """
+    Background thread keeping a LibrarySnapshot of one user's library current
+    (see module docstring). on_change callbacks are called from the sync
+    thread as fn(snapshot, added_ids, removed_ids) after each published change.
+    neighbors_k=0 turns the neighbour table off; neighbor_workers is the
+    process pool size for full rebuilds (default: one per CPU).
+    """
+
+    def __init__(self, sp, user_id, interval=DEFAULT_SYNC_INTERVAL, path=DEFAULT_SYNC_PATH,
+                 cache=None, scheduler=None, on_change=(), neighbors_k=DEFAULT_K, neighbor_workers=None):
+        self.sp = sp
+        self.user_id = user_id
+        self.interval = interval
+        self.path = path
+        self.cache = cache
+        self.scheduler = scheduler
+        self.on_change = list(on_change)
+        self.neighbors_k = neighbors_k
+        self.neighbor_workers = neighbor_workers
+        self.snapshot = None
+        self.neighbors = None
+        self.status = {'state': 'idle', 'done': 0, 'total': 0, 'error': None, 'last_sync': None}
+        self._model = FeatureModel()
+        self._ready = threading.Event()
+        self._wake = threading.Event()
+        self._stopped = threading.Event()
+        self._sync_lock = threading.Lock()
+        self._thread = None
+
+    @property
+    def _library_path(self):
+        return os.path.join(self.path, str(self.user_id))
+
+    def start(self):
+        """Start the sync thread (restores the persisted library first). Returns self."""
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name=f'library-sync-{self.user_id}', daemon=True)
+            self._thread.start()
+        return self
+
+    def stop(self, timeout=None):
+        self._stopped.set()
+        self._wake.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+
+    def trigger(self):
+        """Poll now instead of at the next interval."""
+        self._wake.set()
+
+    def wait_ready(self, timeout=None):
+        """Block until the first snapshot is published. Returns False on timeout."""
+        return self._ready.wait(timeout)
+
+    def _run(self):
+        try:
+            self.restore()
+        except Exception:
+            logger.exception("Could not restore the saved library of %s", self.user_id)
+        while not self._stopped.is_set():
+            try:
+                self.sync_once()
+            except Exception as e:
+                logger.exception("Library sync failed for %s", self.user_id)
+                self.status.update(state='error', error=str(e))
+            self._wake.wait(self.interval)
+            self._wake.clear()
+
+    def _progress(self, state):
+        def update(done, total):
+            self.status.update(state=state, done=done, total=total)
+        return update
+
+    def restore(self):
+        """Publish the library persisted by the last sync, if any. Returns True when it did."""
+        if self.snapshot is not None or not os.path.exists(self._library_path):
+            return False
+        # One version for every part, even if a save lands meanwhile
+        library = current_version(self._library_path)
+        songs = load_songs(library)
+        if songs is None:
+            return False
+        catalog, model = load_library(library)
+        saved_songs = songs.reindex(columns=SAVED_TRACK_COLS)
+        songs_with_audio = songs if 'danceability' in songs.columns else pd.DataFrame()
+        catalog.warm()
+
+        with self._sync_lock:
+            if self.snapshot is not None:
+                return False
+            self._model = model
+            self.snapshot = LibrarySnapshot(self.user_id, saved_songs, songs_with_audio, catalog, model,
+                                            1, time.time())
+            self.status.update(state='idle', last_sync=None)
+            self._ready.set()
+        self._notify([], [])
+        logger.info("Restored %d saved songs of %s", len(saved_songs), self.user_id)
+
+        if self.neighbors_k:
+            self.neighbors = load_neighbors(library, catalog)
+            if self.neighbors is None or self.neighbors.k != self.neighbors_k:
+                self._update_neighbors(model)
+                if self.neighbors is not None:
+                    save_neighbors(self._library_path, self.neighbors)
+        return True
+
+    def _feature_cache(self):
+        return self.cache if self.cache is not None else get_default_cache()
+
+    def _fetch_features(self, uris):
+        if not uris:
+            return pd.DataFrame(columns=AUDIO_FEATURE_COLS)
+        return get_audio_features(self.sp, uris, scheduler=self.scheduler, cache=self._feature_cache(),
+                                  progress=self._progress('features'))
+
+    def _uncached(self, uris):
+        """The URIs the feature cache has no answer for (not even a cached "no features")."""
+        if not uris:
+            return []
+        _, missing = self._feature_cache().get_many([uri.split(':')[-1] for uri in uris])
+        missing = set(missing)
+        return [uri for uri in uris if uri.split(':')[-1] in missing]
+
+    def sync_once(self):
+        """
+        Poll Spotify once and publish a new snapshot if the library changed.
+        Returns (added track IDs, removed track IDs).
+        """
+        with self._sync_lock:
+            previous = self.snapshot
+            if previous is None or previous.saved_songs.empty:
+                self.status.update(state='loading', error=None)
+                saved_songs = get_user_saved_songs(self.sp, progress=self._progress('loading'),
+                                                   scheduler=self.scheduler)
+                known = set()
+            else:
+                self.status.update(state='syncing', error=None)
+                known = set(previous.saved_songs['id'])
+                since = previous.saved_songs['added_at'].max()
+                head, total = read_new_saved_tracks(self.sp, since, scheduler=self.scheduler)
+                new = [t for t in head['id'] if t not in known]
+                if total == len(previous.saved_songs) + len(new):
+                    # Only additions (or re-saves, which move to the top)
+                    rest = previous.saved_songs[~previous.saved_songs['id'].isin(head['id'])]
+                    saved_songs = pd.concat([head, rest], ignore_index=True)
+                else:
+                    logger.info("Library total of %s changed by removals, re-reading track list", self.user_id)
+                    saved_songs = get_user_saved_songs(self.sp, progress=self._progress('syncing'),
+                                                       scheduler=self.scheduler)
+
+            if 'id' not in saved_songs.columns:
+                raise RuntimeError("Could not read the saved tracks")
+            current = set(saved_songs['id'])
+            added = [t for t in saved_songs['id'] if t not in known]
+            removed = [t for t in known if t not in current]
+
+            if previous is not None and not added and not removed:
+                self.status.update(state='idle', last_sync=time.time())
+                if not saved_songs['id'].equals(previous.saved_songs['id']):
+                    self._publish(saved_songs, previous.songs_with_audio.reindex(columns=AUDIO_FEATURE_COLS), [], [])
+                return [], []
+
+            # Features for new tracks, plus a retry for tracks that had none
+            # once their cached "no features" answer has expired
+            audio = pd.DataFrame(columns=AUDIO_FEATURE_COLS)
+            uris = saved_songs.loc[saved_songs['id'].isin(added), 'uri'].tolist()
+            if previous is not None and not previous.songs_with_audio.empty:
+                kept = previous.songs_with_audio[previous.songs_with_audio['id'].isin(current)]
+                uris += self._uncached(kept.loc[kept['danceability'].isna(), 'uri'].tolist())
+                audio = kept.loc[kept['danceability'].notna()].reindex(columns=AUDIO_FEATURE_COLS)
+            fetched = self._fetch_features(uris)
+            if not fetched.empty:
+                audio = fetched if audio.empty else pd.concat([audio, fetched], ignore_index=True)
+
+            self._publish(saved_songs, audio, added, removed)
+            logger.info("Synced library of %s: %d added, %d removed, %d total",
+                        self.user_id, len(added), len(removed), len(saved_songs))
+            return added, removed
+
+    def _publish(self, saved_songs, audio, added, removed):
+        """Build the next snapshot off to the side and swap it in."""
+        if audio.empty or saved_songs.empty:
+            songs_with_audio = pd.DataFrame()
+        else:
+            with metrics.timer('library.merge'):
+                audio = audio.reindex(columns=AUDIO_FEATURE_COLS).drop(columns='id').drop_duplicates('uri')
+                songs_with_audio = compact_songs(saved_songs.merge(audio, on='uri', how='left'))
+
+        with metrics.timer('library.catalog'):
+            catalog = as_catalog(songs_with_audio).warm()
+        model = get_feature_model(catalog, self._model.copy())
+        if len(model):
+            model.build_index()
+
+        version = self.snapshot.version + 1 if self.snapshot is not None else 1
+        self._model = model
+        self.snapshot = LibrarySnapshot(self.user_id, saved_songs, songs_with_audio, catalog, model,
+                                        version, time.time())
+        self.status.update(state='idle', last_sync=self.snapshot.synced_at)
+        self._ready.set()
+        self._notify(added, removed)
+
+        self._update_neighbors(model)
+        os.makedirs(self.path, exist_ok=True)
+        save_library(self._library_path, catalog=catalog, model=model, neighbors=self.neighbors,
+                     songs=saved_songs if songs_with_audio.empty else songs_with_audio)
+
+    def _update_neighbors(self, model):
+        """Carry the neighbour table over to the just-published model (sync thread only)."""
+        if not self.neighbors_k or len(model) < 2:
+            self.neighbors = None
+            return
+        with metrics.timer('library.neighbors'):
+            if self.neighbors is None or self.neighbors.k != self.neighbors_k:
+                self.neighbors = NeighborTable.build(model, self.neighbors_k, self.neighbor_workers)
+            else:
+                self.neighbors = self.neighbors.refresh(model, self.neighbor_workers)
+
+    def _notify(self, added, removed):
+        for callback in self.on_change:
+            try:
+                callback(self.snapshot, added, removed)
+            except Exception:
+                logger.exception("Library change callback %r failed", callback)
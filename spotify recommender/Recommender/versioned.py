@@ -0,0 +1,123 @@
+# Recommender/versioned.py
+"""
+Versioned directories for artifacts made of several files. Every save
+writes a complete new version next to the live one and then points CURRENT
+at it with a single os.replace, so a reader that resolves CURRENT once
+never mixes files from two saves, and a crash mid-save leaves the previous
+version live.
+
+    <path>/CURRENT            name of the live version
+    <path>/v<time_ns>-<tag>/  one complete save, named by when it was started
+    <path>/.lock              serialises publish() across threads and processes
+
+publish() only moves CURRENT forward: a save that started before the live
+version was written is discarded instead of replacing newer data. Old
+versions are pruned once they are both outside the newest KEEP_VERSIONS
+and older than PRUNE_AFTER seconds, so a reader that resolved CURRENT just
+before a switch has that long to open its files (open files and memory
+maps stay valid after the prune). A directory without CURRENT (written
+before versioning) is read as it is.
+"""
+import contextlib
+import logging
+import os
+import re
+import shutil
+import tempfile
+import threading
+import time
+
+try:
+    import fcntl
+except ImportError:  # Windows: publish() is only serialised within the process
+    fcntl = None
+
+POINTER = 'CURRENT'
+
+KEEP_VERSIONS = 3
+
+# Seconds a superseded version stays readable
+PRUNE_AFTER = 300
+
+_VERSION_NAME = re.compile(r'v(\d+)-[\w.-]+')
+
+_local_lock = threading.Lock()
+
+logger = logging.getLogger(__name__)
+
+
+@contextlib.contextmanager
+def locked(path, name='.lock'):
+    """Hold an exclusive lock on path/name: a file lock where fcntl exists, else a process-wide lock."""
+    os.makedirs(path, exist_ok=True)
+    if fcntl is None:
+        with _local_lock:
+            yield
+        return
+    with open(os.path.join(path, name), 'a') as f:
+        fcntl.flock(f, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(f, fcntl.LOCK_UN)
+
+
+def _started(name):
+    """When the version called name was started (ns), or None for names that aren't versions."""
+    match = _VERSION_NAME.fullmatch(name or '')
+    return int(match.group(1)) if match else None
+
+
+def _live_name(path):
+    try:
+        with open(os.path.join(path, POINTER)) as f:
+            return f.read().strip()
+    except FileNotFoundError:
+        return None
+
+
+def current_version(path):
+    """The directory holding the live version of path (path itself if it isn't versioned)."""
+    name = _live_name(path)
+    return path if name is None else os.path.join(path, name)
+
+
+def new_version(path):
+    """A new, empty version directory under path to write a save into; publish() makes it live."""
+    os.makedirs(path, exist_ok=True)
+    return tempfile.mkdtemp(prefix=f'v{time.time_ns()}-', dir=path)
+
+
+def publish(path, version):
+    """
+    Make version (from new_version) the live version of path, unless a
+    version started later is already live; then it is discarded. Returns
+    True when version went live.
+    """
+    name = os.path.basename(version)
+    with locked(path):
+        live = _started(_live_name(path))
+        if live is not None and live > _started(name):
+            logger.info("Discarding %s: a newer version of %s is already live", name, path)
+            discard(version)
+            return False
+        tmp = os.path.join(path, f'{POINTER}.{name}.tmp')
+        with open(tmp, 'w') as f:
+            f.write(name)
+        os.replace(tmp, os.path.join(path, POINTER))
+        _prune(path, name)
+    return True
+
+
+def _prune(path, live):
+    """Remove versions outside the newest KEEP_VERSIONS that are older than PRUNE_AFTER (never the live one)."""
+    cutoff = time.time_ns() - PRUNE_AFTER * 10 ** 9
+    versions = sorted((_started(entry), entry) for entry in os.listdir(path) if _started(entry) is not None)
+    for started, entry in versions[:-KEEP_VERSIONS]:
+        if entry != live and started < cutoff:
+            shutil.rmtree(os.path.join(path, entry), ignore_errors=True)
+
+
+def discard(version):
+    """Remove a version that was never published (e.g. after a failed save)."""
+    shutil.rmtree(version, ignore_errors=True)
@@ -0,0 +1,134 @@
+# Recommender/warmstart.py
+"""
+Warm-start artifacts: what a worker needs to answer recommendations,
+prebuilt on disk and memory-mapped at boot instead of recomputed.
+
+    <version>/catalog/    TrackCatalog.save: track IDs, metadata, raw features, rerank keys
+    <version>/model/      FeatureModel.save: scaler stats, pipeline vectors, index vectors
+    <version>/neighbors/  NeighborTable.save: top-k neighbours of every track (optional)
+    <version>/songs.arrow the songs frame the library was built from, as a
+                          columnar snapshot (optional, see Recommender.snapshot)
+
+<version> is the live version of the library directory (see
+Recommender.versioned): every save writes a new one and switches the
+CURRENT pointer, so catalog, model and neighbours always come from the same
+save. Callers loading several parts resolve current_version() once.
+
+Loading parses the track-ID list and two small JSON files; every matrix
+stays on disk until touched and is shared between processes through the
+page cache. warm_up() then runs one query so the pages and lazy imports a
+request needs are in place before the first real request arrives.
+"""
+import logging
+import os
+import shutil
+
+from Recommender.catalog import TrackCatalog
+from Recommender.model import FeatureModel
+from Recommender.neighbors import NeighborTable
+from Recommender.snapshot import read_snapshot, write_snapshot
+from Recommender.versioned import current_version, discard, new_version, publish
+
+# Parts of a version save_neighbors() carries over (hard-linked) to the next one
+_SHARED_PARTS = ('catalog', 'model', 'songs.arrow')
+
+logger = logging.getLogger(__name__)
+
+
+def save_library(path, songs_with_audio=None, catalog=None, model=None, songs=None, neighbors=None):
+    """
+    Write the catalog and fitted feature model (built from songs_with_audio
+    unless given) as a new version of the library at path, plus an optional
+    neighbour table and songs frame. Readers see the new version only once
+    it is complete. Returns (catalog, model).
+    """
+    from Recommender.recommend import as_catalog, get_feature_model
+
+    if catalog is None:
+        catalog = as_catalog(songs_with_audio)
+    if model is None:
+        model = get_feature_model(catalog, FeatureModel())
+
+    version = new_version(path)
+    try:
+        catalog.save(os.path.join(version, 'catalog'))
+        model.save(os.path.join(version, 'model'))
+        if neighbors is not None:
+            neighbors.save(os.path.join(version, 'neighbors'))
+        if songs is not None:
+            write_snapshot(songs, os.path.join(version, 'songs.arrow'))
+    except BaseException:
+        discard(version)
+        raise
+    publish(path, version)
+    return catalog, model
+
+
+def load_library(path, mmap=True):
+    """Load the live version of a library written by save_library; arrays are memory-mapped read-only."""
+    path = current_version(path)
+    catalog = TrackCatalog.load(os.path.join(path, 'catalog'), mmap=mmap)
+    model = FeatureModel.load(os.path.join(path, 'model'), mmap=mmap)
+    if model.ids != catalog.track_ids:
+        raise ValueError(f"Catalog and model in {path} don't describe the same tracks")
+    # Rows already line up, so requests never resync the model
+    model.source_version = catalog.version
+    return catalog, model
+
+
+def save_neighbors(path, neighbors):
+    """
+    Add (or replace) the neighbour table of the library at path, as a new
+    version sharing the live version's other files through hard links.
+    Raises ValueError if the table wasn't built for the live catalog.
+    """
+    live = current_version(path)
+    if neighbors.ids != TrackCatalog.load(os.path.join(live, 'catalog')).track_ids:
+        raise ValueError(f"Neighbour table doesn't describe the tracks of the library in {path}")
+
+    version = new_version(path)
+    try:
+        for part in _SHARED_PARTS:
+            source = os.path.join(live, part)
+            if os.path.isdir(source):
+                shutil.copytree(source, os.path.join(version, part), copy_function=os.link)
+            elif os.path.exists(source):
+                os.link(source, os.path.join(version, part))
+        neighbors.save(os.path.join(version, 'neighbors'))
+    except BaseException:
+        discard(version)
+        raise
+    publish(path, version)
+
+
+def load_neighbors(path, catalog, mmap=True):
+    """
+    The neighbour table saved with catalog (memory-mapped), or None when
+    there is none or it belongs to other tracks (a catalog from another
+    version of the library).
+    """
+    neighbors_path = os.path.join(current_version(path), 'neighbors')
+    if not os.path.exists(neighbors_path):
+        return None
+    neighbors = NeighborTable.load(neighbors_path, mmap=mmap)
+    if neighbors.ids != catalog.track_ids:
+        logger.warning("Ignoring the neighbour table in %s: it doesn't describe the catalog's tracks", path)
+        return None
+    neighbors.source_version = catalog.version
+    return neighbors
+
+
+def load_songs(path):
+    """The songs frame saved with the live version of the library (memory-mapped), or None."""
+    songs_path = os.path.join(current_version(path), 'songs.arrow')
+    if not os.path.exists(songs_path):
+        return None
+    return read_snapshot(songs_path)
+
+
+def warm_up(catalog, model, neighbors=None):
+    """One throwaway recommendation: imports, index pages and lazy caches are ready afterwards."""
+    if len(catalog) == 0:
+        return
+    from Recommender.recommend import recommend_from_song
+    recommend_from_song(catalog.track_ids[0], catalog, top_n=5, model=model, neighbors=neighbors)
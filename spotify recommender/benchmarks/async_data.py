@@ -0,0 +1,396 @@
+# benchmarks/async_data.py
+"""
+asyncio variant of the data layer, kept for benchmarks/bench_async.py only:
+the app and the sync thread use Recommender/data.py. It lives here until
+it is wired into the app, so Recommender/ carries one data path.
+
+Saved-track paging and audio-feature fetching run as one pipeline: feature
+batches are sent as soon as enough saved tracks have arrived instead of after
+the whole library is paged. Stages talk through bounded queues, and every
+request goes through one AsyncRateLimiter (global concurrency + token bucket).
+
+    async with AsyncSpotifyClient.from_spotipy(sp) as client:
+        async for chunk in stream_songs_with_audio(client):
+            ...  # songs_with_audio rows, ready to score
+"""
+import asyncio
+import contextlib
+import logging
+import random
+import time
+
+import pandas as pd
+from spotipy.exceptions import SpotifyException
+
+from Recommender import metrics
+from Recommender.cache import get_default_cache
+from Recommender.data import (AUDIO_FEATURE_COLS, SAVED_TRACK_COLS, SAVED_TRACKS_PAGE_SIZE,
+                              _saved_track_row)
+from Recommender.scheduler import BatchMetrics, _is_retryable, _retry_after
+
+API_BASE_URL = 'https://api.spotify.com/v1'
+
+# Spotify accepts at most 100 IDs per audio-features request
+AUDIO_FEATURES_BATCH_SIZE = 100
+
+# Metric labels for API paths, matching the ones the spotipy path records
+_ENDPOINTS = {'/me/tracks': 'saved_tracks', '/audio-features': 'audio_features'}
+
+logger = logging.getLogger(__name__)
+
+_DONE = object()
+
+
+class AsyncRateLimiter:
+    """
+    Async token bucket (`rate` requests/s, bursts up to `capacity`) combined
+    with a semaphore capping requests in flight at `max_concurrency`.
+
+        async with limiter:
+            ...  # one request
+    """
+
+    def __init__(self, rate=10.0, capacity=10, max_concurrency=8):
+        self.rate = rate
+        self.capacity = capacity
+        self._tokens = float(capacity)
+        self._updated = time.monotonic()
+        self._paused_until = 0.0
+        self._lock = asyncio.Lock()
+        self._semaphore = asyncio.Semaphore(max_concurrency)
+
+    def pause(self, seconds):
+        """Stop handing out tokens for `seconds` (used for Retry-After)."""
+        self._paused_until = max(self._paused_until, time.monotonic() + seconds)
+        self._tokens = 0.0
+
+    async def acquire(self):
+        """Wait for a token; callers queue on the lock so tokens go out in order."""
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                if now >= self._paused_until:
+                    start = max(self._updated, self._paused_until)
+                    self._tokens = min(self.capacity, self._tokens + (now - start) * self.rate)
+                    self._updated = now
+                    if self._tokens >= 1:
+                        self._tokens -= 1
+                        return
+                    wait = (1 - self._tokens) / self.rate
+                else:
+                    wait = self._paused_until - now
+                await asyncio.sleep(wait)
+
+    async def __aenter__(self):
+        await self._semaphore.acquire()
+        try:
+            await self.acquire()
+        except BaseException:
+            self._semaphore.release()
+            raise
+        return self
+
+    async def __aexit__(self, *exc):
+        self._semaphore.release()
+
+
+class AsyncSpotifyClient:
+    """
+    Minimal aiohttp client for the Web API endpoints the data layer uses.
+
+    `access_token` is a token string or a zero-argument callable returning
+    one (called per request, so a refreshing callable keeps long ingests
+    authorised). Failed requests raise SpotifyException, like spotipy; 429,
+    5xx and connection errors are retried with backoff, honouring Retry-After.
+    """
+
+    def __init__(self, access_token, base_url=API_BASE_URL, max_concurrency=8, rate=10.0, burst=10,
+                 max_retries=5, backoff=0.5, max_backoff=30.0, timeout=30):
+        self.access_token = access_token
+        self.base_url = base_url.rstrip('/')
+        self.limiter = AsyncRateLimiter(rate, burst, max_concurrency)
+        self.max_concurrency = max_concurrency
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.timeout = timeout
+        self.metrics = BatchMetrics()
+        self._session = None
+
+    @classmethod
+    def from_spotipy(cls, sp, **kwargs):
+        """Client sharing the access token of a spotipy.Spotify instance."""
+        auth_manager = sp.auth_manager
+        return cls(lambda: auth_manager.get_access_token(as_dict=False), **kwargs)
+
+    async def __aenter__(self):
+        import aiohttp
+
+        connector = aiohttp.TCPConnector(limit=self.max_concurrency)
+        self._session = aiohttp.ClientSession(connector=connector,
+                                              timeout=aiohttp.ClientTimeout(total=self.timeout))
+        self.metrics = BatchMetrics()
+        self.metrics.started = time.monotonic()
+        return self
+
+    async def __aexit__(self, *exc):
+        self.metrics.finished = time.monotonic()
+        await self._session.close()
+        self._session = None
+
+    async def _token(self):
+        if callable(self.access_token):
+            # spotipy may refresh over the network, keep that off the event loop
+            return await asyncio.to_thread(self.access_token)
+        return self.access_token
+
+    async def _request(self, path, params):
+        headers = {'Authorization': f'Bearer {await self._token()}'}
+        async with self.limiter:
+            async with self._session.get(self.base_url + path, params=params, headers=headers) as response:
+                if response.status >= 400:
+                    try:
+                        message = (await response.json()).get('error', {}).get('message', response.reason)
+                    except Exception:
+                        message = response.reason
+                    raise SpotifyException(response.status, -1, f"{path}: {message}",
+                                           headers=dict(response.headers))
+                if metrics.enabled():
+                    metrics.observe('api.response_bytes', len(await response.read()),
+                                    endpoint=_ENDPOINTS.get(path, path))
+                return await response.json()
+
+    async def get(self, path, params=None, size=1):
+        """GET an API path with retries; `size` is the item count recorded in metrics."""
+        import aiohttp
+
+        endpoint = _ENDPOINTS.get(path, path)
+        metrics.observe('api.batch_size', size, endpoint=endpoint)
+        attempt = 0
+        while True:
+            attempt += 1
+            start = time.monotonic()
+            try:
+                result = await self._request(path, params)
+                latency = time.monotonic() - start
+                self.metrics.record(size, latency, attempt, True)
+                metrics.record_time('api.request', latency, endpoint=endpoint)
+                return result
+            except (SpotifyException, aiohttp.ClientError, asyncio.TimeoutError) as e:
+                metrics.count('api.errors', endpoint=endpoint, status=getattr(e, 'http_status', None) or 'none')
+                if attempt > self.max_retries or not _is_retryable(e):
+                    self.metrics.record(size, time.monotonic() - start, attempt, False)
+                    metrics.count('api.failed_batches', endpoint=endpoint)
+                    raise
+                metrics.count('api.retries', endpoint=endpoint)
+
+                retry_after = _retry_after(e)
+                if retry_after is not None:
+                    self.limiter.pause(retry_after)
+                    wait = retry_after
+                else:
+                    wait = random.uniform(0, min(self.max_backoff, self.backoff * 2 ** (attempt - 1)))
+                await asyncio.sleep(wait)
+
+    async def saved_tracks_page(self, limit=SAVED_TRACKS_PAGE_SIZE, offset=0):
+        return await self.get('/me/tracks', {'limit': limit, 'offset': offset}, size=limit)
+
+    async def audio_features(self, track_ids):
+        """Audio features in request order, None for tracks the API has none for."""
+        response = await self.get('/audio-features', {'ids': ','.join(track_ids)}, size=len(track_ids))
+        return response.get('audio_features') or [None] * len(track_ids)
+
+
+async def iter_saved_pages_async(client, limit=None, page_size=SAVED_TRACKS_PAGE_SIZE, prefetch=None):
+    """
+    Yield (offset, items, total) for every page of saved tracks, in completion
+    order. The first page gives the total; after that at most `prefetch` page
+    requests (default: the client's max_concurrency) are outstanding, so paging
+    doesn't queue ahead of feature batches on the client's limiter.
+    """
+    prefetch = prefetch or client.max_concurrency
+    first = await client.saved_tracks_page(page_size, 0)
+    total = first.get('total', len(first['items']))
+    if limit is not None:
+        total = min(total, limit)
+
+    yield 0, first['items'][:total], total
+
+    async def page(offset):
+        return offset, (await client.saved_tracks_page(min(page_size, total - offset), offset))['items']
+
+    offsets = iter(range(page_size, total, page_size))
+    pending = set()
+    try:
+        while True:
+            for offset in offsets:
+                pending.add(asyncio.create_task(page(offset)))
+                if len(pending) >= prefetch:
+                    break
+            if not pending:
+                return
+            done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                offset, items = task.result()
+                yield offset, items, total
+    finally:
+        for task in pending:
+            task.cancel()
+        await asyncio.gather(*pending, return_exceptions=True)
+
+
+async def iter_saved_tracks_async(client, limit=None, page_size=SAVED_TRACKS_PAGE_SIZE):
+    """Stream the user's saved tracks as row dicts, as soon as each page arrives."""
+    async for _, items, _ in iter_saved_pages_async(client, limit, page_size):
+        for item in items:
+            row = _saved_track_row(item)
+            if row is not None:
+                yield dict(zip(SAVED_TRACK_COLS, row))
+
+
+async def iter_audio_features_async(client, track_ids, batch_size=AUDIO_FEATURES_BATCH_SIZE):
+    """Yield (batch_ids, features) for track_ids, batches requested concurrently, in completion order."""
+    async def fetch(batch):
+        return batch, await client.audio_features(batch)
+
+    batches = [track_ids[i:i + batch_size] for i in range(0, len(track_ids), batch_size)]
+    tasks = [asyncio.create_task(fetch(batch)) for batch in batches]
+    try:
+        for next_done in asyncio.as_completed(tasks):
+            yield await next_done
+    finally:
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+
+def _chunk_frame(rows, features_by_id):
+    """songs_with_audio rows for saved-track rows with features; (position, row) pairs in."""
+    records = []
+    for position, row in rows:
+        features = features_by_id.get(row[0])
+        if features is None:
+            continue
+        record = dict(zip(SAVED_TRACK_COLS, row))
+        record.update((col, features.get(col)) for col in AUDIO_FEATURE_COLS[2:])
+        record['position'] = position
+        records.append(record)
+    return pd.DataFrame.from_records(records, columns=SAVED_TRACK_COLS + AUDIO_FEATURE_COLS[2:] + ['position'])
+
+
+async def stream_songs_with_audio(client, limit=None, cache=None, batch_size=AUDIO_FEATURES_BATCH_SIZE,
+                                  queue_size=8, progress=None):
+    """
+    Yield songs_with_audio DataFrame chunks (saved-track columns, audio
+    features and the track's `position` in the library) while the library
+    is still being paged.
+
+    Three stages connected by bounded queues:
+      pages     -> saved-track rows, one queue item per page
+      batcher   -> looks rows up in the FeatureCache, emits cached rows right
+                   away and groups misses into audio-features batches
+      fetchers  -> fetch batches (client.max_concurrency of them) and store
+                   results in the cache
+    Tracks without features are dropped. progress(done, total) is called
+    with saved tracks accounted for so far.
+    """
+    if cache is None:
+        cache = get_default_cache()
+    pages = asyncio.Queue(queue_size)
+    batches = asyncio.Queue(queue_size)
+    out = asyncio.Queue(queue_size)
+    n_fetchers = client.max_concurrency
+    state = {'total': None, 'done': 0}
+
+    async def page_stage():
+        # aclosing: a cancelled stage cancels the page requests still in flight now, not at GC
+        async with contextlib.aclosing(iter_saved_pages_async(client, limit)) as saved_pages:
+            async for offset, items, total in saved_pages:
+                state['total'] = total
+                rows = []
+                for i, item in enumerate(items):
+                    row = _saved_track_row(item)
+                    if row is not None:
+                        rows.append((offset + i, row))
+                await pages.put((rows, len(items)))
+        await pages.put(_DONE)
+
+    async def batcher_stage():
+        pending = []
+        while True:
+            page = await pages.get()
+            if page is _DONE:
+                break
+            rows, n_items = page
+            state['done'] += n_items - len(rows)
+            found, _ = await asyncio.to_thread(cache.get_many, [row[0] for _, row in rows])
+            hits = [(p, row) for p, row in rows if row[0] in found]
+            pending.extend((p, row) for p, row in rows if row[0] not in found)
+            if hits:
+                await out.put((hits, found))
+            while len(pending) >= batch_size:
+                await batches.put(pending[:batch_size])
+                pending = pending[batch_size:]
+        if pending:
+            await batches.put(pending)
+        for _ in range(n_fetchers):
+            await batches.put(_DONE)
+
+    async def fetch_stage():
+        while True:
+            batch = await batches.get()
+            if batch is _DONE:
+                break
+            ids = list(dict.fromkeys(row[0] for _, row in batch))
+            try:
+                features = await client.audio_features(ids)
+            except SpotifyException as e:
+                logger.error("Batch of %d tracks failed: %s", len(ids), e)
+                state['done'] += len(batch)
+                continue
+            fetched = dict(zip(ids, features))
+            await asyncio.to_thread(cache.put_many, fetched)
+            await out.put((batch, fetched))
+        await out.put(_DONE)
+
+    async def guard(stage):
+        try:
+            await stage()
+        except asyncio.CancelledError:
+            raise
+        except BaseException as e:
+            # Surface stage failures in the consumer
+            await out.put(e)
+
+    tasks = [asyncio.create_task(guard(page_stage)), asyncio.create_task(guard(batcher_stage))]
+    tasks += [asyncio.create_task(guard(fetch_stage)) for _ in range(n_fetchers)]
+    try:
+        running = n_fetchers
+        while running:
+            item = await out.get()
+            if item is _DONE:
+                running -= 1
+                continue
+            if isinstance(item, BaseException):
+                raise item
+            rows, features_by_id = item
+            state['done'] += len(rows)
+            if progress is not None:
+                progress(state['done'], state['total'])
+            chunk = _chunk_frame(rows, features_by_id)
+            if len(chunk):
+                yield chunk
+    finally:
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+
+async def load_songs_with_audio_async(client, limit=None, cache=None, progress=None):
+    """Collect stream_songs_with_audio into one frame in library order (most recently saved first)."""
+    chunks = [chunk async for chunk in stream_songs_with_audio(client, limit, cache, progress=progress)]
+    if not chunks:
+        return pd.DataFrame(columns=SAVED_TRACK_COLS + AUDIO_FEATURE_COLS[2:])
+    songs = pd.concat(chunks, ignore_index=True).sort_values('position')
+    logger.info("Loaded %d saved songs with audio features", len(songs))
+    return songs.drop(columns='position').reset_index(drop=True)
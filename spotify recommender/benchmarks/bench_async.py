@@ -0,0 +1,64 @@
+# benchmarks/bench_async.py
+# Run from the "spotify recommender" folder:
+#   python -m benchmarks.bench_async --tracks 10000 --latency 0.1
+import argparse
+import asyncio
+import json
+import logging
+import time
+
+from benchmarks.async_data import AsyncSpotifyClient, stream_songs_with_audio
+from Recommender.cache import FeatureCache
+from Recommender.data import get_audio_features, get_user_saved_songs
+from Recommender.fake import FakeSpotify, FakeSpotifyServer
+from Recommender.scheduler import BatchScheduler
+
+
+def run_sync(args):
+    """Current data layer: page the whole library, then fetch features."""
+    sp = FakeSpotify(args.tracks, latency=args.latency)
+    start = time.monotonic()
+    scheduler = BatchScheduler(max_in_flight=args.concurrency, rate=args.rate, burst=args.rate)
+    saved_songs = get_user_saved_songs(sp, max_workers=args.concurrency, scheduler=scheduler)
+    audio_data = get_audio_features(sp, saved_songs['uri'].tolist(), cache=FeatureCache(':memory:'),
+                                    scheduler=scheduler)
+    songs_with_audio = saved_songs.merge(audio_data, on='uri', how='left')
+    elapsed = time.monotonic() - start
+    # Nothing can be scored before both steps return
+    return {'first_chunk_s': elapsed, 'total_s': elapsed, 'tracks': int(songs_with_audio['danceability'].notna().sum()),
+            'requests': sum(sp.calls.values())}
+
+
+async def run_async(args):
+    with FakeSpotifyServer(FakeSpotify(args.tracks, latency=args.latency)) as server:
+        client = AsyncSpotifyClient('token', base_url=server.base_url, max_concurrency=args.concurrency,
+                                    rate=args.rate, burst=args.rate)
+        start = time.monotonic()
+        first_chunk = None
+        tracks = 0
+        async with client:
+            async for chunk in stream_songs_with_audio(client, cache=FeatureCache(':memory:')):
+                if first_chunk is None:
+                    first_chunk = time.monotonic() - start
+                tracks += len(chunk)
+        return {'first_chunk_s': first_chunk, 'total_s': time.monotonic() - start, 'tracks': tracks,
+                'requests': sum(server.sp.calls.values()), 'client': client.metrics.summary()}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Time-to-first-chunk of the sync and asyncio data layers")
+    parser.add_argument('--tracks', type=int, default=5000)
+    parser.add_argument('--latency', type=float, default=0.1, help="fake API latency per call (s)")
+    parser.add_argument('--concurrency', type=int, default=8, help="requests in flight")
+    parser.add_argument('--rate', type=float, default=50.0, help="client requests/s")
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.WARNING)
+
+    report = {'tracks': args.tracks, 'latency_s': args.latency, 'concurrency': args.concurrency, 'rate': args.rate}
+    report['sync'] = run_sync(args)
+    report['async'] = asyncio.run(run_async(args))
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,55 @@
+# benchmarks/bench_scheduler.py
+# Run from the "spotify recommender" folder:
+#   python -m benchmarks.bench_scheduler --tracks 5000 --latency 0.1 --rate-limit 20
+import argparse
+import json
+import time
+
+from Recommender.fake import FakeSpotify, fake_track_id
+from Recommender.scheduler import BatchMetrics, BatchScheduler
+
+
+def run_legacy(sp, track_ids):
+    """The old get_audio_features loop: 10 IDs per call, serial, sleep(0.5) after each batch."""
+    start = time.monotonic()
+    for i in range(0, len(track_ids), 10):
+        sp.audio_features(track_ids[i:i + 10])
+        time.sleep(0.5)
+    elapsed = time.monotonic() - start
+    return {'elapsed_s': elapsed, 'throughput_items_per_s': len(track_ids) / elapsed}
+
+
+def run_scheduler(sp, track_ids, args):
+    scheduler = BatchScheduler(batch_size=args.batch_size, max_in_flight=args.in_flight,
+                               rate=args.rate, burst=args.rate)
+    run_metrics = BatchMetrics()
+    scheduler.run(sp.audio_features, track_ids, run_metrics=run_metrics)
+    return run_metrics.summary()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark audio-feature batching against a fake Spotify client")
+    parser.add_argument('--tracks', type=int, default=2000)
+    parser.add_argument('--latency', type=float, default=0.1, help="fake API latency per call (s)")
+    parser.add_argument('--rate-limit', type=int, default=None, help="fake server requests/s before 429s")
+    parser.add_argument('--batch-size', type=int, default=100)
+    parser.add_argument('--in-flight', type=int, default=4)
+    parser.add_argument('--rate', type=float, default=10.0, help="client token-bucket rate (requests/s)")
+    parser.add_argument('--legacy', action='store_true', help="also time the old 10-track/sleep loop")
+    args = parser.parse_args()
+
+    track_ids = [fake_track_id(n) for n in range(args.tracks)]
+    report = {'tracks': args.tracks, 'latency_s': args.latency, 'rate_limit': args.rate_limit}
+
+    sp = FakeSpotify(args.tracks, latency=args.latency, rate_limit=args.rate_limit)
+    report['scheduler'] = run_scheduler(sp, track_ids, args)
+    report['scheduler']['throttled'] = sp.throttled
+
+    if args.legacy:
+        report['legacy'] = run_legacy(FakeSpotify(args.tracks, latency=args.latency), track_ids)
+
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,62 @@
+# benchmarks/compare.py
+"""
+Compare two benchmarks.run JSON reports and flag regressions.
+
+    python -m benchmarks.compare old.json new.json --threshold 0.2
+
+Exits with status 1 if any tracked metric got worse by more than the threshold.
+"""
+import argparse
+import json
+import sys
+
+# (path into a per-size result, True if higher is better)
+METRICS = [
+    (('ingest', 'saved_songs_s'), False),
+    (('ingest', 'audio_features_s'), False),
+    (('recommend', 'cold_end_to_end_s'), False),
+    (('recommend', 'first_query_s'), False),
+    (('recommend', 'warm_query', 'p50_ms'), False),
+    (('recommend', 'warm_query', 'p99_ms'), False),
+    (('recommend', 'warm_queries_per_s'), True),
+    (('peak_rss_mb',), False),
+]
+
+
+def lookup(result, path):
+    for key in path:
+        if not isinstance(result, dict) or key not in result:
+            return None
+        result = result[key]
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare two benchmark reports")
+    parser.add_argument('baseline')
+    parser.add_argument('candidate')
+    parser.add_argument('--threshold', type=float, default=0.2, help="allowed relative slowdown")
+    args = parser.parse_args()
+
+    with open(args.baseline) as f:
+        baseline = {r['tracks']: r for r in json.load(f)['results']}
+    with open(args.candidate) as f:
+        candidate = {r['tracks']: r for r in json.load(f)['results']}
+
+    regressions = 0
+    for n_tracks in sorted(set(baseline) & set(candidate)):
+        for path, higher_is_better in METRICS:
+            old, new = lookup(baseline[n_tracks], path), lookup(candidate[n_tracks], path)
+            if not old or new is None:
+                continue
+            change = (new - old) / old
+            worse = -change if higher_is_better else change
+            flag = 'REGRESSION' if worse > args.threshold else ''
+            regressions += bool(flag)
+            print(f"{n_tracks:>9} {'.'.join(path):<35} {old:>12.4f} -> {new:>12.4f} ({change:+.1%}) {flag}")
+
+    sys.exit(1 if regressions else 0)
+
+
+if __name__ == '__main__':
+    main()
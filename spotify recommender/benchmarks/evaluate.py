@@ -0,0 +1,303 @@
+# benchmarks/evaluate.py
+"""
+Offline evaluation: recommendation quality next to latency and memory, per
+recommender variant, so index/approximation settings can be picked on evidence.
+
+Run from the "spotify recommender" folder:
+    python -m benchmarks.evaluate --users 200 --tracks 20000 --output eval.json
+    python -m benchmarks.evaluate --dataset cached --variants exact lsh
+
+Protocol: each user's saved tracks are split into seeds and held-out tracks
+(--holdout). Every seed (up to --seeds-per-user) asks the variant for k
+tracks from the whole catalog, never returning the user's seeds; the
+held-out tracks are the relevant ones. Reported per variant: precision@k,
+recall@k and NDCG@k (means over queries), catalog coverage (share of the
+catalog recommended at least once), per-query latency, build time and peak
+RSS. Each variant runs in its own process.
+
+Datasets: 'synthetic' (benchmarks.synthetic.synthetic_users, clustered
+tastes) or 'cached' (libraries collected in the collaborative model's
+interaction matrix, features from the shared FeatureCache). No API calls.
+"""
+import argparse
+import json
+import logging
+import multiprocessing
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+from benchmarks.run import git_revision, peak_rss_mb, percentiles
+
+
+def _recommend_from_song_variant(model_kwargs=None, rerankers=None):
+    """Variant calling recommend_from_song per seed, over-fetching to skip the user's own seeds."""
+    def build(catalog):
+        from Recommender.model import FeatureModel
+        from Recommender.recommend import get_feature_model, recommend_from_song
+
+        model = get_feature_model(catalog, FeatureModel(**(model_kwargs or {})))
+        model.build_index()
+        link_to_id = dict(zip(catalog.metadata['spotify_link'], catalog.track_ids))
+        extra = {} if rerankers is None else {'rerankers': rerankers}
+
+        def query(seed_ids, k, exclude):
+            results = []
+            for seed in seed_ids:
+                recommendations = recommend_from_song(seed, catalog, top_n=k + len(exclude), model=model, **extra)
+                ids = [link_to_id[link] for link in recommendations.get('spotify_link', [])]
+                results.append([t for t in ids if t not in exclude][:k])
+            return results
+        return query
+    return build
+
+
+def _batch_variant(per_seed=True, aggregate='mean'):
+    """recommend_batch for all of a user's seeds in one call: one group per seed, or one for the user."""
+    def build(catalog):
+        from Recommender.model import FeatureModel
+        from Recommender.recommend import get_feature_model, recommend_batch
+
+        model = get_feature_model(catalog, FeatureModel())
+        model.build_index()
+
+        def query(seed_ids, k, exclude):
+            groups = {seed: [seed] for seed in seed_ids} if per_seed else {'user': list(seed_ids)}
+            result = recommend_batch(groups, catalog, top_n=k, aggregate=aggregate, exclude_ids=exclude, model=model)
+            if result.empty:
+                return [[] for _ in groups]
+            by_group = result.groupby('seed_group', sort=False)['track_id'].apply(list).to_dict()
+            return [by_group.get(group, []) for group in groups]
+        return query
+    return build
+
+
+def _popularity_variant(libraries):
+    """Baseline: the most-saved tracks across all users' seeds."""
+    def build(catalog):
+        counts = np.zeros(len(catalog))
+        for seeds, _ in libraries.values():
+            rows = [catalog.id_to_row[t] for t in seeds if t in catalog.id_to_row]
+            np.add.at(counts, rows, 1)
+        ranked = [catalog.track_ids[r] for r in np.argsort(-counts, kind='stable')]
+
+        def query(seed_ids, k, exclude):
+            top = []
+            for track_id in ranked:
+                if track_id not in exclude:
+                    top.append(track_id)
+                    if len(top) == k:
+                        break
+            return [top] * len(seed_ids)
+        return query
+    return build
+
+
+def _random_variant(seed):
+    def build(catalog):
+        rng = np.random.default_rng(seed)
+
+        def query(seed_ids, k, exclude):
+            results = []
+            for _ in seed_ids:
+                picks = [catalog.track_ids[r] for r in rng.choice(len(catalog), k + len(exclude), replace=False)]
+                results.append([t for t in picks if t not in exclude][:k])
+            return results
+        return query
+    return build
+
+
+def variants(libraries, seed):
+    """name -> (description, build(catalog) -> query(seed_ids, k, exclude) -> [[track IDs]] per seed)."""
+    from Recommender.features import FeaturePipeline
+    from Recommender.rerank import ArtistDiversity, Dedup
+
+    return {
+        'exact': ("recommend_from_song, exact index, default rerankers", _recommend_from_song_variant()),
+        'exact_no_rerank': ("recommend_from_song without rerankers", _recommend_from_song_variant(rerankers=())),
+        'exact_dedup_only': ("recommend_from_song, dedup but no artist cap",
+                             _recommend_from_song_variant(rerankers=(Dedup(),))),
+        'artist_cap_1': ("recommend_from_song, at most one track per artist",
+                         _recommend_from_song_variant(rerankers=(Dedup(), ArtistDiversity(max_per_artist=1)))),
+        'onehot_key': ("one-hot key encoding",
+                       _recommend_from_song_variant({'pipeline': FeaturePipeline(key_encoding='onehot')})),
+        'unweighted': ("all feature weights 1.0", _recommend_from_song_variant(
+            {'pipeline': FeaturePipeline(weights={col: 1.0 for col in FeaturePipeline().columns})})),
+        'pca6': ("PCA to 6 dimensions", _recommend_from_song_variant({'pipeline': FeaturePipeline(n_components=6)})),
+        'lsh': ("LSH index (10 bits x 16 tables)", _recommend_from_song_variant({'index_params': {'method': 'lsh'}})),
+        'lsh_small': ("LSH index (12 bits x 8 tables)", _recommend_from_song_variant(
+            {'index_params': {'method': 'lsh', 'n_bits': 12, 'n_tables': 8}})),
+        'balltree': ("BallTree index", _recommend_from_song_variant({'index_params': {'method': 'balltree'}})),
+        'batch_per_seed': ("recommend_batch, one group per seed", _batch_variant()),
+        'batch_user_mean': ("recommend_batch, one query per user (mean of seeds)", _batch_variant(per_seed=False)),
+        'popularity': ("most saved tracks (baseline)", _popularity_variant(libraries)),
+        'random': ("random tracks (baseline)", _random_variant(seed)),
+    }
+
+
+def split_libraries(libraries, holdout, seed):
+    """{user: (seed track IDs, held-out track IDs)}; users with fewer than 2 tracks are skipped."""
+    rng = np.random.default_rng(seed)
+    splits = {}
+    for user, tracks in libraries.items():
+        tracks = list(dict.fromkeys(tracks))
+        if len(tracks) < 2:
+            continue
+        order = rng.permutation(len(tracks))
+        n_test = min(len(tracks) - 1, max(1, int(round(len(tracks) * holdout))))
+        splits[user] = ([tracks[i] for i in order[n_test:]], [tracks[i] for i in order[:n_test]])
+    return splits
+
+
+def ranking_metrics(recommended, relevant, k):
+    """(precision@k, recall@k, NDCG@k) for one ranked list against a set of relevant IDs."""
+    gains = np.array([1.0 if t in relevant else 0.0 for t in recommended[:k]])
+    discounts = 1.0 / np.log2(np.arange(2, k + 2))
+    dcg = float(gains @ discounts[:len(gains)])
+    idcg = float(discounts[:min(k, len(relevant))].sum())
+    hits = gains.sum()
+    return hits / k, hits / len(relevant) if relevant else 0.0, dcg / idcg if idcg else 0.0
+
+
+def load_dataset(args):
+    """(songs_with_audio frame, {user: [track IDs]}) for args.dataset."""
+    if args.dataset == 'synthetic':
+        from benchmarks.synthetic import synthetic_users
+        return synthetic_users(args.users, args.tracks, args.tracks_per_user, seed=args.seed)
+
+    import pandas as pd
+    from Recommender.cache import FeatureCache
+    from Recommender.collab import InteractionMatrix
+
+    interactions = InteractionMatrix.load(args.collab_path)
+    csr = interactions.csr
+    libraries = {
+        user: [interactions.track_ids[c] for c in csr.indices[csr.indptr[row]:csr.indptr[row + 1]]]
+        for row, user in enumerate(interactions.user_ids)
+    }
+    found, _ = FeatureCache(args.cache_path).get_many(interactions.track_ids)
+    frame = pd.DataFrame([f for f in found.values() if f is not None])
+    if frame.empty:
+        raise SystemExit(f"No cached audio features for the tracks in {args.collab_path}")
+    metadata = [interactions.metadata.get(t) or (None, None, None) for t in frame['id']]
+    frame['track'], frame['artist'], frame['spotify_link'] = (list(col) for col in zip(*metadata))
+    return frame, libraries
+
+
+def evaluate_variant(name, args):
+    """Build one variant and run every query (runs in a fresh process)."""
+    logging.basicConfig(level=logging.WARNING)
+    from Recommender.recommend import as_catalog
+
+    songs_with_audio, libraries = load_dataset(args)
+    catalog = as_catalog(songs_with_audio)
+    splits = split_libraries(
+        {u: [t for t in tracks if t in catalog.id_to_row] for u, tracks in libraries.items()}, args.holdout, args.seed)
+    description, build = variants(splits, args.seed)[name]
+
+    start = time.perf_counter()
+    query = build(catalog)
+    build_s = time.perf_counter() - start
+
+    rng = np.random.default_rng(args.seed)
+    precision, recall, ndcg, latencies = [], [], [], []
+    recommended = set()
+    for user, (seeds, held_out) in splits.items():
+        if len(seeds) > args.seeds_per_user:
+            seeds_used = [seeds[i] for i in rng.choice(len(seeds), args.seeds_per_user, replace=False)]
+        else:
+            seeds_used = seeds
+        exclude, relevant = set(seeds), set(held_out)
+
+        start = time.perf_counter()
+        results = query(seeds_used, args.k, exclude)
+        # Batched variants answer several seeds per call; spread the time over them
+        latencies.extend([(time.perf_counter() - start) / len(results)] * len(results))
+
+        for ranked in results:
+            p, r, n = ranking_metrics(ranked, relevant, args.k)
+            precision.append(p)
+            recall.append(r)
+            ndcg.append(n)
+            recommended.update(ranked)
+
+    return {
+        'variant': name,
+        'description': description,
+        'users': len(splits),
+        'queries': len(precision),
+        f'precision@{args.k}': float(np.mean(precision)),
+        f'recall@{args.k}': float(np.mean(recall)),
+        f'ndcg@{args.k}': float(np.mean(ndcg)),
+        'coverage': len(recommended) / len(catalog),
+        'build_s': build_s,
+        'latency': percentiles(latencies),
+        'peak_rss_mb': peak_rss_mb(),
+    }
+
+
+def format_table(results, k):
+    """Fixed-width summary of the results, one row per variant."""
+    columns = [('variant', 17, '{:<17}'), (f'prec@{k}', 8, '{:>8.4f}'), (f'recall@{k}', 10, '{:>10.4f}'),
+               (f'ndcg@{k}', 8, '{:>8.4f}'), ('coverage', 8, '{:>8.3f}'), ('p50_ms', 8, '{:>8.2f}'),
+               ('p90_ms', 8, '{:>8.2f}'), ('build_s', 8, '{:>8.2f}'), ('rss_mb', 7, '{:>7.0f}')]
+    lines = [' '.join(f'{name:<{width}}' if i == 0 else f'{name:>{width}}'
+                      for i, (name, width, _) in enumerate(columns))]
+    for result in results:
+        row = [result['variant'], result[f'precision@{k}'], result[f'recall@{k}'], result[f'ndcg@{k}'],
+               result['coverage'], result['latency']['p50_ms'], result['latency']['p90_ms'],
+               result['build_s'], result['peak_rss_mb']]
+        lines.append(' '.join(fmt.format(value) for value, (_, _, fmt) in zip(row, columns)))
+    return '\n'.join(lines)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Offline recommendation quality vs latency evaluation")
+    parser.add_argument('--dataset', choices=['synthetic', 'cached'], default='synthetic')
+    parser.add_argument('--users', type=int, default=200, help="synthetic users")
+    parser.add_argument('--tracks', type=int, default=20_000, help="synthetic catalog size")
+    parser.add_argument('--tracks-per-user', type=int, default=60)
+    parser.add_argument('--collab-path', default='.spotify_cache/collab', help="cached dataset: interaction matrix")
+    parser.add_argument('--cache-path', default='.spotify_cache/audio_features.sqlite',
+                        help="cached dataset: audio-feature cache")
+    parser.add_argument('--variants', nargs='+', help="default: all")
+    parser.add_argument('--k', type=int, default=10)
+    parser.add_argument('--holdout', type=float, default=0.2, help="fraction of each library held out")
+    parser.add_argument('--seeds-per-user', type=int, default=10)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--output', help="write JSON here instead of stdout")
+    args = parser.parse_args()
+
+    names = args.variants or list(variants({}, args.seed))
+    unknown = set(names) - set(variants({}, args.seed))
+    if unknown:
+        parser.error(f"unknown variants: {', '.join(sorted(unknown))}")
+
+    report = {
+        'revision': git_revision(),
+        'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'dataset': args.dataset,
+        'params': {key: value for key, value in vars(args).items() if key not in ('output', 'variants')},
+        'results': [],
+    }
+    spawn = multiprocessing.get_context('spawn')
+    for name in names:
+        with ProcessPoolExecutor(max_workers=1, mp_context=spawn) as pool:
+            result = pool.submit(evaluate_variant, name, args).result()
+        report['results'].append(result)
+        print(f"{name:<17} ndcg@{args.k} {result[f'ndcg@{args.k}']:.4f}  "
+              f"p50 {result['latency']['p50_ms']:.2f} ms", file=sys.stderr)
+
+    print(format_table(report['results'], args.k), file=sys.stderr)
+    output = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, 'w') as f:
+            f.write(output)
+    else:
+        print(output)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,182 @@
+# benchmarks/run.py
+"""
+End-to-end offline benchmark of the data and recommendation pipeline.
+
+Run from the "spotify recommender" folder:
+    python -m benchmarks.run --sizes 100 1000 10000 100000 1000000 --output bench.json
+
+Every library size runs in its own process so peak RSS is per size.
+Ingestion (get_user_saved_songs + get_audio_features against a stub client)
+is skipped above --max-ingest tracks.
+"""
+import argparse
+import json
+import logging
+import multiprocessing
+import platform
+import resource
+import subprocess
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+
+def percentiles(samples):
+    """Latency summary in milliseconds."""
+    samples = np.asarray(samples) * 1000
+    return {
+        'count': int(len(samples)),
+        'p50_ms': float(np.percentile(samples, 50)),
+        'p90_ms': float(np.percentile(samples, 90)),
+        'p99_ms': float(np.percentile(samples, 99)),
+        'max_ms': float(samples.max()),
+        'mean_ms': float(samples.mean()),
+    }
+
+
+def peak_rss_mb():
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # kilobytes on Linux, bytes on macOS
+    return peak / (1024 * 1024) if sys.platform == 'darwin' else peak / 1024
+
+
+def bench_ingest(n_tracks, latency):
+    from Recommender.cache import FeatureCache
+    from Recommender.data import get_audio_features, get_user_saved_songs
+    from Recommender.scheduler import BatchScheduler
+    from benchmarks.synthetic import synthetic_client
+
+    sp = synthetic_client(n_tracks, latency=latency)
+
+    scheduler = BatchScheduler(rate=1000, burst=1000)
+    start = time.perf_counter()
+    saved_songs = get_user_saved_songs(sp, scheduler=scheduler)
+    saved_s = time.perf_counter() - start
+
+    start = time.perf_counter()
+    audio_data = get_audio_features(sp, saved_songs['uri'].tolist(), scheduler=scheduler,
+                                    cache=FeatureCache(':memory:'))
+    features_s = time.perf_counter() - start
+
+    start = time.perf_counter()
+    songs_with_audio = saved_songs.merge(audio_data, on='uri', how='left')
+    merge_s = time.perf_counter() - start
+
+    return {
+        'saved_songs_s': saved_s,
+        'saved_songs_tracks_per_s': len(saved_songs) / saved_s,
+        'audio_features_s': features_s,
+        'audio_features_tracks_per_s': len(audio_data) / features_s,
+        'merge_s': merge_s,
+        'api_calls': dict(sp.calls),
+        'rows': len(songs_with_audio),
+    }
+
+
+def bench_recommend(n_tracks, queries, seed):
+    from Recommender.model import FeatureModel
+    from Recommender.recommend import as_catalog, recommend_batch, recommend_from_song
+    from benchmarks.synthetic import synthetic_library
+
+    songs_with_audio = synthetic_library(n_tracks, seed=seed)
+    rng = np.random.default_rng(seed)
+
+    # Cold: catalog + feature model built inside the call, as on a first click
+    first_id = songs_with_audio.dropna(subset=['danceability'])['id'].iloc[0]
+    start = time.perf_counter()
+    recommend_from_song(first_id, songs_with_audio, model=FeatureModel())
+    cold_s = time.perf_counter() - start
+
+    start = time.perf_counter()
+    catalog = as_catalog(songs_with_audio)
+    catalog_s = time.perf_counter() - start
+
+    model = FeatureModel()
+    start = time.perf_counter()
+    recommend_from_song(catalog.track_ids[0], catalog, model=model)
+    first_s = time.perf_counter() - start
+
+    seeds = rng.choice(len(catalog), size=queries)
+    latencies = []
+    for row in seeds:
+        start = time.perf_counter()
+        recommend_from_song(catalog.track_ids[row], catalog, model=model)
+        latencies.append(time.perf_counter() - start)
+
+    seed_ids = [catalog.track_ids[r] for r in rng.choice(len(catalog), size=min(50, len(catalog)), replace=False)]
+    batch = {}
+    for aggregate in ('mean', 'max', 'rrf'):
+        start = time.perf_counter()
+        recommend_batch(seed_ids, catalog, top_n=10, aggregate=aggregate, model=model)
+        batch[f'{aggregate}_50_seeds_ms'] = (time.perf_counter() - start) * 1000
+
+    return {
+        'cold_end_to_end_s': cold_s,
+        'catalog_build_s': catalog_s,
+        'first_query_s': first_s,
+        'warm_query': percentiles(latencies),
+        'warm_queries_per_s': len(latencies) / sum(latencies),
+        'batch': batch,
+    }
+
+
+def run_size(n_tracks, args):
+    """Benchmark one library size (runs in a fresh process)."""
+    # The data layer logs progress at INFO; keep the console quiet
+    logging.basicConfig(level=logging.WARNING)
+
+    result = {'tracks': n_tracks}
+    if n_tracks <= args.max_ingest:
+        result['ingest'] = bench_ingest(n_tracks, args.latency)
+    result['recommend'] = bench_recommend(n_tracks, args.queries, args.seed)
+    result['peak_rss_mb'] = peak_rss_mb()
+    return result
+
+
+def git_revision():
+    try:
+        return subprocess.check_output(['git', 'rev-parse', '--short', 'HEAD'], text=True,
+                                       stderr=subprocess.DEVNULL).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Offline pipeline benchmark with synthetic libraries")
+    parser.add_argument('--sizes', type=int, nargs='+', default=[100, 1000, 10_000, 100_000])
+    parser.add_argument('--queries', type=int, default=100, help="warm recommend_from_song calls per size")
+    parser.add_argument('--max-ingest', type=int, default=100_000, help="skip ingestion above this size")
+    parser.add_argument('--latency', type=float, default=0.0, help="stub API latency per call (s)")
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--output', help="write JSON here instead of stdout")
+    args = parser.parse_args()
+
+    report = {
+        'revision': git_revision(),
+        'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'python': platform.python_version(),
+        'numpy': np.__version__,
+        'machine': platform.machine(),
+        'results': [],
+    }
+
+    spawn = multiprocessing.get_context('spawn')
+    for n_tracks in args.sizes:
+        with ProcessPoolExecutor(max_workers=1, mp_context=spawn) as pool:
+            result = pool.submit(run_size, n_tracks, args).result()
+        report['results'].append(result)
+        print(f"{n_tracks:>9} tracks: warm p50 {result['recommend']['warm_query']['p50_ms']:.2f} ms, "
+              f"peak RSS {result['peak_rss_mb']:.0f} MB", file=sys.stderr)
+
+    output = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, 'w') as f:
+            f.write(output)
+    else:
+        print(output)
+
+
+if __name__ == '__main__':
+    main()
@@ -1,7 +1,57 @@
+import os
+import time
+
 import streamlit as st
-from Recommender.auth import get_spotify_client
-from Recommender.data import get_user_saved_songs, get_audio_features
-from Recommender.recommend import recommend_from_song
+from ui import debug_panel, get_spotify_client, progress_bar
+from Recommender import metrics
+
+# The recommendation stack (pandas, numpy, scipy) is imported where it's
+# first used, so the login page renders without loading it
+
+# Session keys that hold the signed-in client; cleared by the Refresh button
+SESSION_KEYS = ['sp', 'user_id']
+
+def listener_model_version():
+    """Changes whenever the listener model on disk is retrained or extended (every save is a new version)."""
+    from Recommender.collab import DEFAULT_COLLAB_PATH
+    from Recommender.versioned import current_version
+    path = current_version(DEFAULT_COLLAB_PATH)
+    return path if os.path.exists(os.path.join(path, 'model.json')) else None
+
+@st.cache_resource(show_spinner=False, max_entries=1)
+def get_listener_model(version):
+    """Collaborative model over every user's saved tracks, shared by all sessions (catch_up() before use)."""
+    from Recommender.collab import CollaborativeRecommender
+    return CollaborativeRecommender.load()
+
+@st.cache_resource(show_spinner=False)
+def get_global_index():
+    """Memory-mapped index of every track any user has fetched features for."""
+    from Recommender.global_index import GlobalIndex
+    return GlobalIndex()
+
+def share_library(snapshot, added_ids, removed_ids):
+    """Feed library changes into the global index and the listener model (runs on the sync thread)."""
+    songs_with_audio = snapshot.songs_with_audio
+    if added_ids and not songs_with_audio.empty:
+        # New tracks go into the global index as one small segment
+        get_global_index().add(songs_with_audio[songs_with_audio['id'].isin(added_ids)])
+    
+    # Share the change through the interaction log: listener models replay it
+    # when read and `collab train` folds it in, so no sync thread writes a model
+    if added_ids or removed_ids:
+        from Recommender.collab import InteractionLog, saved_songs_metadata
+        metadata = {}
+        if added_ids:
+            saved_songs = snapshot.saved_songs
+            added_ids, metadata = saved_songs_metadata(saved_songs[saved_songs['id'].isin(added_ids)])
+        InteractionLog().append(snapshot.user_id, added_ids, removed_ids, metadata)
+
+@st.cache_resource(show_spinner=False, max_entries=256, on_release=lambda sync: sync.stop())
+def get_library_sync(_sp, user_id):
+    """Background sync of one user's library, shared by all of that user's sessions."""
+    from Recommender.sync import LibrarySync
+    return LibrarySync(_sp, user_id, on_change=[share_library]).start()
 
 # App setup
 st.set_page_config(page_title="Spotify Recommender", layout="wide")
@@ -9,43 +59,62 @@ st.title("🎵 Spotify Song Recommender")
 
 # Add a refresh button at the top
 if st.button("🔄 Refresh Authentication Status"):
-    st.experimental_rerun()
+    if 'user_id' in st.session_state:
+        get_library_sync(st.session_state.sp, st.session_state.user_id).trigger()
+    for key in SESSION_KEYS:
+        st.session_state.pop(key, None)
+    st.rerun()
 
 try:
-    # Step 1: Authentication
+    # Step 1: Authentication (once per session)
     st.write("### Step 1: Authentication")
-    sp = get_spotify_client()
-    
-    if sp is None:
-        st.info("👆 **Please complete the authentication using one of the methods above, then refresh this page.**")
-        st.stop()
+    if 'sp' not in st.session_state:
+        sp = get_spotify_client()
+        
+        if sp is None:
+            st.info("👆 **Please complete the authentication using one of the methods above, then refresh this page.**")
+            st.stop()
+        
+        st.session_state.sp = sp
+        st.session_state.user_id = sp.current_user()['id']
     
     # If we get here, authentication was successful!
+    sp = st.session_state.sp
+    
+    # Step 2 + 3: The library is loaded and kept current by a background sync;
+    # pages read its latest snapshot and only wait the very first time
+    sync = get_library_sync(sp, st.session_state.user_id)
+    if st.query_params.get('debug') == '1':
+        debug_panel(sp, sync)
     
-    # Step 2: Get saved songs
-    st.write("### Step 2: Loading your saved songs...")
-    saved_songs = get_user_saved_songs(sp, limit=20)
+    if sync.snapshot is None:
+        st.write("### Step 2: Loading your saved songs...")
+        update = progress_bar("Loading your library")
+        while not sync.wait_ready(timeout=0.25):
+            if sync.status['state'] == 'error':
+                st.error(f"Could not load your library: {sync.status['error']}")
+                st.stop()
+            update(sync.status['done'], sync.status['total'])
+    snapshot = sync.snapshot
+    saved_songs = snapshot.saved_songs
+    songs_with_audio = snapshot.songs_with_audio
     
     if saved_songs.empty:
         st.error("No saved songs found. Please save some songs in Spotify first.")
         st.stop()
     
     # Show what songs we found
+    st.success(f"✅ Found {len(saved_songs)} saved songs")
+    synced = time.strftime('%H:%M:%S', time.localtime(sync.status['last_sync'] or snapshot.synced_at))
+    if st.button(f"Synced at {synced} · check for new songs", help="Your library is also checked in the background"):
+        sync.trigger()
     st.write("#### Your Saved Songs:")
     st.dataframe(saved_songs[['artist', 'track']])
     
-    # Step 3: Get audio features
-    st.write("### Step 3: Analyzing audio features...")
-    track_uris = saved_songs['uri'].tolist()
-    audio_data = get_audio_features(sp, track_uris)
-    
-    if audio_data.empty:
+    if songs_with_audio.empty:
         st.error("Could not fetch audio features. Please try again.")
         st.stop()
     
-    # Merge audio features with saved songs
-    songs_with_audio = saved_songs.merge(audio_data, on='uri', how='left')
-    
     st.success(f"✅ Combined {len(songs_with_audio)} songs with audio features")
     
     # Show songs with missing features
@@ -56,20 +125,31 @@ try:
     # Step 4: Recommendations
     st.write("### Step 4: Get Recommendations")
     
-    # Only use songs with audio features
-    valid_songs = songs_with_audio.dropna(subset=['danceability'])
+    # Only songs with audio features (the snapshot's catalog)
+    catalog = snapshot.catalog
     
-    if valid_songs.empty:
+    if len(catalog) == 0:
         st.error("No songs with complete audio features available.")
         st.stop()
     
-    # Create display options
-    song_options = [f"{row['track']} by {row['artist']}" for _, row in valid_songs.iterrows()]
-    selected_display = st.selectbox("Choose a song from your library:", song_options)
+    selected_id = st.selectbox("Choose a song from your library:", catalog.track_ids,
+                               format_func=catalog.display_name)
+    
+    global_index = get_global_index()
+    global_index.refresh()
+    beyond_library = st.checkbox(f"Include songs outside my library ({len(global_index)} known tracks)",
+                                 disabled=len(global_index) <= len(catalog))
     
     if st.button("Find Similar Songs"):
+        from Recommender.recommend import recommend_from_song
         with st.spinner("Finding similar songs..."):
-            recommendations = recommend_from_song(selected_display, songs_with_audio, top_n=5)
+            with metrics.profile(st.session_state.get('debug_profile', False)) as report:
+                recommendations = recommend_from_song(selected_id, catalog, top_n=5,
+                                                      model=snapshot.model, neighbors=sync.neighbors,
+                                                      candidates=global_index if beyond_library else None)
+            if report.report is not None:
+                with st.expander(f"Profile ({report.tool}, {report.seconds * 1000:.1f} ms)"):
+                    st.code(report.report)
             
             if recommendations.empty:
                 st.warning("No recommendations found. Try selecting a different song.")
@@ -90,6 +170,28 @@ try:
                     
                     st.write(f"🔗 [Listen on Spotify]({row['spotify_link']})")
                     st.write("---")
+    
+    # Step 5: Collaborative recommendations from other users' libraries
+    st.write("### Step 5: Tracks Liked by Similar Listeners")
+    from Recommender.collab import InteractionLog
+    listeners = get_listener_model(listener_model_version())
+    listeners.catch_up(InteractionLog())
+    
+    if not listeners.trained:
+        st.info(f"Listener model not trained yet ({len(listeners.interactions.user_ids)} libraries collected). "
+                "Run `python -m Recommender.collab train` to build it.")
+    elif st.button("Find Tracks from Similar Listeners"):
+        with st.spinner("Asking similar listeners..."):
+            recommendations = listeners.recommend(st.session_state.user_id, top_n=5)
+            
+            if recommendations.empty:
+                st.warning("No listener recommendations yet.")
+            else:
+                for idx, row in recommendations.iterrows():
+                    st.write(f"**{row['track']}** by {row['artist']}")
+                    st.write(f"Score: {row['score']:.3f}")
+                    st.write(f"🔗 [Listen on Spotify]({row['spotify_link']})")
+                    st.write("---")
 
 except Exception as e:
     st.error(f"Application error: {str(e)}")
@@ -1,5 +1,5 @@
 from Recommender.data import get_user_saved_songs, get_audio_features
-from Recommender.auth import get_spotify_client
+from ui import get_spotify_client
 
 sp = get_spotify_client()
 
@@ -0,0 +1,43 @@
+# tests/test_app.py
+import os
+from unittest import mock
+
+import pytest
+
+pytest.importorskip('streamlit')
+
+from streamlit.testing.v1 import AppTest
+
+from Recommender.fake import FakeSpotify
+
+MAIN = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'main.py')
+
+
+@pytest.fixture
+def app(tmp_path, monkeypatch):
+    import streamlit as st
+
+    # Caches, sync state and the listener log are written under the working directory
+    monkeypatch.chdir(tmp_path)
+    sp = FakeSpotify(300, latency=0)
+    with mock.patch('ui.get_spotify_client', return_value=sp):
+        yield AppTest.from_file(MAIN, default_timeout=60), sp
+    # Stops the library sync threads (on_release)
+    st.cache_resource.clear()
+    st.cache_data.clear()
+
+
+def test_reruns_and_recommendations_make_no_api_calls(app):
+    at, sp = app
+    at.run()
+    assert not at.exception and not at.error
+    assert any('Found 300 saved songs' in s.value for s in at.success)
+    loaded = dict(sp.calls)
+
+    at.run()
+    next(b for b in at.button if b.label == 'Find Similar Songs').click().run()
+
+    assert not at.exception
+    assert any('Recommended Songs' in m.value for m in at.markdown)
+    # Widget reruns read the session's snapshot instead of paging the library again
+    assert sp.calls == loaded
@@ -0,0 +1,84 @@
+# tests/test_async_data.py
+import asyncio
+
+import pytest
+from spotipy.exceptions import SpotifyException
+
+pytest.importorskip('aiohttp')
+
+from benchmarks.async_data import AsyncSpotifyClient, load_songs_with_audio_async, stream_songs_with_audio
+from Recommender.cache import FeatureCache
+from Recommender.data import get_user_saved_songs
+from Recommender.fake import FakeSpotify, FakeSpotifyServer
+from Recommender.scheduler import BatchScheduler
+
+
+class BrokenSpotify(FakeSpotify):
+    """FakeSpotify answering 404 for the saved-tracks page at `bad_offset` and feature batches holding `bad_id`."""
+
+    def __init__(self, *args, bad_offset=None, bad_id=None, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.bad_offset = bad_offset
+        self.bad_id = bad_id
+
+    def current_user_saved_tracks(self, limit=20, offset=0, market=None):
+        if offset == self.bad_offset:
+            raise SpotifyException(404, -1, 'Not found')
+        return super().current_user_saved_tracks(limit, offset, market)
+
+    def audio_features(self, tracks=[]):
+        if self.bad_id in tracks:
+            raise SpotifyException(404, -1, 'Not found')
+        return super().audio_features(tracks)
+
+
+def load(sp, timeout=10, **kwargs):
+    async def run():
+        with FakeSpotifyServer(sp) as server:
+            async with AsyncSpotifyClient('token', base_url=server.base_url, rate=1000, burst=1000,
+                                          backoff=0) as client:
+                return await load_songs_with_audio_async(client, cache=FeatureCache(':memory:'), **kwargs)
+
+    return asyncio.run(asyncio.wait_for(run(), timeout))
+
+
+def test_pipeline_matches_the_sync_data_layer():
+    songs = load(FakeSpotify(420, latency=0))
+    expected = get_user_saved_songs(FakeSpotify(420, latency=0), scheduler=BatchScheduler(rate=1000, burst=1000))
+
+    assert songs['id'].tolist() == expected['id'].tolist()
+    assert songs['danceability'].notna().all()
+
+
+def test_failed_feature_batch_drops_only_its_tracks():
+    sp = BrokenSpotify(420, latency=0)
+    sp.bad_id = sp._track(0)['id']
+    songs = load(sp)
+
+    assert sp.bad_id not in set(songs['id'])
+    # The 100-track batch holding the bad ID is lost, the rest arrive
+    assert len(songs) == 320
+
+
+def test_page_failure_reaches_the_consumer():
+    # A stage error must surface (not hang the consumer waiting for _DONE)
+    with pytest.raises(SpotifyException):
+        load(BrokenSpotify(420, latency=0, bad_offset=200))
+
+
+def test_closing_the_stream_early_cancels_the_stages():
+    async def run():
+        with FakeSpotifyServer(FakeSpotify(2000, latency=0.01)) as server:
+            async with AsyncSpotifyClient('token', base_url=server.base_url, rate=1000, burst=1000) as client:
+                before = asyncio.all_tasks()
+                stream = stream_songs_with_audio(client, cache=FeatureCache(':memory:'), queue_size=1)
+                first = await anext(stream)
+                await stream.aclose()
+                leftover = asyncio.all_tasks() - before
+                return first, leftover, server.sp.calls['current_user_saved_tracks']
+
+    first, leftover, pages = asyncio.run(asyncio.wait_for(run(), 10))
+
+    assert len(first)
+    assert leftover == set()
+    assert pages < 40
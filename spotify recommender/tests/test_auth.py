@@ -0,0 +1,81 @@
+# tests/test_auth.py
+import os
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+from Recommender import auth
+
+
+@pytest.fixture
+def flaky_server(request):
+    """Local server that answers `status` (Retry-After: 0) to the first request and 200 after that."""
+    status = request.param
+    hits = []
+
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            hits.append(self.path)
+            if len(hits) == 1:
+                self.send_response(status)
+                self.send_header('Retry-After', '0')
+                self.send_header('Content-Length', '0')
+                self.end_headers()
+            else:
+                body = b'{"ok": true}'
+                self.send_response(200)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+        def log_message(self, format, *args):
+            pass
+
+    server = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield f'http://127.0.0.1:{server.server_address[1]}', hits
+    server.shutdown()
+    server.server_close()
+
+
+@pytest.mark.parametrize('flaky_server', [503], indirect=True)
+def test_pooled_session_retries_server_errors(flaky_server):
+    url, hits = flaky_server
+    response = auth.get_http_session().get(url + '/v1/me/tracks', timeout=5)
+    assert response.status_code == 200
+    assert response.json() == {'ok': True}
+    assert len(hits) == 2
+
+
+@pytest.mark.parametrize('flaky_server', [429], indirect=True)
+def test_pooled_session_leaves_429_to_the_scheduler(flaky_server):
+    url, hits = flaky_server
+    response = auth.get_http_session().get(url + '/v1/me/tracks', timeout=5)
+    assert response.status_code == 429
+    assert response.headers['Retry-After'] == '0'
+    assert len(hits) == 1
+
+
+@pytest.mark.parametrize('key', ['', 'short', '../../etc/passwd', 'a' * 65, 'x' * 20 + '/..', None])
+def test_token_store_rejects_invalid_keys(tmp_path, key):
+    with pytest.raises(ValueError):
+        auth.TokenStore(key, directory=str(tmp_path))
+
+
+def test_token_store_path_stays_in_directory(tmp_path):
+    store = auth.TokenStore('A' * 32, directory=str(tmp_path))
+    assert os.path.dirname(store.path) == str(tmp_path)
+    assert 'A' * 32 not in store.path
+
+
+def test_state_is_a_single_use_nonce():
+    session_key = 'session-' + 'b' * 20
+    state = auth.new_state(session_key)
+    assert state != session_key
+    assert auth.consume_state(session_key) is None
+    assert auth.consume_state(state) == session_key
+    assert auth.consume_state(state) is None
+    assert auth.consume_state(None) is None
@@ -0,0 +1,74 @@
+# tests/test_benchmarks.py
+import argparse
+import json
+import sys
+
+import pytest
+
+from benchmarks import compare
+from benchmarks.run import percentiles, run_size
+from benchmarks.synthetic import synthetic_client, synthetic_library, synthetic_users
+from Recommender.data import get_user_saved_songs
+from Recommender.features import FEATURE_COLS
+from Recommender.scheduler import BatchScheduler
+
+
+def test_synthetic_library_is_deterministic():
+    songs = synthetic_library(1000, seed=4)
+
+    assert songs.equals(synthetic_library(1000, seed=4))
+    assert not songs.equals(synthetic_library(1000, seed=5))
+    assert set(FEATURE_COLS) <= set(songs.columns)
+    assert songs['id'].is_unique and songs['id'].str.len().eq(22).all()
+    assert 0 < songs['danceability'].isna().sum() < 60
+
+
+def test_synthetic_client_serves_the_same_track_ids():
+    sp = synthetic_client(300, seed=2)
+    saved = get_user_saved_songs(sp, scheduler=BatchScheduler(rate=1000, burst=1000))
+
+    assert saved['id'].tolist() == synthetic_library(300, seed=2)['id'].tolist()
+
+
+def test_synthetic_users_like_their_clusters():
+    songs, libraries = synthetic_users(n_users=20, n_tracks=2000, tracks_per_user=30)
+
+    assert len(libraries) == 20
+    known = set(songs['id'])
+    assert all(len(ids) == 30 and set(ids) <= known for ids in libraries.values())
+
+
+def test_run_size_reports_every_stage():
+    args = argparse.Namespace(max_ingest=1000, latency=0.0, queries=5, seed=0)
+    result = run_size(300, args)
+
+    assert result['tracks'] == 300
+    assert result['ingest']['rows'] == 300
+    assert result['recommend']['warm_query']['count'] == 5
+    assert set(result['recommend']['batch']) == {'mean_50_seeds_ms', 'max_50_seeds_ms', 'rrf_50_seeds_ms'}
+    assert percentiles([0.001, 0.003])['max_ms'] == pytest.approx(3.0)
+
+
+def report(tmp_path, name, p50, per_s):
+    path = tmp_path / name
+    path.write_text(json.dumps({'results': [
+        {'tracks': 1000, 'recommend': {'warm_query': {'p50_ms': p50}, 'warm_queries_per_s': per_s}},
+    ]}))
+    return str(path)
+
+
+@pytest.mark.parametrize('p50, per_s, status', [
+    (1.1, 100, 0),   # within the threshold
+    (1.5, 100, 1),   # slower
+    (1.0, 70, 1),    # lower throughput
+    (0.5, 200, 0),   # faster
+])
+def test_compare_flags_regressions(tmp_path, monkeypatch, capsys, p50, per_s, status):
+    baseline = report(tmp_path, 'old.json', 1.0, 100)
+    candidate = report(tmp_path, 'new.json', p50, per_s)
+    monkeypatch.setattr(sys, 'argv', ['compare', baseline, candidate, '--threshold', '0.2'])
+
+    with pytest.raises(SystemExit) as exit_info:
+        compare.main()
+    assert exit_info.value.code == status
+    assert ('REGRESSION' in capsys.readouterr().out) == bool(status)
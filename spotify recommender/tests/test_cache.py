@@ -0,0 +1,78 @@
+# tests/test_cache.py
+import types
+
+import pytest
+
+from Recommender import cache as cache_module
+from Recommender.cache import FeatureCache
+from Recommender.data import get_audio_features
+from Recommender.fake import FakeSpotify, fake_track_id
+from Recommender.scheduler import BatchScheduler
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    now = [1_000_000.0]
+    monkeypatch.setattr(cache_module, 'time', types.SimpleNamespace(time=lambda: now[0]))
+    return now
+
+
+def test_roundtrip_with_negative_entries():
+    cache = FeatureCache(':memory:')
+    cache.put_many({'a': {'energy': 0.5}, 'b': None})
+    found, missing = cache.get_many(['a', 'b', 'c', 'a'])
+
+    assert found == {'a': {'energy': 0.5}, 'b': None}
+    assert missing == ['c']
+    assert cache.stats()['hits'] == 1 and cache.stats()['negative_hits'] == 1 and cache.stats()['misses'] == 1
+
+
+def test_negative_entries_expire(clock):
+    cache = FeatureCache(':memory:', negative_ttl=60)
+    cache.put_many({'a': {'energy': 0.5}, 'b': None})
+    clock[0] += 61
+
+    assert cache.get_many(['a', 'b']) == ({'a': {'energy': 0.5}}, ['b'])
+
+
+def test_ttl_expires_positive_entries(clock):
+    cache = FeatureCache(':memory:', ttl=10)
+    cache.put_many({'a': {'energy': 0.5}})
+    clock[0] += 11
+
+    assert cache.get_many(['a']) == ({}, ['a'])
+
+
+def test_least_recently_used_entries_are_evicted(clock):
+    cache = FeatureCache(':memory:', max_entries=2)
+    cache.put_many({'a': {}, 'b': {}})
+    clock[0] += 1
+    cache.get_many(['a'])
+    clock[0] += 1
+    cache.put_many({'c': {}})
+
+    found, missing = cache.get_many(['a', 'b', 'c'])
+    assert set(found) == {'a', 'c'} and missing == ['b']
+    assert cache.evictions == 1
+
+
+def test_cache_file_is_shared_between_instances(tmp_path):
+    path = str(tmp_path / 'features.sqlite')
+    FeatureCache(path).put_many({'a': {'energy': 0.5}})
+
+    assert FeatureCache(path).get_many(['a'])[0] == {'a': {'energy': 0.5}}
+
+
+def test_get_audio_features_only_fetches_misses():
+    cache = FeatureCache(':memory:')
+    track_ids = [fake_track_id(n) for n in range(250)]
+    sp = FakeSpotify(250, latency=0)
+    scheduler = BatchScheduler(rate=1000, burst=1000)
+
+    first = get_audio_features(sp, track_ids[:150], scheduler=scheduler, cache=cache)
+    calls = sp.calls['audio_features']
+    second = get_audio_features(sp, track_ids, scheduler=scheduler, cache=cache)
+
+    assert len(first) == 150 and len(second) == 250
+    # Only the 100 new IDs go to the API, in one batch
+    assert sp.calls['audio_features'] - calls == 1
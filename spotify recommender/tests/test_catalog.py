@@ -0,0 +1,76 @@
+# tests/test_catalog.py
+import numpy as np
+import pandas as pd
+import pytest
+
+from Recommender.catalog import TrackCatalog
+from Recommender.features import FEATURE_COLS
+
+IDS = ['a' * 22, 'b' * 22, 'c' * 22, 'd' * 22]
+
+
+@pytest.fixture
+def songs():
+    return pd.DataFrame({
+        'id': [IDS[0], IDS[1], IDS[2], IDS[0], IDS[3]],
+        'uri': [f'spotify:track:{t}' for t in (IDS[0], IDS[1], IDS[2], IDS[0], IDS[3])],
+        'track': ['One', 'Two', 'Three', 'One again', 'Four'],
+        'artist': ['X', 'Y', 'X', 'X', 'Z'],
+        'spotify_link': ['https://open.spotify.com/track/' + IDS[0], None, '', 'dup', 'link-d'],
+        'danceability': [0.1, 0.2, np.nan, 0.4, 0.5],
+        'energy': [1.0, 2.0, 3.0, 4.0, 5.0],
+    })
+
+
+def test_from_frame_keeps_first_rows_with_features(songs):
+    catalog = TrackCatalog.from_frame(songs, FEATURE_COLS)
+
+    # Row without danceability and the repeated ID are dropped
+    assert catalog.track_ids == [IDS[0], IDS[1], IDS[3]]
+    assert catalog.metadata['track'].tolist() == ['One', 'Two', 'Four']
+    assert catalog.metadata['spotify_link'][1] == 'https://open.spotify.com/track/' + IDS[1]
+    assert catalog.metadata['uri'][2] == f'spotify:track:{IDS[3]}'
+    # Missing feature columns are zeros, float32 and contiguous
+    assert catalog.features.dtype == np.float32 and catalog.features.flags['C_CONTIGUOUS']
+    np.testing.assert_array_equal(catalog.feature('energy'), [1.0, 2.0, 5.0])
+    assert not catalog.feature('tempo').any()
+
+
+def test_find_by_id_or_display_name(songs):
+    catalog = TrackCatalog.from_frame(songs, FEATURE_COLS)
+
+    assert catalog.find(IDS[1]) == 1
+    assert catalog.find('Two by Y') == 1
+    assert catalog.display_name(IDS[3]) == 'Four by Z'
+    assert catalog.find('Three by X') is None
+    assert IDS[0] in catalog and IDS[2] not in catalog
+
+
+def test_take_assembles_rows_in_order(songs):
+    catalog = TrackCatalog.from_frame(songs, FEATURE_COLS)
+    frame = catalog.take([2, 0], ['energy', 'not_a_feature'])
+
+    assert frame.columns.tolist() == ['track_id', 'track', 'artist', 'spotify_link', 'energy', 'not_a_feature']
+    assert frame['track_id'].tolist() == [IDS[3], IDS[0]]
+    np.testing.assert_array_equal(frame['energy'], [5.0, 1.0])
+    assert frame['not_a_feature'].isna().all()
+
+
+def test_warm_fills_the_caches(songs):
+    catalog = TrackCatalog.from_frame(songs, FEATURE_COLS)
+
+    assert catalog.warm() is catalog
+    assert catalog._display_names is not None and catalog._rerank_keys is not None
+
+
+def test_save_and_load_roundtrip(songs, tmp_path):
+    catalog = TrackCatalog.from_frame(songs, FEATURE_COLS)
+    catalog.save(str(tmp_path))
+    loaded = TrackCatalog.load(str(tmp_path))
+
+    assert loaded.track_ids == catalog.track_ids
+    assert loaded.display_names == catalog.display_names
+    np.testing.assert_array_equal(loaded.features, catalog.features)
+    for saved, original in zip(loaded.rerank_keys, catalog.rerank_keys):
+        np.testing.assert_array_equal(saved, original)
+    pd.testing.assert_frame_equal(loaded.take([0, 2], ['energy']), catalog.take([0, 2], ['energy']))
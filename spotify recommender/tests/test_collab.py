@@ -0,0 +1,140 @@
+# tests/test_collab.py
+import os
+
+import numpy as np
+import pytest
+
+from benchmarks.synthetic import synthetic_users
+from Recommender import collab
+from Recommender.collab import CollaborativeRecommender, ImplicitALS, InteractionLog, InteractionMatrix
+from Recommender.versioned import current_version
+
+
+@pytest.fixture(scope='module')
+def libraries():
+    _, libraries = synthetic_users(n_users=60, n_tracks=2000, tracks_per_user=30)
+    return libraries
+
+
+def trained(libraries):
+    recommender = CollaborativeRecommender(ImplicitALS(factors=8, iterations=3, n_jobs=1))
+    for user_id, track_ids in libraries.items():
+        recommender.add_user(user_id, track_ids)
+    return recommender.train()
+
+
+def test_remove_drops_only_that_users_tracks():
+    matrix = InteractionMatrix()
+    matrix.add('a', ['t1', 't2', 't3'])
+    matrix.add('b', ['t2', 't3'])
+    before = matrix.csr
+    assert matrix.remove('a', ['t2', 't3', 'unknown']) == 2
+    assert [matrix.track_ids[c] for c in matrix.user_tracks('a')] == ['t1']
+    assert sorted(matrix.track_ids[c] for c in matrix.user_tracks('b')) == ['t2', 't3']
+    assert matrix.nnz == 3
+    # The matrix handed out before is left alone
+    assert before.nnz == 5
+    assert matrix.remove('nobody', ['t1']) == 0
+
+
+def test_removed_tracks_leave_the_user_row(libraries):
+    recommender = trained(libraries)
+    user_id, track_ids = next(iter(libraries.items()))
+    factors = recommender.model.user_factors[recommender.interactions.user_to_row[user_id]].copy()
+
+    kept, removed = track_ids[:20], track_ids[20:]
+    recommender.add_user(user_id, kept, removed_ids=removed)
+    row = recommender.interactions.user_to_row[user_id]
+    saved = {recommender.interactions.track_ids[c] for c in recommender.interactions.user_tracks(user_id)}
+    assert saved == set(kept)
+    assert not np.allclose(recommender.model.user_factors[row], factors)
+
+
+def test_save_is_versioned_and_round_trips(tmp_path, libraries):
+    path = str(tmp_path / 'collab')
+    recommender = trained(libraries)
+    recommender.save(path)
+    first = current_version(path)
+    recommender.add_user('new-user', next(iter(libraries.values()))[:5])
+    recommender.save(path)
+    assert current_version(path) != first
+    assert not os.path.exists(os.path.join(path, 'interactions.npz'))
+
+    loaded = CollaborativeRecommender.load(path)
+    assert loaded.interactions.user_ids == recommender.interactions.user_ids
+    assert (loaded.interactions.csr != recommender.interactions.csr).nnz == 0
+    np.testing.assert_array_equal(loaded.model.user_factors, recommender.model.user_factors)
+    assert InteractionMatrix.load(path).shape == recommender.interactions.shape
+
+
+def test_failed_save_keeps_the_previous_version(tmp_path, libraries, monkeypatch):
+    path = str(tmp_path / 'collab')
+    recommender = trained(libraries)
+    recommender.save(path)
+    live = current_version(path)
+
+    def fail(*args, **kwargs):
+        raise OSError('disk full')
+
+    monkeypatch.setattr(np, 'save', fail)
+    with pytest.raises(OSError):
+        recommender.save(path)
+    assert current_version(path) == live
+    assert sorted(entry for entry in os.listdir(path) if not entry.startswith('.')) == \
+        ['CURRENT', os.path.basename(live)]
+
+
+def test_growing_the_matrix_leaves_the_old_one_alone():
+    matrix = InteractionMatrix()
+    matrix.add('a', ['t1', 't2'])
+    before = matrix.csr
+    matrix.add('b', ['t3'])
+    after = matrix.csr
+    assert before.shape == (1, 2) and before.nnz == 2
+    assert after.shape == (2, 3) and after.nnz == 3
+
+
+def test_log_reads_complete_lines_only(tmp_path):
+    log = InteractionLog(str(tmp_path))
+    log.append('a', ['t1', 't2'], metadata={'t1': ('Song', 'Artist', None)})
+    changes, position = log.read()
+    assert [c['added'] for c in changes] == [['t1', 't2']]
+
+    # A half-written line is left for the next read
+    with open(log._segment_path(log.segments()[-1]), 'a') as f:
+        f.write('{"user_id": "b", "added"')
+    assert log.read(position) == ([], position)
+
+
+def test_catch_up_replays_each_change_once(tmp_path, libraries):
+    recommender = trained(libraries)
+    log = InteractionLog(str(tmp_path))
+    user_id, track_ids = next(iter(libraries.items()))
+    log.append(user_id, removed_ids=track_ids[:10])
+    log.append('newcomer', track_ids[:5])
+    assert recommender.catch_up(log) == 2
+    assert recommender.catch_up(log) == 0
+    assert len(recommender.interactions.user_tracks(user_id)) == len(track_ids) - 10
+    assert 'newcomer' in recommender.interactions.user_to_row
+    assert not recommender.recommend('newcomer').empty
+
+
+def test_train_folds_in_the_log_without_losing_later_changes(tmp_path, libraries):
+    path = str(tmp_path / 'collab')
+    log = InteractionLog(path)
+    for user_id, track_ids in libraries.items():
+        log.append(user_id, track_ids)
+    assert collab.main(['train', '--path', path, '--factors', '8', '--iterations', '2']) is None
+    # Replayed segments are gone, the model records where it stopped
+    assert log.segments() == [1]
+
+    log.append('late', next(iter(libraries.values()))[:5])
+    loaded = CollaborativeRecommender.load(path)
+    assert loaded.trained and len(loaded.interactions.user_ids) == len(libraries)
+    assert loaded.catch_up(log) == 1
+    assert 'late' in loaded.interactions.user_to_row
+
+    collab.main(['train', '--path', path, '--factors', '8', '--iterations', '2'])
+    retrained = CollaborativeRecommender.load(path)
+    assert 'late' in retrained.interactions.user_to_row
+    assert retrained.catch_up(log) == 0
@@ -0,0 +1,47 @@
+# tests/test_data.py
+from spotipy.exceptions import SpotifyException
+
+from Recommender.data import get_user_saved_songs, iter_saved_tracks
+from Recommender.fake import FakeSpotify
+from Recommender.scheduler import BatchScheduler
+
+
+class FlakySpotify(FakeSpotify):
+    """FakeSpotify whose saved-tracks page at `fail_offset` is rate limited `failures` times."""
+
+    def __init__(self, *args, fail_offset=100, failures=2, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.fail_offset = fail_offset
+        self.failures = failures
+
+    def current_user_saved_tracks(self, limit=20, offset=0, market=None):
+        if offset == self.fail_offset and self.failures:
+            self.failures -= 1
+            raise SpotifyException(429, -1, 'Too many requests', headers={'Retry-After': '0'})
+        return super().current_user_saved_tracks(limit, offset, market)
+
+
+def test_rate_limited_page_is_retried():
+    sp = FlakySpotify(300, latency=0)
+    saved_songs = get_user_saved_songs(sp, scheduler=BatchScheduler(rate=1000, burst=1000))
+    assert len(saved_songs) == 300
+    assert sp.failures == 0
+    expected = get_user_saved_songs(FakeSpotify(300, latency=0), scheduler=BatchScheduler(rate=1000, burst=1000))
+    assert saved_songs['id'].tolist() == expected['id'].tolist()
+
+
+def test_page_that_keeps_failing_gives_empty_frame():
+    sp = FlakySpotify(300, latency=0, failures=100)
+    saved_songs = get_user_saved_songs(sp, scheduler=BatchScheduler(rate=1000, burst=1000, max_retries=2))
+    assert saved_songs.empty
+
+
+def test_early_stop_does_not_fetch_every_page():
+    sp = FakeSpotify(5000, latency=0.01)
+    tracks = iter_saved_tracks(sp, max_workers=2, scheduler=BatchScheduler(rate=1000, burst=1000))
+    first = [next(tracks) for _ in range(120)]
+    tracks.close()
+
+    assert len({row['id'] for row in first}) == 120
+    # First page, the pages consumed and at most max_workers read ahead, of 100
+    assert sp.calls['current_user_saved_tracks'] <= 6
@@ -0,0 +1,44 @@
+# tests/test_evaluate.py
+import argparse
+
+import pytest
+
+from benchmarks.evaluate import evaluate_variant, ranking_metrics, split_libraries, variants
+
+
+def test_ranking_metrics():
+    precision, recall, ndcg = ranking_metrics(['a', 'x', 'b', 'y'], {'a', 'b', 'c'}, 4)
+
+    assert precision == 0.5
+    assert recall == pytest.approx(2 / 3)
+    # Hits at ranks 1 and 3 against an ideal of three hits at ranks 1-3
+    assert ndcg == pytest.approx((1 + 1 / 2) / (1 + 1 / 1.5849625 + 1 / 2), rel=1e-6)
+    assert ranking_metrics(['x'], {'a'}, 1) == (0.0, 0.0, 0.0)
+
+
+def test_split_libraries_is_disjoint_and_deterministic():
+    libraries = {'u1': [str(i) for i in range(10)], 'u2': ['a', 'a', 'b'], 'u3': ['solo']}
+    splits = split_libraries(libraries, holdout=0.2, seed=0)
+
+    assert set(splits) == {'u1', 'u2'}
+    seeds, held_out = splits['u1']
+    assert len(held_out) == 2 and len(seeds) == 8
+    assert not set(seeds) & set(held_out) and set(seeds) | set(held_out) == set(libraries['u1'])
+    assert splits['u2'] == (['a'], ['b']) or splits['u2'] == (['b'], ['a'])
+    assert split_libraries(libraries, holdout=0.2, seed=0) == splits
+
+
+def test_every_variant_is_buildable():
+    assert {'exact', 'lsh', 'balltree', 'batch_user_mean', 'popularity', 'random'} <= set(variants({}, 0))
+
+
+def test_audio_features_beat_random_on_clustered_users():
+    args = argparse.Namespace(dataset='synthetic', users=30, tracks=2000, tracks_per_user=40, holdout=0.2,
+                              seeds_per_user=3, k=10, seed=0)
+    exact = evaluate_variant('exact', args)
+    random = evaluate_variant('random', args)
+
+    assert exact['users'] == 30 and exact['queries'] == 90
+    assert exact['ndcg@10'] > 2 * random['ndcg@10']
+    assert 0 < exact['coverage'] <= 1
+    assert exact['latency']['count'] == 90
@@ -0,0 +1,74 @@
+# tests/test_features.py
+import numpy as np
+import pytest
+
+from Recommender.features import FEATURE_COLS, FeaturePipeline
+
+KEY = FEATURE_COLS.index('key')
+
+
+def rows_with_keys(keys):
+    raw = np.zeros((len(keys), len(FEATURE_COLS)))
+    raw[:, KEY] = keys
+    return raw
+
+
+def key_columns(pipeline, encoded):
+    return encoded[:, [i for i, name in enumerate(pipeline.encoded_cols) if name.startswith('key')]]
+
+
+def test_cyclic_key_puts_b_next_to_c():
+    pipeline = FeaturePipeline()
+    b, c, f_sharp, unknown = key_columns(pipeline, pipeline.encode(rows_with_keys([11, 0, 6, -1])))
+
+    assert np.linalg.norm(b - c) < np.linalg.norm(c - f_sharp)
+    np.testing.assert_allclose(np.linalg.norm(b), 1.0)
+    assert not unknown.any()
+    assert pipeline.dim == len(FEATURE_COLS) + 1
+
+
+def test_onehot_and_linear_key():
+    onehot = FeaturePipeline(key_encoding='onehot')
+    encoded = key_columns(onehot, onehot.encode(rows_with_keys([3, -1])))
+    np.testing.assert_array_equal(encoded, [np.eye(12)[3], np.zeros(12)])
+
+    linear = FeaturePipeline(key_encoding='linear')
+    raw = rows_with_keys([3, 7])
+    np.testing.assert_array_equal(linear.encode(raw), raw)
+
+
+def test_weigh_standardizes_only_continuous_columns():
+    pipeline = FeaturePipeline(weights={'energy': 2.0})
+    raw = np.random.default_rng(0).random((500, len(FEATURE_COLS))) * 10
+    raw[:, KEY] = np.arange(500) % 12
+    encoded = pipeline.encode(raw)
+    weighted = pipeline.weigh(encoded, encoded.mean(axis=0), pipeline.scale_for(encoded.var(axis=0)))
+
+    np.testing.assert_allclose(weighted.mean(axis=0), 0, atol=1e-9)
+    energy = pipeline.encoded_cols.index('energy')
+    np.testing.assert_allclose(weighted[:, energy].std(), 2.0)
+    # Categorical columns are only centred; key's two columns share its weight
+    mode = pipeline.encoded_cols.index('mode')
+    np.testing.assert_allclose(weighted[:, mode].std(), encoded[:, mode].std() * 0.5)
+    key_sin = pipeline.encoded_cols.index('key_sin')
+    np.testing.assert_allclose(pipeline.weight_vector[key_sin], 0.5 / np.sqrt(2))
+
+
+def test_projection_is_orthonormal_and_optional():
+    weighted = np.random.default_rng(1).standard_normal((200, 14))
+    components = FeaturePipeline(n_components=4).fit_projection(weighted)
+
+    assert components.shape == (14, 4)
+    np.testing.assert_allclose(components.T @ components, np.eye(4), atol=1e-9)
+    assert FeaturePipeline().fit_projection(weighted) is None
+    assert FeaturePipeline(n_components=14).fit_projection(weighted) is None
+
+
+def test_config_roundtrip_and_validation():
+    pipeline = FeaturePipeline(weights={'tempo': 0.1}, key_encoding='onehot', n_components=5)
+    restored = FeaturePipeline.from_dict(pipeline.to_dict())
+
+    assert restored.encoded_cols == pipeline.encoded_cols
+    np.testing.assert_array_equal(restored.weight_vector, pipeline.weight_vector)
+    with pytest.raises(ValueError):
+        FeaturePipeline(key_encoding='circle')
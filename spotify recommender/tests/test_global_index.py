@@ -0,0 +1,80 @@
+# tests/test_global_index.py
+import numpy as np
+import pytest
+
+from benchmarks.synthetic import synthetic_library
+from Recommender.global_index import GlobalIndex
+
+
+@pytest.fixture(scope='module')
+def songs():
+    return synthetic_library(900, seed=6, missing_rate=0).sort_values('id', ignore_index=True)
+
+
+def test_add_writes_only_new_tracks_as_segments(songs, tmp_path):
+    index = GlobalIndex(str(tmp_path))
+
+    assert index.add(songs.iloc[:400]) == 400
+    assert index.add(songs.iloc[300:700]) == 300
+    assert index.add(songs.iloc[:700]) == 0
+    assert len(index.segments) == 2 and len(index) == 700
+    assert songs['id'].iloc[650] in index and songs['id'].iloc[800] not in index
+
+
+def test_other_instances_see_new_segments(songs, tmp_path):
+    writer, reader = GlobalIndex(str(tmp_path)), GlobalIndex(str(tmp_path))
+    writer.add(songs.iloc[:100])
+
+    assert len(reader) == 0
+    assert reader.refresh() and len(reader) == 100
+    assert not reader.refresh()
+
+
+def test_query_merges_segments_like_one_exact_search(songs, tmp_path):
+    index = GlobalIndex(str(tmp_path))
+    for start in range(0, 900, 300):
+        index.add(songs.iloc[start:start + 300])
+    features = index.segments[0].raw[[0]]
+
+    ids, scores, _ = index.query(features, k=10)
+
+    vectors = np.concatenate([s.vectors for s in index.segments])
+    all_ids = np.concatenate([s.ids for s in index.segments])
+    exact = vectors @ index.transform(features)[0]
+    expected = np.argsort(-exact, kind='stable')[:10]
+    assert ids[0] == all_ids[expected].tolist()
+    np.testing.assert_allclose(scores[0], exact[expected], rtol=1e-5)
+    # A track's own features find the track itself first
+    assert ids[0][0] == str(index.segments[0].ids[0])
+
+
+def test_query_excludes_ids(songs, tmp_path):
+    index = GlobalIndex(str(tmp_path))
+    index.add(songs.iloc[:200])
+    index.add(songs.iloc[200:400])
+    features = index.segments[1].raw[[5]]
+    ids, _, _ = index.query(features, k=5)
+
+    excluded, _, _ = index.query(features, k=5, exclude_ids=ids[0][:2])
+    assert not set(excluded[0]) & set(ids[0][:2])
+    assert excluded[0][:3] == ids[0][2:5]
+
+
+def test_compact_matches_a_single_build(songs, tmp_path):
+    index = GlobalIndex(str(tmp_path / 'segmented'))
+    for start in range(0, 900, 300):
+        index.add(songs.iloc[start:start + 300])
+    old_paths = [s.path for s in index.segments]
+    index.compact()
+
+    single = GlobalIndex(str(tmp_path / 'single'))
+    single.add(songs)
+
+    assert len(index.segments) == 1 and len(index) == 900
+    assert not any(tmp_path.joinpath(p).exists() for p in old_paths)
+    # The scaler is refitted on every track, not kept from the first segment
+    np.testing.assert_allclose(index.mean, single.mean, rtol=1e-6)
+    np.testing.assert_allclose(index.scale, single.scale, rtol=1e-6)
+    np.testing.assert_array_equal(index.segments[0].ids, single.segments[0].ids)
+    np.testing.assert_allclose(index.segments[0].vectors, single.segments[0].vectors, atol=1e-6)
+    assert index.take([(index.segments[0], 3)])['track'].iloc[0] == single.take([(single.segments[0], 3)])['track'].iloc[0]
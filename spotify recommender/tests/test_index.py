@@ -0,0 +1,78 @@
+# tests/test_index.py
+import numpy as np
+import pytest
+
+from Recommender.index import SimilarityIndex, top_k
+
+
+@pytest.fixture(scope='module')
+def features():
+    return np.random.default_rng(0).standard_normal((3000, 12))
+
+
+def brute_force(features, rows, k):
+    """Exact cosine top-k of rows, leaving each row out of its own result."""
+    unit = features / np.linalg.norm(features, axis=1, keepdims=True)
+    scores = unit[rows] @ unit.T
+    scores[np.arange(len(rows)), rows] = -np.inf
+    return np.argsort(-scores, axis=1, kind='stable')[:, :k], np.sort(scores, axis=1)[:, ::-1][:, :k]
+
+
+def test_exact_matches_brute_force(features):
+    rows = np.arange(0, 3000, 37)
+    indices, scores = SimilarityIndex('exact').fit(features).query(rows, k=10)
+    expected_indices, expected_scores = brute_force(features, rows, 10)
+
+    np.testing.assert_array_equal(indices, expected_indices)
+    np.testing.assert_allclose(scores, expected_scores, atol=1e-5)
+
+
+def test_balltree_finds_the_exact_neighbours(features):
+    index = SimilarityIndex('balltree').fit(features)
+    rows = np.arange(0, 3000, 37)
+    indices, scores = index.query(rows, k=10)
+    _, expected_scores = brute_force(features, rows, 10)
+
+    assert index.recall(k=10) == 1.0
+    np.testing.assert_allclose(scores, expected_scores, atol=1e-4)
+    assert not (indices == rows[:, None]).any()
+
+
+def test_lsh_recall_against_exact(features):
+    index = SimilarityIndex('lsh').fit(features)
+    indices, scores = index.query(np.arange(100), k=10)
+
+    assert index.recall(k=10) >= 0.6
+    assert not (indices == np.arange(100)[:, None]).any()
+    # Whatever LSH returns is ranked by its true cosine
+    assert (np.diff(scores, axis=1) <= 1e-6).all()
+
+
+def test_lsh_falls_back_to_exact_when_buckets_are_too_small(features):
+    # 24 bits per table leaves almost every bucket with only the query in it
+    index = SimilarityIndex('lsh', n_bits=24, n_tables=1).fit(features)
+    indices, _ = index.query([5], k=10)
+
+    np.testing.assert_array_equal(indices, brute_force(features, np.array([5]), 10)[0])
+
+
+def test_query_vectors_with_k_beyond_the_index():
+    index = SimilarityIndex().fit(np.eye(4))
+    indices, scores = index.query_vectors(np.array([[1.0, 0.2, 0.0, 0.0]]), k=10)
+
+    assert indices.shape == (1, 4)
+    assert indices[0, 0] == 0 and indices[0, 1] == 1
+    assert (np.diff(scores[0]) <= 0).all()
+
+
+def test_top_k_edge_cases():
+    scores = np.array([[0.1, 0.9, 0.5]])
+    assert top_k(scores, 0)[0].shape == (1, 0)
+    np.testing.assert_array_equal(top_k(scores, 5)[0], [[1, 2, 0]])
+
+
+def test_unknown_method_and_unfitted_index():
+    with pytest.raises(ValueError):
+        SimilarityIndex('annoy')
+    with pytest.raises(RuntimeError):
+        SimilarityIndex().query_vectors(np.ones((1, 3)))
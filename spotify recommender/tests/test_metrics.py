@@ -0,0 +1,86 @@
+# tests/test_metrics.py
+import threading
+
+from Recommender import metrics
+from Recommender.metrics import TIME_BUCKETS, MetricsRegistry
+
+
+def test_disabled_registry_records_nothing():
+    registry = MetricsRegistry(enabled=False)
+    registry.count('a')
+    registry.observe('b', 3)
+    with registry.timer('c'):
+        pass
+
+    assert registry.to_dict()['counters'] == registry.to_dict()['timers'] == registry.to_dict()['summaries'] == []
+    assert registry.timer('c') is metrics._NULL_TIMER
+
+
+def test_counters_timers_and_summaries_by_labels():
+    registry = MetricsRegistry(enabled=True)
+    registry.count('api.errors', endpoint='tracks', status=429)
+    registry.count('api.errors', 2, status=429, endpoint='tracks')
+    registry.count('api.errors', endpoint='features', status=500)
+    registry.observe('api.batch_size', 50)
+    registry.observe('api.batch_size', 100)
+    registry.record_time('request', 0.003)
+    registry.record_time('request', 20.0)
+
+    exported = registry.to_dict()
+    counters = {tuple(sorted(c['labels'].items())): c['value'] for c in exported['counters']}
+    assert counters == {(('endpoint', 'tracks'), ('status', '429')): 3, (('endpoint', 'features'), ('status', '500')): 1}
+    summary = exported['summaries'][0]
+    assert (summary['count'], summary['mean'], summary['min'], summary['max']) == (2, 75.0, 50, 100)
+    timer = exported['timers'][0]
+    assert timer['count'] == 2 and timer['max'] == 20.0
+
+
+def test_prometheus_histogram_is_cumulative():
+    registry = MetricsRegistry(enabled=True)
+    for seconds in (0.0004, 0.003, 0.003, 20.0):
+        registry.record_time('recommend.similarity', seconds, scope='song')
+    registry.count('cache.hits', 5)
+
+    lines = registry.to_prometheus().splitlines()
+    name = 'spotify_recommender_recommend_similarity_seconds'
+    assert f'# TYPE {name} histogram' in lines
+    buckets = [line for line in lines if line.startswith(name + '_bucket')]
+    assert len(buckets) == len(TIME_BUCKETS) + 1
+    counts = [int(line.rsplit(' ', 1)[1]) for line in buckets]
+    assert counts == sorted(counts) and counts[0] == 1 and counts[-2] == 3 and counts[-1] == 4
+    assert f'{name}_bucket{{scope="song",le="0.005"}} 3' in lines
+    assert f'{name}_count{{scope="song"}} 4' in lines
+    assert 'spotify_recommender_cache_hits_total 5' in lines
+
+
+def test_label_values_are_escaped():
+    registry = MetricsRegistry(enabled=True)
+    registry.count('errors', reason='bad "quote"\n')
+
+    assert 'spotify_recommender_errors_total{reason="bad \\"quote\\"\\n"} 1' in registry.to_prometheus()
+
+
+def test_concurrent_counts_are_not_lost():
+    registry = MetricsRegistry(enabled=True)
+
+    def work():
+        for _ in range(2000):
+            registry.count('hits')
+
+    threads = [threading.Thread(target=work) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert registry.to_dict()['counters'][0]['value'] == 16000
+
+
+def test_profile_reports_only_when_enabled():
+    with metrics.profile(False) as report:
+        sum(range(1000))
+    assert report.report is None
+
+    with metrics.profile(True) as report:
+        sum(range(1000))
+    assert report.tool in ('pyinstrument', 'cProfile')
+    assert report.report and report.seconds >= 0
@@ -0,0 +1,85 @@
+# tests/test_model.py
+import numpy as np
+import pytest
+
+from benchmarks.synthetic import synthetic_library
+from Recommender.features import FEATURE_COLS, FeaturePipeline
+from Recommender.model import FeatureModel
+
+
+@pytest.fixture(scope='module')
+def songs():
+    # The model stores raw rows as float32; start from float32 values so only the update order differs
+    songs = synthetic_library(1000, seed=3)
+    songs[FEATURE_COLS] = songs[FEATURE_COLS].astype(np.float32).astype(np.float64)
+    return songs
+
+
+def fitted(frame, **kwargs):
+    model = FeatureModel(**kwargs)
+    model.add(frame)
+    return model
+
+
+def test_incremental_updates_match_a_full_refit(songs):
+    model = FeatureModel()
+    for start in range(0, 800, 200):
+        model.add(songs.iloc[start:start + 200])
+    removed = songs['id'].iloc[100:300].tolist()
+    model.remove(removed)
+    model.add(songs.iloc[800:])
+
+    remaining = songs[~songs['id'].isin(removed)]
+    expected = fitted(remaining)
+
+    assert model.count == expected.count == 800
+    np.testing.assert_allclose(model.mean, expected.mean, rtol=1e-8, atol=1e-8)
+    np.testing.assert_allclose(model.var, expected.var, rtol=1e-8, atol=1e-8)
+    model.reorder(expected.ids)
+    np.testing.assert_allclose(model.build_vectors(), expected.build_vectors(), atol=1e-5)
+
+
+def test_sync_adds_and_removes_only_the_difference(songs):
+    model = fitted(songs.iloc[:600])
+
+    assert model.sync(songs.iloc[400:900]) == (300, 400)
+    assert sorted(model.ids) == sorted(songs['id'].iloc[400:900])
+    assert len(model) == model.count == 500
+
+
+def test_removing_everything_resets_the_statistics(songs):
+    model = fitted(songs.iloc[:50])
+    model.remove(model.ids)
+
+    assert len(model) == model.count == 0
+    assert not model.mean.any() and not model.m2.any()
+
+
+def test_copy_is_independent(songs):
+    model = fitted(songs.iloc[:100])
+    model.build_index()
+    clone = model.copy()
+    clone.add(songs.iloc[100:150])
+
+    assert len(model) == 100 and len(clone) == 150
+    assert len(model.index) == 100
+
+
+def test_transform_matches_the_library_vectors(songs):
+    model = fitted(songs.iloc[:300], pipeline=FeaturePipeline(n_components=5))
+    raw = model.raw[:10]
+
+    np.testing.assert_allclose(model.transform(raw), model.build_vectors()[:10], atol=1e-5)
+    assert model.build_vectors().shape == (300, 5)
+
+
+def test_save_and_load_roundtrip(songs, tmp_path):
+    model = fitted(songs.iloc[:300], pipeline=FeaturePipeline(key_encoding='onehot', n_components=6),
+                   index_params={'method': 'exact'})
+    model.save(str(tmp_path))
+    loaded = FeatureModel.load(str(tmp_path))
+
+    assert loaded.ids == model.ids
+    np.testing.assert_array_equal(loaded.scaled, model.scaled)
+    np.testing.assert_allclose(loaded.transform(model.raw[:5]), model.transform(model.raw[:5]), atol=1e-6)
+    np.testing.assert_array_equal(loaded.build_index().query([0], k=5)[0], model.build_index().query([0], k=5)[0])
@@ -0,0 +1,107 @@
+# tests/test_neighbors.py
+import numpy as np
+import pytest
+
+from benchmarks.synthetic import synthetic_library
+from Recommender.model import FeatureModel
+from Recommender.neighbors import NeighborTable, compute_rows
+from Recommender.recommend import as_catalog, get_feature_model, recommend_from_song
+
+
+@pytest.fixture(scope='module')
+def songs():
+    return synthetic_library(1200, seed=8, missing_rate=0)
+
+
+def fitted(frame):
+    model = FeatureModel()
+    model.add(frame)
+    return model
+
+
+def assert_exact_prefix(table, expected):
+    """Every row's first table.depth entries equal the exact top-k."""
+    depth = table.depth
+    assert depth > 0
+    np.testing.assert_array_equal(table.neighbors[:, :depth], expected.neighbors[:, :depth])
+    np.testing.assert_allclose(table.scores[:, :depth], expected.scores[:, :depth], atol=1e-5)
+
+
+def test_blocks_and_workers_match_one_pass(songs):
+    vectors = fitted(songs.iloc[:400]).build_index().vectors
+    rows = np.arange(len(vectors))
+    expected = compute_rows(vectors, rows, 20)
+
+    # 4 KB blocks are a couple of rows each
+    for result in (compute_rows(vectors, rows, 20, block_bytes=4096),
+                   compute_rows(vectors, rows, 20, workers=2, block_bytes=64 * 1024)):
+        np.testing.assert_array_equal(result[0], expected[0])
+        np.testing.assert_allclose(result[1], expected[1], atol=1e-6)
+
+
+def test_build_matches_the_exact_index(songs):
+    model = fitted(songs.iloc[:500])
+    table = NeighborTable.build(model, k=15, workers=1)
+    indices, scores = model.build_index().query(np.arange(500), k=15)
+
+    assert table.ids == model.ids and table.depth == 15
+    np.testing.assert_array_equal(table.neighbors, indices)
+    np.testing.assert_allclose(table.scores, scores, atol=1e-5)
+
+
+def test_refresh_agrees_with_a_rebuild(songs):
+    model = fitted(songs.iloc[:1000])
+    table = NeighborTable.build(model, k=20, workers=1)
+    changed = model.copy()
+    changed.remove(model.ids[100:130])
+    changed.add(songs.iloc[1000:1040])
+
+    refreshed = table.refresh(changed, workers=1)
+    rebuilt = NeighborTable.build(changed, k=20, workers=1)
+
+    assert refreshed.ids == changed.ids
+    assert refreshed.depth >= 10
+    assert_exact_prefix(refreshed, rebuilt)
+    # The old table is left as it was
+    assert table.ids == model.ids
+
+
+def test_refresh_rebuilds_after_large_changes(songs):
+    model = fitted(songs.iloc[:300])
+    table = NeighborTable.build(model, k=10, workers=1)
+    changed = model.copy()
+    changed.add(songs.iloc[300:600])
+
+    refreshed = table.refresh(changed, workers=1)
+    assert refreshed.depth == 10
+    assert_exact_prefix(refreshed, NeighborTable.build(changed, k=10, workers=1))
+
+
+def test_unchanged_library_reuses_the_rows(songs):
+    model = fitted(songs.iloc[:200])
+    table = NeighborTable.build(model, k=10, workers=1)
+    refreshed = table.refresh(model.copy(), workers=1)
+
+    assert refreshed.neighbors is table.neighbors and refreshed.depth == table.depth
+
+
+def test_save_and_load(songs, tmp_path):
+    table = NeighborTable.build(fitted(songs.iloc[:200]), k=10, workers=1)
+    table.save(str(tmp_path))
+    loaded = NeighborTable.load(str(tmp_path))
+
+    assert (loaded.ids, loaded.k, loaded.depth) == (table.ids, table.k, table.depth)
+    np.testing.assert_array_equal(loaded.neighbors, table.neighbors)
+
+
+def test_recommendations_from_the_table_match_the_index(songs):
+    catalog = as_catalog(songs.iloc[:600])
+    model = get_feature_model(catalog, FeatureModel())
+    table = NeighborTable.build(model, k=50, workers=1)
+
+    assert table.covers(catalog, 25)
+    for seed in catalog.track_ids[:5]:
+        with_table = recommend_from_song(seed, catalog, top_n=5, model=model, neighbors=table)
+        without = recommend_from_song(seed, catalog, top_n=5, model=model)
+        assert with_table['spotify_link'].tolist() == without['spotify_link'].tolist()
+        np.testing.assert_allclose(with_table['similarity_score'], without['similarity_score'], atol=1e-5)
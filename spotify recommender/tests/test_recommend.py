@@ -0,0 +1,94 @@
+# tests/test_recommend.py
+import numpy as np
+import pytest
+
+from benchmarks.synthetic import synthetic_library
+from Recommender.model import FeatureModel
+from Recommender.recommend import as_catalog, get_feature_model, recommend_batch, recommend_from_song
+
+
+@pytest.fixture(scope='module')
+def library():
+    catalog = as_catalog(synthetic_library(500))
+    return catalog, get_feature_model(catalog, FeatureModel())
+
+
+def test_similarity_score_is_the_cosine_to_the_seed(library):
+    catalog, model = library
+    seed = catalog.track_ids[0]
+    recommendations = recommend_from_song(seed, catalog, top_n=10, model=model)
+    assert len(recommendations) == 10
+
+    vectors = model.index.vectors
+    rows = [model.id_to_row[link.rsplit('/', 1)[-1]] for link in recommendations['spotify_link']]
+    np.testing.assert_allclose(recommendations['similarity_score'], vectors[rows] @ vectors[0], rtol=1e-5)
+    # Diversity penalties only ever lower the ranking score
+    assert (recommendations['rerank_score'] <= recommendations['similarity_score'] + 1e-9).all()
+    assert recommendations['rerank_score'].is_monotonic_decreasing
+
+
+def test_batch_score_is_the_aggregated_similarity(library):
+    catalog, model = library
+    seeds = catalog.track_ids[:3]
+    result = recommend_batch(seeds, catalog, top_n=10, aggregate='max', model=model)
+    vectors = model.index.vectors
+    rows = [model.id_to_row[link.rsplit('/', 1)[-1]] for link in result['spotify_link']]
+    seed_rows = [model.id_to_row[t] for t in seeds]
+    np.testing.assert_allclose(result['score'], (vectors[rows] @ vectors[seed_rows].T).max(axis=1), rtol=1e-5)
+    assert (result['rerank_score'] <= result['score'] + 1e-9).all()
+    assert result['rank'].tolist() == list(range(1, 11))
+
+
+def exact_ranking(scores, exclude, n):
+    scores = scores.copy()
+    scores[list(exclude)] = -np.inf
+    return np.argsort(-scores, kind='stable')[:n]
+
+
+def test_batch_mean_ranks_by_the_seed_centroid(library):
+    catalog, model = library
+    seed_rows = [3, 40, 77]
+    result = recommend_batch([catalog.track_ids[r] for r in seed_rows], catalog, top_n=10, model=model, rerankers=())
+
+    vectors = model.index.vectors
+    centroid = vectors[seed_rows].sum(axis=0)
+    centroid /= np.linalg.norm(centroid)
+    expected = exact_ranking(vectors @ centroid, seed_rows, 10)
+    assert result['track_id'].tolist() == [catalog.track_ids[r] for r in expected]
+    np.testing.assert_allclose(result['score'], (vectors @ centroid)[expected], rtol=1e-5)
+
+
+def test_batch_rrf_with_one_seed_keeps_its_ranking(library):
+    catalog, model = library
+    seed = catalog.track_ids[12]
+    fused = recommend_batch([seed], catalog, top_n=10, aggregate='rrf', model=model, rerankers=())
+    single = recommend_batch([seed], catalog, top_n=10, aggregate='max', model=model, rerankers=())
+
+    assert fused['track_id'].tolist() == single['track_id'].tolist()
+
+
+def test_batch_never_returns_seeds_or_excluded_tracks(library):
+    catalog, model = library
+    seeds, excluded = catalog.track_ids[:5], catalog.track_ids[5:200]
+    for aggregate in ('mean', 'max', 'rrf'):
+        result = recommend_batch(seeds, catalog, top_n=50, aggregate=aggregate, exclude_ids=excluded, model=model)
+        assert len(result) == 50
+        assert not set(result['track_id']) & set(seeds + excluded)
+
+
+def test_batch_groups_match_separate_calls(library):
+    catalog, model = library
+    groups = {'a': catalog.track_ids[:3], 'b': catalog.track_ids[10:12]}
+    result = recommend_batch(groups, catalog, top_n=5, model=model)
+
+    assert result['seed_group'].tolist() == ['a'] * 5 + ['b'] * 5
+    for name, seeds in groups.items():
+        alone = recommend_batch(seeds, catalog, top_n=5, model=model)
+        assert result.loc[result['seed_group'] == name, 'track_id'].tolist() == alone['track_id'].tolist()
+
+
+def test_batch_unknown_seeds_and_aggregate(library):
+    catalog, model = library
+    assert recommend_batch(['not-a-track'], catalog, model=model).empty
+    with pytest.raises(ValueError):
+        recommend_batch(catalog.track_ids[:1], catalog, aggregate='median', model=model)
@@ -0,0 +1,72 @@
+# tests/test_rerank.py
+import numpy as np
+import pytest
+
+from Recommender.rerank import ArtistDiversity, Dedup, _occurrence, rerank, rerank_keys
+
+
+def same_song(a, b, artist='Artist'):
+    title_key, _ = rerank_keys([a, b], [artist, artist])
+    return title_key[0] == title_key[1]
+
+
+@pytest.mark.parametrize('a, b', [
+    ("Bohemian Rhapsody", "Bohemian Rhapsody - Remastered 2011"),
+    ("Hey Jude", "Hey Jude - Remastered 2015"),
+    ("Wonderwall", "Wonderwall - Live at Knebworth"),
+    ("Blinding Lights", "Blinding Lights (Radio Edit)"),
+    ("Sicko Mode", "SICKO MODE (feat. Drake)"),
+    ("One More Time", "One More Time [Club Mix]"),
+    ("Heroes", "Heroes - 2017 Remaster - Single Version"),
+    ("Paperback Writer", "Paperback Writer - Mono Version"),
+    ("Live Forever", "Live Forever - Remastered"),
+])
+def test_versions_of_one_song_share_a_key(a, b):
+    assert same_song(a, b)
+
+
+@pytest.mark.parametrize('a, b', [
+    ("Part 1 - Intro", "Part 1 - Outro"),
+    ("Cello Suite No. 1 in G Major, BWV 1007 - I. Prélude", "Cello Suite No. 1 in G Major, BWV 1007 - II. Allemande"),
+    ("The Four Seasons - Spring", "The Four Seasons - Winter"),
+    ("Interstellar - Main Theme", "Interstellar - Day One"),
+    ("Shine On You Crazy Diamond (Pts. 1-5)", "Shine On You Crazy Diamond (Pts. 6-9)"),
+    ("Live Forever", "Forever"),
+])
+def test_distinct_songs_keep_distinct_keys(a, b):
+    assert not same_song(a, b)
+
+
+def test_same_title_by_other_artists_differs():
+    title_key, artist_key = rerank_keys(["Hallelujah", "Hallelujah"], ["Leonard Cohen", "Jeff Buckley"])
+    assert title_key[0] != title_key[1]
+    assert artist_key[0] != artist_key[1]
+    assert np.issubdtype(title_key.dtype, np.integer)
+
+
+def test_occurrence_counts_earlier_equal_keys():
+    keys = np.random.default_rng(0).integers(0, 5, (20, 30))
+    expected = [[list(row[:c]).count(row[c]) for c in range(len(row))] for row in keys]
+    np.testing.assert_array_equal(_occurrence(keys), expected)
+
+
+def test_dedup_keeps_the_best_version_and_drops_the_seed():
+    # Candidates are best first, as top_k returns them
+    scores = np.array([[0.9, 0.8, 0.7, 0.6]])
+    title_key = np.array([[1, 2, 1, 3]])
+    result = Dedup()(scores, {'title_key': title_key, 'seed_key': [3]})
+    np.testing.assert_array_equal(result, [[0.9, 0.8, -np.inf, -np.inf]])
+
+
+def test_artist_diversity_penalizes_then_caps_repeats():
+    scores = np.array([[0.9, 0.85, 0.8, 0.7, 0.6]])
+    artist_key = np.array([[7, 7, 8, 7, 8]])
+    result = ArtistDiversity(max_per_artist=2, penalty=0.05)(scores, {'artist_key': artist_key})
+    np.testing.assert_allclose(result, [[0.9, 0.8, 0.8, -np.inf, 0.55]])
+
+
+def test_default_rerankers_run_in_order():
+    scores = np.array([[0.9, 0.8, 0.7]])
+    meta = {'title_key': np.array([[1, 1, 2]]), 'artist_key': np.array([[5, 5, 5]])}
+    # The duplicate is dropped before ArtistDiversity counts the artist's tracks
+    np.testing.assert_allclose(rerank(scores, meta), [[0.9, -np.inf, 0.65]])
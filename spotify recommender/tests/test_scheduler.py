@@ -0,0 +1,72 @@
+# tests/test_scheduler.py
+import threading
+import time
+
+from spotipy.exceptions import SpotifyException
+
+from Recommender.scheduler import BatchMetrics, BatchScheduler, TokenBucket
+
+
+def _scheduler(**kwargs):
+    return BatchScheduler(rate=1000, burst=1000, backoff=0, **kwargs)
+
+
+def test_batches_keep_input_order():
+    outcomes = _scheduler(batch_size=3, max_in_flight=4).run(lambda batch: [x * 2 for x in batch], list(range(10)))
+
+    assert [batch for batch, _, _ in outcomes] == [[0, 1, 2], [3, 4, 5], [6, 7, 8], [9]]
+    assert [result for _, result, _ in outcomes] == [[0, 2, 4], [6, 8, 10], [12, 14, 16], [18]]
+    assert all(error is None for _, _, error in outcomes)
+
+
+def test_retryable_errors_are_retried_and_others_are_not():
+    calls = {'flaky': 0, 'bad': 0}
+
+    def flaky(batch):
+        calls['flaky'] += 1
+        if calls['flaky'] < 3:
+            raise SpotifyException(502, -1, 'Bad gateway')
+        return batch
+
+    def bad(batch):
+        calls['bad'] += 1
+        raise SpotifyException(404, -1, 'Not found')
+
+    scheduler = _scheduler(max_retries=5)
+    assert scheduler.run_batch(flaky, [1]) == ([1], None)
+    result, error = scheduler.run_batch(bad, [1])
+
+    assert calls == {'flaky': 3, 'bad': 1}
+    assert result is None and error.http_status == 404
+    assert scheduler.metrics.summary()['retries'] == 2
+    assert scheduler.metrics.summary()['failed_batches'] == 1
+
+
+def test_retry_after_pauses_the_bucket():
+    bucket = TokenBucket(rate=1000, capacity=10)
+    bucket.pause(0.2)
+    start = time.monotonic()
+    bucket.acquire()
+
+    assert time.monotonic() - start >= 0.15
+
+
+def test_concurrent_runs_keep_their_own_metrics():
+    scheduler = _scheduler(batch_size=10)
+    runs = {}
+
+    def run(name, n):
+        run_metrics = BatchMetrics()
+        scheduler.run(lambda batch: batch, list(range(n)), run_metrics=run_metrics)
+        runs[name] = run_metrics.summary()
+
+    threads = [threading.Thread(target=run, args=(name, n)) for name, n in (('small', 30), ('large', 200))]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert (runs['small']['batches'], runs['small']['items']) == (3, 30)
+    assert (runs['large']['batches'], runs['large']['items']) == (20, 200)
+    # The scheduler's own metrics add up every run
+    assert scheduler.metrics.summary()['items'] == 230
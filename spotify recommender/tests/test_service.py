@@ -0,0 +1,107 @@
+# tests/test_service.py
+import json
+import threading
+import urllib.error
+import urllib.request
+
+import pytest
+
+from benchmarks.synthetic import synthetic_library
+from Recommender import metrics, service as service_module
+from Recommender.service import make_server
+from Recommender.warmstart import save_library
+
+
+@pytest.fixture(scope='module')
+def service(tmp_path_factory):
+    library = str(tmp_path_factory.mktemp('service') / 'library')
+    songs = synthetic_library(200)
+    save_library(library, songs)
+    server = make_server(library, port=0)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield f'http://127.0.0.1:{server.server_address[1]}', songs
+    server.shutdown()
+    server.server_close()
+
+
+def get(url, path):
+    try:
+        with urllib.request.urlopen(url + path, timeout=10) as response:
+            return response.status, json.load(response)
+    except urllib.error.HTTPError as e:
+        return e.code, json.load(e)
+
+
+def post(url, body):
+    request = urllib.request.Request(url + '/recommend/batch', data=json.dumps(body).encode(),
+                                     headers={'Content-Type': 'application/json'})
+    try:
+        with urllib.request.urlopen(request, timeout=10) as response:
+            return response.status, json.load(response)
+    except urllib.error.HTTPError as e:
+        return e.code, json.load(e)
+
+
+def test_batch_recommendations(service):
+    url, songs = service
+    status, body = post(url, {'seed_ids': songs['id'].head(3).tolist(), 'top_n': 5})
+    assert status == 200
+    assert len(body['recommendations']) == 5
+
+
+@pytest.mark.parametrize('body', [
+    {'seed_ids': 5},
+    {'seed_ids': ['a'], 'exclude_ids': 7},
+    {'seed_ids': []},
+    {'seed_ids': {'mix': [1, 2]}},
+    {'seed_ids': ['a'], 'exclude_ids': ['b', None]},
+])
+def test_batch_rejects_malformed_bodies(service, body):
+    url, _ = service
+    status, response = post(url, body)
+    assert status == 400
+    assert 'Bad request' in response['error']
+
+
+@pytest.fixture
+def failing_recommender(monkeypatch):
+    def fail(*args, **kwargs):
+        raise RuntimeError('index exploded')
+
+    monkeypatch.setattr(service_module, 'recommend_batch', fail)
+    monkeypatch.setattr(service_module, 'recommend_from_song', fail)
+    monkeypatch.setattr(metrics.REGISTRY, 'enabled', True)
+    metrics.REGISTRY.reset()
+    yield
+    metrics.REGISTRY.reset()
+
+
+def test_failures_answer_500_and_are_counted(service, failing_recommender):
+    url, songs = service
+    track_id = songs['id'].iloc[0]
+
+    assert post(url, {'seed_ids': [track_id]}) == (500, {'error': 'Internal server error'})
+    assert get(url, f'/recommend?track_id={track_id}') == (500, {'error': 'Internal server error'})
+    # The connection still serves requests afterwards
+    assert get(url, '/health')[0] == 200
+
+    counters = {(c['name'], tuple(sorted(c['labels'].items()))): c['value'] for c in metrics.to_dict()['counters']}
+    assert counters[('service.errors', (('endpoint', 'recommend'),))] == 1
+    assert counters[('service.errors', (('endpoint', 'recommend_batch'),))] == 1
+    assert counters[('service.responses', (('status', '500'),))] == 2
+
+
+def test_metrics_endpoint(service, monkeypatch):
+    url, songs = service
+    monkeypatch.setattr(metrics.REGISTRY, 'enabled', True)
+    metrics.REGISTRY.reset()
+    post(url, {'seed_ids': songs['id'].head(2).tolist()})
+
+    with urllib.request.urlopen(url + '/metrics', timeout=10) as response:
+        assert response.headers['Content-Type'].startswith('text/plain')
+        text = response.read().decode()
+    assert 'spotify_recommender_service_request_seconds_count{endpoint="recommend_batch"} 1' in text
+    status, body = get(url, '/metrics?format=json')
+    assert status == 200 and body['enabled']
+    metrics.REGISTRY.reset()
@@ -0,0 +1,75 @@
+# tests/test_snapshot.py
+import numpy as np
+import pandas as pd
+import pytest
+
+from benchmarks.synthetic import synthetic_library
+from Recommender import snapshot
+from Recommender.snapshot import compact_songs, read_snapshot, snapshot_info, write_snapshot
+
+
+@pytest.fixture(scope='module')
+def songs():
+    return synthetic_library(500, seed=9)
+
+
+def test_compact_dtypes(songs):
+    compact = compact_songs(songs)
+
+    assert isinstance(compact['artist'].dtype, pd.CategoricalDtype)
+    assert compact['key'].dtype == pd.Int8Dtype() and compact['mode'].dtype == pd.Int8Dtype()
+    assert compact['danceability'].dtype == np.float32
+    assert compact['id'].tolist() == songs['id'].tolist()
+    # The input frame is left as it was
+    assert songs['danceability'].dtype == np.float64
+
+
+@pytest.mark.parametrize('name', ['library.arrow', 'library.parquet'])
+def test_roundtrip_keeps_missing_features(songs, tmp_path, name):
+    path = str(tmp_path / name)
+    assert songs['danceability'].isna().any()
+
+    assert write_snapshot(songs, path, user_id='user-1') == len(songs)
+    loaded = read_snapshot(path)
+
+    assert loaded.columns.tolist() == songs.columns.tolist()
+    assert loaded['id'].tolist() == songs['id'].tolist()
+    assert loaded['artist'].astype(str).tolist() == songs['artist'].tolist()
+    np.testing.assert_array_equal(loaded['danceability'].isna(), songs['danceability'].isna())
+    np.testing.assert_allclose(loaded['danceability'], songs['danceability'], rtol=1e-6)
+    assert loaded['key'].isna().tolist() == songs['key'].isna().tolist()
+    assert not tmp_path.joinpath(name + '.tmp').exists()
+
+
+def test_snapshot_info_and_column_subset(songs, tmp_path):
+    path = str(tmp_path / 'library.arrow')
+    write_snapshot(songs, path, user_id='user-1')
+
+    info = snapshot_info(path)
+    assert info['version'] == snapshot.SNAPSHOT_VERSION and info['user_id'] == 'user-1'
+    assert read_snapshot(path, columns=['id', 'energy'], mmap=False).columns.tolist() == ['id', 'energy']
+
+
+def test_newer_or_foreign_files_are_refused(songs, tmp_path, monkeypatch):
+    foreign = str(tmp_path / 'foreign.parquet')
+    songs.to_parquet(foreign)
+    with pytest.raises(ValueError):
+        read_snapshot(foreign)
+
+    path = str(tmp_path / 'library.arrow')
+    monkeypatch.setattr(snapshot, 'SNAPSHOT_VERSION', 2)
+    write_snapshot(songs, path)
+    monkeypatch.setattr(snapshot, 'SNAPSHOT_VERSION', 1)
+    with pytest.raises(ValueError):
+        snapshot_info(path)
+    with pytest.raises(ValueError):
+        write_snapshot(songs, str(tmp_path / 'library.txt'))
+
+
+def test_convert_cli(songs, tmp_path):
+    csv = str(tmp_path / 'songs.csv')
+    songs.to_csv(csv, index=False)
+
+    snapshot.main(['convert', csv, str(tmp_path / 'library.parquet'), '--user-id', 'user-2'])
+    assert snapshot_info(str(tmp_path / 'library.parquet'))['user_id'] == 'user-2'
+    assert len(read_snapshot(str(tmp_path / 'library.parquet'))) == len(songs)
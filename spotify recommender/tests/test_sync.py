@@ -0,0 +1,120 @@
+# tests/test_sync.py
+import logging
+
+from Recommender.cache import FeatureCache
+from Recommender.fake import FakeSpotify
+from Recommender.scheduler import BatchScheduler
+from Recommender.data import get_user_saved_songs
+from Recommender.sync import LibrarySync, read_new_saved_tracks
+
+
+def make_sync(tmp_path, sp):
+    return LibrarySync(sp, 'user', path=str(tmp_path / 'sync'), cache=FeatureCache(str(tmp_path / 'cache.sqlite')),
+                       scheduler=BatchScheduler(rate=1000, burst=1000), neighbors_k=0)
+
+
+def test_removal_only_sync_skips_cached_featureless_tracks(tmp_path, caplog):
+    sp = FakeSpotify(400, latency=0, missing_rate=0.05)
+    sync = make_sync(tmp_path, sp)
+    sync.sync_once()
+    assert sync.snapshot.songs_with_audio['danceability'].isna().any()
+
+    removed = sync.snapshot.saved_songs['id'].iloc[10]
+    sp.current_user_saved_tracks_delete([removed])
+    calls = sp.calls['audio_features']
+    with caplog.at_level(logging.INFO):
+        added, removed_ids = sync.sync_once()
+    assert (added, removed_ids) == ([], [removed])
+    assert sp.calls['audio_features'] == calls
+    assert not [r for r in caplog.records if r.levelno >= logging.ERROR]
+    assert removed not in set(sync.snapshot.saved_songs['id'])
+
+
+def test_added_tracks_still_fetch_features(tmp_path):
+    sp = FakeSpotify(200, latency=0, missing_rate=0.05)
+    sync = make_sync(tmp_path, sp)
+    sync.sync_once()
+    new = sp.save_new_tracks(2)
+    calls = sp.calls['audio_features']
+    added, _ = sync.sync_once()
+    assert added == new[::-1]
+    assert sp.calls['audio_features'] == calls + 1
+
+
+def full_read(sp):
+    return get_user_saved_songs(sp, scheduler=BatchScheduler(rate=1000, burst=1000))['id'].tolist()
+
+
+def test_delta_read_stops_at_older_tracks():
+    sp = FakeSpotify(500, latency=0)
+    since = sp.current_user_saved_tracks(limit=1)['items'][0]['added_at']
+    new = sp.save_new_tracks(3)
+    calls = sp.calls['current_user_saved_tracks']
+
+    head, total = read_new_saved_tracks(sp, since, scheduler=BatchScheduler(rate=1000, burst=1000))
+    # The three new tracks plus the re-read newest one, from a single page
+    assert head['id'].tolist()[:3] == new[::-1] and len(head) == 4
+    assert total == 503
+    assert sp.calls['current_user_saved_tracks'] == calls + 1
+
+
+def test_additions_are_applied_without_re_reading_the_library(tmp_path):
+    sp = FakeSpotify(500, latency=0)
+    changes = []
+    sync = make_sync(tmp_path, sp)
+    sync.on_change.append(lambda snapshot, added, removed: changes.append((snapshot.version, added, removed)))
+    sync.sync_once()
+    new = sp.save_new_tracks(2)
+    calls = sp.calls['current_user_saved_tracks']
+
+    assert sync.sync_once() == (new[::-1], [])
+    assert sp.calls['current_user_saved_tracks'] == calls + 1
+    assert sync.snapshot.saved_songs['id'].tolist() == full_read(sp)
+    assert changes[-1] == (2, new[::-1], [])
+
+
+def test_removals_are_detected_and_the_model_follows(tmp_path):
+    sp = FakeSpotify(300, latency=0)
+    sync = make_sync(tmp_path, sp)
+    sync.sync_once()
+    gone = sync.snapshot.saved_songs['id'].iloc[[5, 150]].tolist()
+    sp.current_user_saved_tracks_delete(gone)
+    new = sp.save_new_tracks(1)
+
+    added, removed = sync.sync_once()
+    assert added == new and sorted(removed) == sorted(gone)
+    assert sync.snapshot.saved_songs['id'].tolist() == full_read(sp)
+    assert sorted(sync.snapshot.model.ids) == sorted(sync.snapshot.catalog.track_ids)
+    assert not set(gone) & set(sync.snapshot.model.ids) and new[0] in sync.snapshot.model
+
+
+def test_unchanged_library_keeps_the_snapshot(tmp_path):
+    sp = FakeSpotify(120, latency=0)
+    sync = make_sync(tmp_path, sp)
+    sync.sync_once()
+    snapshot = sync.snapshot
+
+    assert sync.sync_once() == ([], [])
+    assert sync.snapshot is snapshot
+
+
+def test_restart_restores_the_last_library_without_api_calls(tmp_path):
+    sync = make_sync(tmp_path, FakeSpotify(150, latency=0))
+    sync.sync_once()
+
+    sp = FakeSpotify(150, latency=0)
+    restored = make_sync(tmp_path, sp)
+    assert restored.restore()
+    assert restored.snapshot.saved_songs['id'].tolist() == sync.snapshot.saved_songs['id'].tolist()
+    assert restored.snapshot.catalog.track_ids == sync.snapshot.catalog.track_ids
+    assert sum(sp.calls.values()) == 0
+
+
+def test_background_thread_publishes_and_stops(tmp_path):
+    sync = make_sync(tmp_path, FakeSpotify(100, latency=0)).start()
+    try:
+        assert sync.wait_ready(timeout=10)
+        assert len(sync.snapshot) == 100
+    finally:
+        sync.stop(timeout=10)
+    assert not sync._thread.is_alive()
@@ -0,0 +1,61 @@
+# tests/test_versioned.py
+import os
+import threading
+
+from Recommender import versioned
+from Recommender.versioned import current_version, new_version, publish
+
+
+def write(version, text):
+    with open(os.path.join(version, 'data.txt'), 'w') as f:
+        f.write(text)
+
+
+def read(path):
+    with open(os.path.join(current_version(path), 'data.txt')) as f:
+        return f.read()
+
+
+def test_older_version_never_replaces_a_newer_one(tmp_path):
+    path = str(tmp_path)
+    older, newer = new_version(path), new_version(path)
+    write(older, 'older')
+    write(newer, 'newer')
+    assert publish(path, newer)
+    assert not publish(path, older)
+    assert read(path) == 'newer'
+    assert not os.path.exists(older)
+
+
+def test_superseded_versions_are_kept_for_readers(tmp_path, monkeypatch):
+    path = str(tmp_path)
+    first = new_version(path)
+    write(first, '0')
+    publish(path, first)
+    for i in range(1, 6):
+        version = new_version(path)
+        write(version, str(i))
+        publish(path, version)
+    # Young versions survive, so a reader that resolved `first` can still read it
+    assert os.path.exists(first)
+
+    monkeypatch.setattr(versioned, 'PRUNE_AFTER', 0)
+    version = new_version(path)
+    write(version, 'last')
+    publish(path, version)
+    assert not os.path.exists(first)
+    assert len([entry for entry in os.listdir(path) if entry.startswith('v')]) == versioned.KEEP_VERSIONS
+    assert read(path) == 'last'
+
+
+def test_concurrent_publishers_end_on_the_newest_version(tmp_path):
+    path = str(tmp_path)
+    versions = [new_version(path) for _ in range(8)]
+    for i, version in enumerate(versions):
+        write(version, str(i))
+    threads = [threading.Thread(target=publish, args=(path, version)) for version in reversed(versions)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert read(path) == '7'
@@ -0,0 +1,72 @@
+# tests/test_warmstart.py
+import os
+
+import pytest
+
+from benchmarks.synthetic import synthetic_library
+from Recommender.neighbors import NeighborTable
+from Recommender import versioned
+from Recommender.versioned import KEEP_VERSIONS, POINTER, current_version
+from Recommender.warmstart import load_library, load_neighbors, load_songs, save_library, save_neighbors
+
+
+def versions(path):
+    return sorted(entry for entry in os.listdir(path) if entry.startswith('v'))
+
+
+def test_saves_switch_the_current_version(tmp_path, monkeypatch):
+    monkeypatch.setattr(versioned, 'PRUNE_AFTER', 0)
+    path = str(tmp_path / 'library')
+    for n in (50, 60, 70, 80, 90):
+        save_library(path, synthetic_library(n, seed=n), songs=synthetic_library(n, seed=n))
+    catalog, model = load_library(path)
+    assert len(catalog) == len(model) == len(load_songs(path).dropna(subset=['danceability']))
+    assert os.path.basename(current_version(path)) == versions(path)[-1]
+    assert len(versions(path)) == KEEP_VERSIONS
+    assert not [entry for entry in os.listdir(path) if entry.endswith('.tmp')]
+
+
+def test_failed_save_leaves_the_live_version(tmp_path):
+    path = str(tmp_path / 'library')
+    catalog, _ = save_library(path, synthetic_library(50))
+    live = current_version(path)
+
+    class Broken:
+        def save(self, path):
+            raise OSError('disk full')
+
+    with pytest.raises(OSError):
+        save_library(path, synthetic_library(60), neighbors=Broken())
+    assert current_version(path) == live
+    assert versions(path) == [os.path.basename(live)]
+    assert load_library(path)[0].track_ids == catalog.track_ids
+
+
+def test_save_neighbors_publishes_a_complete_version(tmp_path):
+    path = str(tmp_path / 'library')
+    save_library(path, synthetic_library(80), songs=synthetic_library(80))
+    before = current_version(path)
+    catalog, model = load_library(path)
+    save_neighbors(path, NeighborTable.build(model, k=5, workers=1))
+
+    library = current_version(path)
+    assert library != before
+    assert sorted(os.listdir(library)) == ['catalog', 'model', 'neighbors', 'songs.arrow']
+    catalog, model = load_library(library)
+    neighbors = load_neighbors(library, catalog)
+    assert neighbors is not None and neighbors.ids == catalog.track_ids
+
+    _, other_model = save_library(str(tmp_path / 'other'), synthetic_library(40))
+    other = NeighborTable.build(other_model, k=5, workers=1)
+    with pytest.raises(ValueError):
+        save_neighbors(path, other)
+    assert current_version(path) == library
+
+
+def test_unversioned_library_still_loads(tmp_path):
+    path = str(tmp_path / 'library')
+    catalog, _ = save_library(path, synthetic_library(50))
+    legacy = str(tmp_path / 'legacy')
+    os.rename(current_version(path), legacy)
+    assert not os.path.exists(os.path.join(legacy, POINTER))
+    assert load_library(legacy)[0].track_ids == catalog.track_ids
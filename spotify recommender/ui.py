@@ -0,0 +1,173 @@
+# ui.py - Streamlit pieces of the app; the Recommender package has no Streamlit dependency
+import secrets
+import time
+
+import streamlit as st
+
+from Recommender import metrics
+from Recommender.auth import (consume_state, ensure_fresh_token, get_pooled_client, is_valid_session_key,
+                              make_auth_manager, new_state)
+
+def progress_bar(label):
+    """A progress(done, total) callback for the Recommender data layer, drawn as st.progress."""
+    bar = st.progress(0.0, text=label)
+    
+    def update(done, total):
+        fraction = min(done / total, 1.0) if total else 0.0
+        bar.progress(fraction, text=f"{label} ({done}/{total})" if total else label)
+    
+    return update
+
+def get_spotify_client():
+    """Manual authentication flow to avoid redirect loops."""
+    
+    # Use Streamlit secrets
+    client_id = st.secrets.get("SPOTIPY_CLIENT_ID")
+    client_secret = st.secrets.get("SPOTIPY_CLIENT_SECRET") 
+    redirect_uri = st.secrets.get("SPOTIPY_REDIRECT_URI")
+    
+    if not client_id or not client_secret or not redirect_uri:
+        st.error("❌ Spotify credentials not found!")
+        st.stop()
+    
+    # Session key: names this session's token file and only ever lives in
+    # st.session_state. The OAuth callback (often a new tab) finds it through
+    # the single-use state nonce of the authorize URL this app issued.
+    query_params = st.query_params
+    callback = 'code' in query_params
+    session_key = st.session_state.get('spotify_session_key')
+    if callback:
+        session_key = consume_state(query_params.get('state'))
+        if session_key is None:
+            st.error("❌ This login link wasn't started here or has expired. Please log in again.")
+            st.query_params.clear()
+            callback = False
+    if not is_valid_session_key(session_key):
+        session_key = secrets.token_urlsafe(24)
+    st.session_state.spotify_session_key = session_key
+    
+    try:
+        # Returning user with a live client in this process: no auth round trip
+        sp = get_pooled_client(session_key)
+        if sp is not None:
+            ensure_fresh_token(sp.auth_manager)
+            return sp
+        
+        st.write("🔄 Starting authentication process...")
+        auth_manager = make_auth_manager(client_id, client_secret, redirect_uri, session_key)
+        
+        if callback:
+            # We're in the callback - exchange the code for a token
+            try:
+                st.write("🔄 Processing callback...")
+                with metrics.timer('auth.code_exchange'):
+                    auth_manager.get_access_token(query_params['code'], as_dict=False, check_cache=False)
+                sp = get_pooled_client(session_key, auth_manager)
+                user = sp.current_user()
+                st.success(f"✅ Authenticated as: {user.get('display_name', 'User')}")
+                # Drop the callback parameters; reruns find the key in session_state
+                st.query_params.clear()
+                return sp
+            except Exception as e:
+                st.error(f"❌ Callback processing failed: {e}")
+        
+        # Stored token for this session (refreshed ahead of expiry)
+        if ensure_fresh_token(auth_manager):
+            return get_pooled_client(session_key, auth_manager)
+        
+        # MANUAL AUTHENTICATION FLOW
+        st.write("---")
+        st.write("## 🔑 Manual Authentication Required")
+        st.write("### Due to browser security, we need to manually handle authentication.")
+        
+        # Generate the authorization URL; its state nonce is accepted once on the callback
+        auth_url = auth_manager.get_authorize_url(state=new_state(session_key))
+        
+        col1, col2 = st.columns(2)
+        
+        with col1:
+            st.write("### Method 1: Copy URL")
+            st.text_area("Copy this URL:", auth_url, height=60)
+            st.write("1. Copy the URL above")
+            st.write("2. Open a new tab")
+            st.write("3. Paste and go")
+            st.write("4. Log in with Spotify")
+            st.write("5. You'll be redirected back here")
+        
+        with col2:
+            st.write("### Method 2: Direct Link")
+            st.markdown(f'<a href="{auth_url}" target="_blank" style="text-decoration: none;"><button style="background-color: #1DB954; color: white; padding: 12px 24px; border: none; border-radius: 25px; font-size: 16px; cursor: pointer; width: 100%;">🎵 Open Spotify Login</button></a>', unsafe_allow_html=True)
+            st.write("1. Click the button")
+            st.write("2. Log in with Spotify") 
+            st.write("3. Authorize the app")
+            st.write("4. You'll return here automatically")
+        
+        st.write("---")
+        st.info("💡 **After authorizing, you'll be redirected back here. If it shows the login page again, just wait a moment and refresh.**")
+        
+        # Return None to indicate we need authentication
+        return None
+        
+    except Exception as e:
+        st.error(f"❌ Authentication error: {str(e)}")
+        return None
+
+def _metric_rows(rows):
+    """Registry rows as a DataFrame with labels flattened to one string column."""
+    import pandas as pd
+    return pd.DataFrame([
+        {'name': row['name'], 'labels': ', '.join(f"{k}={v}" for k, v in row['labels'].items()),
+         **{k: v for k, v in row.items() if k not in ('name', 'labels')}}
+        for row in rows
+    ])
+
+def debug_panel(sp=None, sync=None):
+    """
+    Sidebar debug panel (shown with ?debug=1): metrics recording and export,
+    per-recommendation profiling, library sync and cache state, and quick
+    API checks.
+    """
+    # Imported here so the login page doesn't load pandas
+    import pandas as pd
+    from Recommender.cache import get_default_cache
+    from Recommender.data import get_audio_features, get_user_saved_songs
+    
+    with st.sidebar:
+        st.header("🔧 Debug")
+        recording = st.toggle("Record metrics", value=metrics.enabled(),
+                              help="Applies to the whole server process, not just this session")
+        metrics.enable(recording)
+        st.checkbox("Profile recommendations", key='debug_profile',
+                    help="pyinstrument if installed, else cProfile; the report is shown under the results")
+        
+        data = metrics.to_dict()
+        for kind in ('timers', 'counters', 'summaries'):
+            if data[kind]:
+                st.write(f"**{kind.capitalize()}**")
+                st.dataframe(_metric_rows(data[kind]), hide_index=True)
+        col1, col2 = st.columns(2)
+        with col1:
+            st.download_button("Prometheus", metrics.to_prometheus(), file_name='metrics.txt')
+        with col2:
+            if st.button("Reset metrics"):
+                metrics.REGISTRY.reset()
+                st.rerun()
+        
+        if sync is not None:
+            st.write("**Library sync**")
+            st.json(dict(sync.status, snapshot_version=sync.snapshot.version if sync.snapshot else None))
+        st.write("**Feature cache**")
+        st.json(get_default_cache().stats())
+        
+        if sp is not None and st.button("Run API checks"):
+            try:
+                start = time.perf_counter()
+                saved_songs = get_user_saved_songs(sp, limit=3)
+                st.write(f"✅ {len(saved_songs)} saved songs in {time.perf_counter() - start:.2f}s")
+                start = time.perf_counter()
+                audio_data = get_audio_features(sp, saved_songs['uri'].tolist()) if not saved_songs.empty else pd.DataFrame()
+                st.write(f"✅ {len(audio_data)} audio features in {time.perf_counter() - start:.2f}s")
+                if not audio_data.empty:
+                    st.dataframe(saved_songs.merge(audio_data, on='uri', how='left'))
+            except Exception as e:
+                st.error(f"❌ API check failed: {e}")